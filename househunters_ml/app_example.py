@@ -69,7 +69,9 @@ is correct.
 
 # Usually we can shut your web server down using CTRL + C, but if it crashed or gets stuck this
 # might not work Therefore we create a function that we can use to shutdown the server
-from flask import Flask, request, send_file
+from flask import Flask, request
+
+from househunters_ml.assets import AssetCache
 
 
 def shutdown_server():
@@ -93,6 +95,9 @@ def shutdown_server():
 #   variable equal to "__main__".
 app = Flask(__name__)
 
+# The gifs are read into memory once, and served with an ETag so browsers can keep them
+assets = AssetCache()
+
 
 # Your first API! It is a GET request that simply returns some text.
 @app.route('/', methods=['GET'])
@@ -115,7 +120,7 @@ def shutdown():
 # 2. Add a new API route that returns a gif
 @app.route('/sellahouse', methods=['GET'])
 def showGif():
-    return send_file('media/giphy.gif', mimetype='image/gif')
+    return assets.response('media/giphy.gif', request)
 
 
 # 3. Add a new API route that uses parameters and returns Welcome + the name you entered
@@ -149,9 +154,9 @@ def checkSolution():
     answer = request.args.get('answer')
 
     if answer == 'nofire':
-         return (send_file('media/giphy.gif', mimetype='image/gif'))
+         return assets.response('media/giphy.gif', request)
     else:
-         return (send_file('media/fire.gif', mimetype='image/gif'))
+         return assets.response('media/fire.gif', request)
 
 
 
@@ -0,0 +1,85 @@
+"""
+In-memory cache of the static assets of the web applications.
+
+send_file opened and read a gif from disk on every request, and its ETag is derived from the
+modification time of the file. The AssetCache reads the media and the static files next to the
+templates (css, js, images) once when the application starts. Files that get at least 10% smaller
+with gzip are also kept compressed. Every file gets a strong ETag from the hash of its contents.
+Responses carry Cache-Control, and werkzeug answers a matching If-None-Match with a 304 and a Range
+request with a 206 from the bytes in memory. Byte ranges are always served from the uncompressed file.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from collections import namedtuple
+
+from flask import Response, abort
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Url prefix -> directory of the assets served under it, the .html files are templates and not served
+ASSET_DIRS = {
+    'media': os.path.join(PACKAGE_DIR, 'media'),
+    'static': os.path.join(PACKAGE_DIR, 'templates'),
+}
+SKIPPED_EXTENSIONS = ('.html',)
+
+MAX_AGE = int(os.environ.get('HH_ASSET_MAX_AGE', 3600))
+
+# Files are only kept compressed when gzip saves at least this fraction of their size
+MIN_GZIP_SAVING = 0.1
+
+Asset = namedtuple('Asset', ['body', 'gzip_body', 'mimetype', 'etag', 'last_modified'])
+
+
+def load_asset(path):
+    with open(path, 'rb') as f:
+        body = f.read()
+    compressed = gzip.compress(body, compresslevel=9, mtime=0)
+    gzip_body = compressed if len(compressed) <= len(body) * (1 - MIN_GZIP_SAVING) else None
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    return Asset(body, gzip_body, mimetype, hashlib.sha256(body).hexdigest()[:32], os.path.getmtime(path))
+
+
+class AssetCache:
+    """The files of a set of directories in memory, served by their url path like 'media/giphy.gif'"""
+
+    def __init__(self, directories=None, max_age=MAX_AGE):
+        self.max_age = max_age
+        self.assets = {}
+        for prefix, directory in (ASSET_DIRS if directories is None else directories).items():
+            for root, _, files in os.walk(directory):
+                for file_name in files:
+                    if file_name.endswith(SKIPPED_EXTENSIONS):
+                        continue
+                    path = os.path.join(root, file_name)
+                    name = '/'.join([prefix] + os.path.relpath(path, directory).split(os.sep))
+                    self.assets[name] = load_asset(path)
+
+    def response(self, name, request):
+        """The response to a request for the asset name, a 404 when there is no such asset"""
+        asset = self.assets.get(name)
+        if asset is None:
+            abort(404)
+        use_gzip = (asset.gzip_body is not None and request.range is None and
+                    request.accept_encodings['gzip'] > 0)
+        response = Response(asset.gzip_body if use_gzip else asset.body, mimetype=asset.mimetype)
+        # Both encodings of an asset are different representations and need different strong ETags
+        response.set_etag(asset.etag + '-gzip' if use_gzip else asset.etag)
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+        if asset.gzip_body is not None:
+            response.vary.add('Accept-Encoding')
+        response.last_modified = asset.last_modified
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(response.data))
+
+    def stats(self):
+        return {
+            'assets': len(self.assets),
+            'bytes': sum(len(asset.body) for asset in self.assets.values()),
+            'compressed': sorted(name for name, asset in self.assets.items() if asset.gzip_body is not None),
+            'gzip_bytes': sum(len(asset.gzip_body or b'') for asset in self.assets.values()),
+        }
@@ -0,0 +1,65 @@
+"""
+Batch predictions on the HouseTable in fixed-size chunks.
+
+Only one chunk of the csv is in memory at a time: it is read, transformed with test_transformation,
+predicted and written out before the next chunk is read, so memory stays bounded whatever the file size.
+Every chunk of a run is scored with the model bundle that was served when the run started, also when the
+model is reloaded halfway.
+"""
+import numpy as np
+
+from househunters_ml import data_cache, metrics
+from househunters_ml.predict import ID_COLUMN, csv_path, source_columns, test_transformation
+from househunters_ml.predictor import predictor
+from househunters_ml.registry import registry
+from househunters_ml.store import store
+
+CHUNK_SIZE = 10000
+
+
+def iter_house_table(data_location=csv_path, chunksize=CHUNK_SIZE, col_names=None):
+    """
+    Reads the listing IDs and the columns of the HouseTable csv that the model (with col_names) needs in
+    chunks of chunksize rows, from its columnar cache when there is one
+    """
+    columns = [ID_COLUMN] + source_columns(col_names)
+    return data_cache.iter_house_table(data_location, chunksize, columns=columns)
+
+
+def score_chunk(chunk, bundle=None):
+    """
+    Transforms a chunk of the HouseTable and adds the predictions as the correct_prediction column, with
+    the model of bundle or, by default, the one the registry serves
+    """
+    bundle = bundle or registry.get()
+    with metrics.stage('predict_all', 'transform'):
+        X_predict = test_transformation(chunk, bundle.col_names)
+    metrics.BATCH_SIZE.observe(len(X_predict), 'predict_all')
+    with metrics.stage('predict_all', 'predict'):
+        X_predict['correct_prediction'] = predictor.predict_rows(X_predict.to_numpy(dtype=np.float32), bundle)
+    return X_predict
+
+
+def iter_scored_chunks(data_location=csv_path, chunksize=CHUNK_SIZE, bundle=None):
+    """Yields the HouseTable scored chunk by chunk, all with bundle or with the model served at the start"""
+    bundle = bundle or registry.get()
+    chunks = iter(iter_house_table(data_location, chunksize, bundle.col_names))
+    while True:
+        with metrics.stage('predict_all', 'read'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        scored = score_chunk(chunk, bundle)
+        with metrics.stage('predict_all', 'store'):
+            store.upsert_many(chunk[ID_COLUMN], scored['correct_prediction'], bundle.version)
+        yield scored
+
+
+def stream_predictions_csv(data_location=csv_path, chunksize=CHUNK_SIZE):
+    """Yields the scored HouseTable as csv text, one piece per chunk, starting with the header"""
+    header = True
+    for scored in iter_scored_chunks(data_location, chunksize):
+        with metrics.stage('predict_all', 'write'):
+            text = scored.to_csv(header=header)
+        yield text
+        header = False
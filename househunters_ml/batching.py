@@ -0,0 +1,122 @@
+"""
+Micro-batching of concurrent prediction requests.
+
+Every request thread of the web server used to call the model on its own one-row input. The MicroBatcher
+puts the rows of concurrent requests on a queue, a single dispatcher thread collects them into one matrix,
+predicts that matrix in one call and hands every caller its own price back through a Future.
+
+The batching is adaptive: a request that arrives while the server is idle is dispatched right away, the
+dispatcher only waits for more rows (up to window_ms, or until max_batch_size rows are collected) when
+other requests are already queued or the previous batch held more than one request.
+"""
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+
+from househunters_ml import metrics
+
+
+class MicroBatcher:
+    """Collects single-house predictions into batches that are predicted with one model call"""
+
+    def __init__(self, predictor, window_ms=2.0, max_batch_size=32, timeout=10.0):
+        self.predictor = predictor
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+        # Seconds a request waits for the prediction of its batch before it gives up
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._last_batch_size = 0
+        # Matrix the dispatcher thread copies the rows of a batch into, allocated once
+        self._rows = None
+
+    def _ensure_started(self):
+        """
+        Starts the dispatcher thread on first use, again in a process forked after it was started and
+        again when it died, so the rows that are queued still get predicted.
+        """
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # The queue and the dispatcher of the parent process are of no use in a forked one
+                self._queue = queue.Queue()
+                self._thread = None
+                self._pid = os.getpid()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._thread.start()
+
+    def submit_row(self, row):
+        """Queues a feature row that is already in the order of col_names, returns a Future with its price"""
+        future = Future()
+        self._ensure_started()
+        self._queue.put((row, future))
+        return future
+
+    def _collect(self):
+        """Blocks for the first request, then gathers more until the window closes or the batch is full"""
+        batch = [self._queue.get()]
+        if self._queue.empty() and self._last_batch_size <= 1:
+            return batch
+
+        deadline = time.monotonic() + self.window_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _stack(self, batch):
+        n_columns = batch[0][0].shape[-1]
+        if self._rows is None or self._rows.shape[1] != n_columns:
+            self._rows = np.empty((self.max_batch_size, n_columns), dtype=np.float32)
+        rows = self._rows[:len(batch)]
+        for i, (row, _) in enumerate(batch):
+            rows[i] = row
+        return rows
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                rows = self._stack(batch)
+                predictions = self.predictor.predict_rows(rows)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), prediction in zip(batch, predictions):
+                    future.set_result(prediction)
+
+            self._last_batch_size = len(batch)
+            metrics.BATCH_SIZE.observe(len(batch), 'micro_batcher')
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+
+    def stats(self):
+        """Queue depth and the distribution of batch sizes, used to tune window_ms and max_batch_size"""
+        with self._stats_lock:
+            batch_sizes = dict(sorted(self._batch_sizes.items()))
+        return {
+            'window_ms': self.window_ms,
+            'max_batch_size': self.max_batch_size,
+            'queue_depth': self._queue.qsize(),
+            'batches': sum(batch_sizes.values()),
+            'requests': sum(size * count for size, count in batch_sizes.items()),
+            'batch_sizes': batch_sizes,
+        }
@@ -0,0 +1,130 @@
+"""
+Concurrency of the sync Flask application (threaded Werkzeug server) against its ASGI variant (uvicorn).
+
+Both servers get the same url predictions of random houses at several concurrency levels, once on their
+own and once while a client keeps requesting /predict_all on a larger synthetic HouseTable, and the
+throughput and p50/p95/p99 latency of the predictions are recorded. Both servers run in this process and
+share its prediction cache, so each gets houses of its own seed and the cache is cleared before every level.
+
+Run from the root of the repository (needs Quart and uvicorn):
+    python -m househunters_ml.benchmarks.bench_asgi --concurrency 1 16 64 --requests 2000
+"""
+import argparse
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import urllib.request
+
+from househunters_ml.benchmarks.run_suite import (drive, environment, http_sender, random_houses,
+                                                  start_http_server, summarize)
+from househunters_ml.predict import csv_path
+from househunters_ml.registry import registry
+from househunters_ml.serving import prediction_cache
+from househunters_ml.synthetic import write_synthetic_csv
+
+
+def start_asgi_server(app):
+    """Starts uvicorn for app on a free local port in a background thread"""
+    import uvicorn
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level='warning'))
+    threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, 'http://127.0.0.1:{}'.format(sock.getsockname()[1])
+
+
+class BatchLoad:
+    """Requests /predict_all over and over in a background thread, like a long batch job would"""
+
+    def __init__(self, base_url):
+        self.url = base_url + '/predict_all'
+        self.requests = 0
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            with urllib.request.urlopen(self.url) as response:
+                response.read()
+            self.requests += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopping.set()
+        self._thread.join()
+        return False
+
+
+def measure(base_url, concurrency_levels, n_requests, seed):
+    send = http_sender(base_url, 'url_prediction')
+    houses = random_houses(n_requests, seed)
+    prediction_cache.clear()
+    send(houses[0])  # warm up
+    results = {}
+    for scenario in ('idle', 'during_predict_all'):
+        results[scenario] = {}
+        for concurrency in concurrency_levels:
+            prediction_cache.clear()
+            if scenario == 'idle':
+                latencies, wall_seconds = drive(send, houses, concurrency)
+            else:
+                with BatchLoad(base_url) as load:
+                    latencies, wall_seconds = drive(send, houses, concurrency)
+            results[scenario][str(concurrency)] = summarize(latencies, wall_seconds)
+            if scenario != 'idle':
+                results[scenario][str(concurrency)]['predict_all_requests'] = load.requests
+    return results
+
+
+def run(concurrency_levels, n_requests, batch_rows):
+    from househunters_ml.hh_app import app as flask_app
+    from househunters_ml.hh_asgi import app as asgi_app
+
+    results = {'environment': environment()}
+    previous_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            os.makedirs(os.path.dirname(csv_path))
+            write_synthetic_csv(csv_path, batch_rows)
+            registry.get()
+
+            server, base_url = start_http_server(flask_app)
+            try:
+                results['flask_werkzeug'] = measure(base_url, concurrency_levels, n_requests, seed=15)
+            finally:
+                server.shutdown()
+
+            server, base_url = start_asgi_server(asgi_app)
+            try:
+                results['asgi_uvicorn'] = measure(base_url, concurrency_levels, n_requests, seed=16)
+            finally:
+                server.should_exit = True
+        finally:
+            os.chdir(previous_directory)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--requests', type=int, default=2000, help='Url predictions per level and scenario')
+    parser.add_argument('--batch-rows', type=int, default=100000, help='Rows of the HouseTable of /predict_all')
+    parser.add_argument('--output', help='Optional json file to write the results to')
+    args = parser.parse_args()
+
+    results = run(args.concurrency, args.requests, args.batch_rows)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
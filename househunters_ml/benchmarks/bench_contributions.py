@@ -0,0 +1,78 @@
+"""
+Cost of explaining a price with per-feature contributions, next to the prediction itself.
+
+Times explain_houses of hh_app on one house (first with an empty contribution cache, then from the cache)
+and on batches of random houses, against one contribution call per house, and checks that the
+contributions of every house add up to its prediction.
+
+Run from the root of the repository:
+    python -m househunters_ml.benchmarks.bench_contributions --iterations 500 --batch-sizes 10 100 1000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from househunters_ml.benchmarks.bench_predictor import SAMPLE_HOUSE, summarize, time_calls
+from househunters_ml.benchmarks.run_suite import random_houses
+from househunters_ml.serving import contribution_cache, explain_houses
+from househunters_ml.predictor import predictor
+
+
+def uncached_explanation(houses):
+    contribution_cache.clear()
+    return explain_houses(houses)
+
+
+def run(iterations, batch_sizes, warmup=20):
+    results = {'single': {}}
+    row = predictor.to_row(SAMPLE_HOUSE)
+    paths = {
+        'predict': lambda house: predictor.predict_rows(predictor.to_row(house)[None, :]),
+        'explain_uncached': lambda house: uncached_explanation([house]),
+        'explain_cached': lambda house: explain_houses([house]),
+    }
+    for name, func in paths.items():
+        time_calls(func, SAMPLE_HOUSE, warmup)
+        results['single'][name] = summarize(time_calls(func, SAMPLE_HOUSE, iterations))
+    results['single']['contribution_sum_error'] = float(abs(
+        predictor.contributions_rows(row[None, :]).sum() - predictor.predict_rows(row[None, :])[0]))
+
+    results['batch'] = {}
+    for batch_size in batch_sizes:
+        houses = random_houses(batch_size)
+        rows = np.stack([predictor.to_row(house) for house in houses])
+        start = time.perf_counter()
+        uncached_explanation(houses)
+        vectorized = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(batch_size):
+            predictor.contributions_rows(rows[i:i + 1])
+        per_house = time.perf_counter() - start
+        start = time.perf_counter()
+        explain_houses(houses)
+        cached = time.perf_counter() - start
+        error = np.abs(predictor.contributions_rows(rows).sum(axis=1) - predictor.predict_rows(rows)).max()
+        results['batch'][str(batch_size)] = {
+            'vectorized_ms': vectorized * 1e3,
+            'one_call_per_house_ms': per_house * 1e3,
+            'cached_ms': cached * 1e3,
+            'speedup_vectorized': per_house / vectorized,
+            'max_contribution_sum_error': float(error),
+        }
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--output', help='Optional json file to write the results to')
+    args = parser.parse_args()
+
+    results = run(args.iterations, args.batch_sizes)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
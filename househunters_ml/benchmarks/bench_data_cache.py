@@ -0,0 +1,56 @@
+"""
+Parsing the HouseTable csv against reading its columnar cache.
+
+Writes a synthetic HouseTable csv in the format of the 190322 export (';' delimited, ',' decimals) to a
+temporary directory, then times a plain csv parse, the first read that builds the cache and a cached read.
+
+Run from the root of the repository:
+    python -m househunters_ml.benchmarks.bench_data_cache --rows 1000000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from househunters_ml.data_cache import HouseTableCache, read_house_table
+from househunters_ml.synthetic import write_synthetic_csv
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run(n_rows):
+    with tempfile.TemporaryDirectory() as directory:
+        data_location = os.path.join(directory, 'HouseTable.csv')
+        write_synthetic_csv(data_location, n_rows)
+
+        csv_frame, csv_seconds = timed(read_house_table, data_location, use_cache=False)
+        _, build_seconds = timed(read_house_table, data_location)
+        cached_frame, cached_seconds = timed(read_house_table, data_location)
+
+        return {
+            'rows': n_rows,
+            'format': HouseTableCache(data_location).format,
+            'csv_parse_s': csv_seconds,
+            'first_read_with_cache_build_s': build_seconds,
+            'cached_read_s': cached_seconds,
+            'speedup': csv_seconds / cached_seconds,
+            'same_frame': bool(csv_frame.equals(cached_frame)),
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--output', help='Optional json file to write the results to')
+    args = parser.parse_args()
+
+    results = run(args.rows)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
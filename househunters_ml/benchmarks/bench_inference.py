@@ -0,0 +1,96 @@
+"""
+Latency and memory allocations of one model call, for single rows and batches.
+
+Three paths predict the same rows:
+    dataframe   an int64 DataFrame through XGBRegressor.predict, as the handlers first did
+    dmatrix     a float32 array wrapped in a DMatrix per call, as the Predictor did before
+    inplace     the float32 C-contiguous array predicted in place (predictor.predict_inplace)
+
+Allocations are traced with tracemalloc over one call: the peak of the Python and NumPy memory allocated
+during the call and the number of blocks it left allocated (the result and whatever it cached). Memory
+allocated by XGBoost itself is not traced.
+
+Run from the root of the repository:
+    python -m househunters_ml.benchmarks.bench_inference --iterations 2000 --batch-sizes 1 32 1000 100000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from househunters_ml.benchmarks.bench_predictor import summarize
+from househunters_ml.predict import test_transformation
+from househunters_ml.predictor import predict_inplace
+from househunters_ml.registry import registry
+from househunters_ml.synthetic import synthetic_house_table
+
+
+def feature_rows(n_rows):
+    """n_rows model rows from a synthetic HouseTable, as C-contiguous float32 in the order of col_names"""
+    features = test_transformation(synthetic_house_table(n_rows))[registry.col_names]
+    return np.ascontiguousarray(features.to_numpy(dtype=np.float32))
+
+
+def allocations(func, rows):
+    """Peak bytes traced while func(rows) runs and the blocks still allocated when it returns"""
+    tracemalloc.start()
+    try:
+        tracemalloc.clear_traces()
+        before = tracemalloc.take_snapshot()
+        start_bytes = tracemalloc.get_traced_memory()[0]
+        result = func(rows)
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del result
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'traceback') if stat.count_diff > 0)
+    return {'peak_bytes': peak_bytes - start_bytes, 'blocks_left': blocks}
+
+
+def run(iterations, batch_sizes, warmup=20):
+    booster = registry.model.get_booster()
+    col_names = list(registry.col_names)
+    paths = {
+        'dataframe': lambda rows: registry.model.predict(pd.DataFrame(rows.astype(np.int64), columns=col_names)),
+        'dmatrix': lambda rows: booster.predict(xgb.DMatrix(rows, feature_names=col_names)),
+        'inplace': lambda rows: predict_inplace(booster, rows, col_names),
+    }
+    results = {}
+    for batch_size in batch_sizes:
+        rows = feature_rows(batch_size)
+        # Fewer repetitions for large batches, every call already scores many rows
+        repetitions = max(5, min(iterations, iterations * 100 // batch_size))
+        results[str(batch_size)] = {}
+        for name, func in paths.items():
+            for _ in range(warmup):
+                func(rows)
+            latencies = np.empty(repetitions)
+            for i in range(repetitions):
+                start = time.perf_counter()
+                func(rows)
+                latencies[i] = time.perf_counter() - start
+            results[str(batch_size)][name] = dict(summarize(latencies * 1e6), **allocations(func, rows))
+        results[str(batch_size)]['same_predictions'] = bool(np.array_equal(paths['dmatrix'](rows),
+                                                                           paths['inplace'](rows)))
+        results[str(batch_size)]['speedup_p50_vs_dmatrix'] = (results[str(batch_size)]['dmatrix']['p50_us'] /
+                                                              results[str(batch_size)]['inplace']['p50_us'])
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000, help='Calls per path for single rows')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 32, 1000, 100000])
+    parser.add_argument('--output', help='Optional json file to write the results to')
+    args = parser.parse_args()
+
+    results = run(args.iterations, args.batch_sizes)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
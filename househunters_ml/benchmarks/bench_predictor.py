@@ -0,0 +1,88 @@
+"""
+Per-request latency of a single house prediction.
+
+Compares the old handler code (empty DataFrame, append, astype(int), XgBoost.predict) with the
+Predictor, which fills a preallocated NumPy row and calls the booster directly.
+
+Run from the root of the repository:
+    python -m househunters_ml.benchmarks.bench_predictor --iterations 2000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from househunters_ml.predictor import Predictor
+from househunters_ml.registry import registry
+
+# The house of curl-test.sh
+SAMPLE_HOUSE = {
+    "LivingArea_m2": 90,
+    "QuietRoad": 1,
+    "Num_Bedrooms": 3,
+    "StatusRank": 2233,
+    "Avg_house_value_WOZ_1000euros": 600,
+    "Avg_WOZ_m2": 60,
+    "CitySide": 1,
+    "HouseType_Detached": 0,
+    "Age_cat_Before_war": 0,
+    "Urbanity_class_5": 1
+}
+
+
+def dataframe_prediction(house_info):
+    """The prediction as the handlers of hh_app did it before the Predictor"""
+    df = pd.DataFrame(columns=registry.col_names)
+    if hasattr(df, 'append'):
+        df = df.append(house_info, ignore_index=True)
+    else:
+        # DataFrame.append was removed in pandas 2.0
+        df = pd.concat([df, pd.DataFrame([house_info])], ignore_index=True)[registry.col_names]
+    df = df.astype(int)
+    return registry.model.predict(df)[0]
+
+
+def time_calls(func, house_info, iterations):
+    """Returns the latency of every call in microseconds"""
+    latencies = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        func(house_info)
+        latencies[i] = time.perf_counter() - start
+    return latencies * 1e6
+
+
+def summarize(latencies):
+    return {'mean_us': float(latencies.mean()),
+            'p50_us': float(np.percentile(latencies, 50)),
+            'p99_us': float(np.percentile(latencies, 99))}
+
+
+def run(iterations, warmup=50):
+    predictor = Predictor()
+    paths = {'dataframe': dataframe_prediction, 'predictor': predictor.predict_one}
+
+    results = {}
+    for name, func in paths.items():
+        time_calls(func, SAMPLE_HOUSE, warmup)
+        results[name] = summarize(time_calls(func, SAMPLE_HOUSE, iterations))
+
+    results['speedup_p50'] = results['dataframe']['p50_us'] / results['predictor']['p50_us']
+    results['same_prediction'] = bool(np.isclose(dataframe_prediction(SAMPLE_HOUSE),
+                                                 predictor.predict_one(SAMPLE_HOUSE)))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--output', help='Optional json file to write the results to')
+    args = parser.parse_args()
+
+    results = run(args.iterations)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
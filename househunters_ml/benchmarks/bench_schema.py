@@ -0,0 +1,69 @@
+"""
+Peak memory and time of parsing the HouseTable csv with the default dtypes and with its declared schema.
+
+Writes a synthetic HouseTable csv to a temporary directory and parses it three ways: every column with the
+default dtypes of pandas (how the HouseTable used to be read), every column with the compact dtypes of
+schema.py, and only the columns the model needs with the compact dtypes. Peak memory is measured with
+tracemalloc, which sees the allocations of NumPy and pandas.
+
+Run from the root of the repository:
+    python -m househunters_ml.benchmarks.bench_schema --rows 1000000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from househunters_ml import schema
+from househunters_ml.predict import source_columns
+from househunters_ml.synthetic import write_synthetic_csv
+
+
+def measure(func, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    frame = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'seconds': seconds,
+        'peak_mb': peak / 1e6,
+        'frame_mb': frame.memory_usage(deep=True).sum() / 1e6,
+        'columns': frame.shape[1],
+    }
+
+
+def run(n_rows):
+    with tempfile.TemporaryDirectory() as directory:
+        data_location = os.path.join(directory, 'HouseTable.csv')
+        write_synthetic_csv(data_location, n_rows)
+
+        results = {
+            'rows': n_rows,
+            'default_dtypes': measure(pd.read_csv, data_location, delimiter=';', decimal=',', thousands='.'),
+            'schema_all_columns': measure(schema.read_csv, data_location),
+            'schema_model_columns': measure(schema.read_csv, data_location, source_columns()),
+        }
+    baseline = results['default_dtypes']
+    for name in ('schema_all_columns', 'schema_model_columns'):
+        results[name]['peak_reduction'] = baseline['peak_mb'] / results[name]['peak_mb']
+        results[name]['frame_reduction'] = baseline['frame_mb'] / results[name]['frame_mb']
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--output', help='Optional json file to write the results to')
+    args = parser.parse_args()
+
+    results = run(args.rows)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
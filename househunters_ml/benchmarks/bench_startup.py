@@ -0,0 +1,59 @@
+"""
+Cold start benchmark of the HouseHunters web application.
+
+Every repeat starts a fresh interpreter and measures how long it takes to import hh_app, how long the
+model registry takes to load the artifacts and the peak memory of the process afterwards.
+
+Run from the root of the repository:
+    python -m househunters_ml.benchmarks.bench_startup --repeats 10
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Runs in the child interpreter, prints one json line with the measurements
+CHILD_SCRIPT = """
+import json, resource, time
+start = time.perf_counter()
+import househunters_ml.hh_app
+imported = time.perf_counter()
+from househunters_ml.registry import registry
+registry.get()
+loaded = time.perf_counter()
+print(json.dumps({
+    'import_s': imported - start,
+    'model_load_s': loaded - imported,
+    'total_s': loaded - start,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+
+def measure_once():
+    """Starts a new interpreter and returns its measurements"""
+    output = subprocess.run([sys.executable, '-c', CHILD_SCRIPT], check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(repeats):
+    runs = [measure_once() for _ in range(repeats)]
+    return {key: {'median': statistics.median(r[key] for r in runs),
+                  'min': min(r[key] for r in runs),
+                  'max': max(r[key] for r in runs)}
+            for key in runs[0]}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', help='Optional json file to write the results to')
+    args = parser.parse_args()
+
+    results = run(args.repeats)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,54 @@
+"""
+Time per render of the pages of hh_app: render_template on every request against the PageCache.
+
+Times the home page, the post listing page and the sales form with a prediction text, checks that both
+paths return the same html, and shows what is left of a render when the prediction is filled in.
+
+Run from the root of the repository:
+    python -m househunters_ml.benchmarks.bench_templates --iterations 5000
+"""
+import argparse
+import json
+
+from flask import render_template
+
+from househunters_ml.benchmarks.bench_predictor import summarize, time_calls
+from househunters_ml.hh_app import SALES_FORM, app, pages
+
+PREDICTION_TEXT = 'The suggested asking price for the house is 234863.06'
+
+
+def run(iterations, warmup=50):
+    renders = {
+        'home': (lambda _: render_template('hh_home.html'), lambda _: pages.page('hh_home.html')),
+        'post_listing': (lambda _: render_template('hh_post_listing.html'),
+                         lambda _: pages.page('hh_post_listing.html')),
+        'sales_form': (lambda text: render_template(SALES_FORM, pred=text),
+                       lambda text: pages.page_with(SALES_FORM, 'pred', text)),
+        'sales_form_empty': (lambda _: render_template(SALES_FORM),
+                             lambda _: pages.page_with(SALES_FORM, 'pred', '')),
+    }
+    results = {}
+    with app.test_request_context('/form_prediction', method='POST'):
+        for name, (jinja, cached) in renders.items():
+            results[name] = {}
+            for path_name, func in (('render_template', jinja), ('page_cache', cached)):
+                time_calls(func, PREDICTION_TEXT, warmup)
+                results[name][path_name] = summarize(time_calls(func, PREDICTION_TEXT, iterations))
+            results[name]['speedup_p50'] = (results[name]['render_template']['p50_us'] /
+                                            results[name]['page_cache']['p50_us'])
+            results[name]['same_html'] = jinja(PREDICTION_TEXT) == cached(PREDICTION_TEXT)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=5000)
+    parser.add_argument('--output', help='Optional json file to write the results to')
+    args = parser.parse_args()
+
+    results = run(args.iterations)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,99 @@
+"""
+Time and peak memory of test_transformation on a large synthetic HouseTable.
+
+Compares the original transformation (copy of the whole frame, chained assignments, get_dummies on every
+categorical) with the column-pruned TransformPlan that test_transformation uses now.
+
+Run from the root of the repository:
+    python -m househunters_ml.benchmarks.bench_transform --rows 1000000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from househunters_ml.registry import registry
+from househunters_ml.synthetic import synthetic_house_table
+from househunters_ml.transform import CITYSIDE, COUNTRYSIDE, TransformPlan
+
+
+def legacy_transformation(prediction_set, col_names):
+    """
+    The original test_transformation. The Age_cat assignments go through .loc instead of chained
+    indexing, which newer pandas versions no longer write through.
+    """
+    prediction_set_copy = prediction_set.copy()
+    prediction_set_copy = prediction_set_copy.rename(columns={"#Bedrooms": "Num_Bedrooms"})
+
+    prediction_set_copy['Age_cat'] = prediction_set_copy['ConstructionYear'].astype(object)
+    prediction_set_copy.loc[prediction_set_copy['ConstructionYear'] < 1940, 'Age_cat'] = 'Before_war'
+    prediction_set_copy.loc[(prediction_set_copy['ConstructionYear'] >= 1940) &
+                            (prediction_set_copy['ConstructionYear'] < 1990), 'Age_cat'] = 'Existing'
+    prediction_set_copy.loc[prediction_set_copy['ConstructionYear'] >= 1990, 'Age_cat'] = 'New_construction'
+
+    prediction_set_copy['CitySide'] = prediction_set_copy['Province'].isin(CITYSIDE).astype(np.int8)
+    prediction_set_copy['CountrySide'] = prediction_set_copy['Province'].isin(COUNTRYSIDE).astype(np.int8)
+
+    prediction_set_copy['good_hood'] = (prediction_set_copy.Num_benefit_total - prediction_set_copy.Num_AOW) < 1000
+    prediction_set_copy['enough_bedroom'] = prediction_set_copy['Num_Bedrooms']
+
+    dataProv = prediction_set_copy['Province']
+    dataHouse = prediction_set_copy['HouseType']
+    dataAge = prediction_set_copy['Age_cat']
+    dataUrban = prediction_set_copy['Urbanity_class']
+
+    categoricals = ['Province', 'HouseType', 'Age_cat', 'Urbanity_class', 'Garden']
+    prediction_set_copy = pd.get_dummies(prediction_set_copy, columns=categoricals)
+
+    prediction_set_copy['Province'] = dataProv
+    prediction_set_copy['HouseType'] = dataHouse
+    prediction_set_copy['Age_cat'] = dataAge
+    prediction_set_copy['Urbanity_class'] = dataUrban
+
+    return prediction_set_copy[col_names]
+
+
+def measure(func, *args):
+    """Runs func once and returns its result, the wall time and the peak memory it allocated"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {'seconds': elapsed, 'peak_mb': peak / 2 ** 20}
+
+
+def run(n_rows, col_names):
+    house_table = synthetic_house_table(n_rows)
+    plan = TransformPlan(col_names)
+
+    legacy, legacy_stats = measure(legacy_transformation, house_table, col_names)
+    planned, planned_stats = measure(plan.apply, house_table)
+
+    return {
+        'rows': n_rows,
+        'source_columns': plan.source_columns,
+        'legacy': legacy_stats,
+        'planned': planned_stats,
+        'speedup': legacy_stats['seconds'] / planned_stats['seconds'],
+        'memory_saved_mb': legacy_stats['peak_mb'] - planned_stats['peak_mb'],
+        'same_features': bool(np.array_equal(legacy.to_numpy(dtype=np.float64),
+                                              planned.to_numpy(dtype=np.float64))),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--output', help='Optional json file to write the results to')
+    args = parser.parse_args()
+
+    results = run(args.rows, list(registry.col_names))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,115 @@
+"""
+Compiled NumPy trees against XgBoost.predict.
+
+Checks that the TreeEnsemble gives the same predictions as the model, and compares the startup time
+(fresh interpreter: import xgboost and unpickle the model, or load the compiled arrays with NumPy only),
+the latency of a single row and the throughput of a batch.
+
+Run from the root of the repository:
+    python -m househunters_ml.benchmarks.bench_trees --rows 100000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from househunters_ml.registry import registry
+from househunters_ml.trees import compile_model
+
+STARTUP_XGBOOST = """
+import pickle, time
+start = time.perf_counter()
+import xgboost
+with open({model_path!r}, 'rb') as f:
+    model = pickle.load(f)
+print(time.perf_counter() - start)
+"""
+
+STARTUP_TREES = """
+import time
+start = time.perf_counter()
+from househunters_ml.trees import TreeEnsemble
+ensemble = TreeEnsemble.load({trees_path!r})
+print(time.perf_counter() - start)
+"""
+
+
+def startup_seconds(script):
+    output = subprocess.run([sys.executable, '-c', script], check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def latency_us(func, X, iterations):
+    latencies = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        func(X)
+        latencies[i] = time.perf_counter() - start
+    return float(np.percentile(latencies, 50) * 1e6)
+
+
+def random_features(n_rows, n_columns, seed=15):
+    """Integer features in the ranges the model was trained on, with some missing values"""
+    rng = np.random.RandomState(seed)
+    X = rng.randint(0, 4000, size=(n_rows, n_columns)).astype(np.float32)
+    X[:, 1] = rng.randint(0, 2, n_rows)
+    X[:, 6:] = rng.randint(0, 2, size=(n_rows, n_columns - 6))
+    X[rng.rand(n_rows, n_columns) < 0.01] = np.nan
+    return X
+
+
+def run(n_rows, iterations):
+    bundle = registry.get()
+    col_names = list(bundle.col_names)
+    ensemble = compile_model(bundle.model, col_names)
+
+    X = random_features(n_rows, len(col_names))
+    frame = pd.DataFrame(X, columns=col_names)
+
+    expected = bundle.model.predict(frame)
+    compiled = ensemble.predict(X)
+
+    with tempfile.TemporaryDirectory() as directory:
+        trees_path = os.path.join(directory, 'trees.npz')
+        ensemble.save(trees_path)
+        startup = {'xgboost_s': startup_seconds(STARTUP_XGBOOST.format(model_path=registry.model_path)),
+                   'trees_s': startup_seconds(STARTUP_TREES.format(trees_path=trees_path))}
+
+    start = time.perf_counter()
+    bundle.model.predict(frame)
+    xgboost_batch = time.perf_counter() - start
+    start = time.perf_counter()
+    ensemble.predict(X)
+    trees_batch = time.perf_counter() - start
+
+    return {
+        'trees': ensemble.n_trees,
+        'nodes': len(ensemble.feature),
+        'max_abs_difference': float(np.nanmax(np.abs(expected - compiled))),
+        'max_relative_difference': float(np.nanmax(np.abs(expected - compiled) / np.maximum(np.abs(expected), 1))),
+        'startup': startup,
+        'single_row_p50_us': {'xgboost': latency_us(bundle.model.predict, frame.iloc[:1], iterations),
+                              'trees': latency_us(ensemble.predict, X[:1], iterations)},
+        'batch_rows_per_second': {'xgboost': n_rows / xgboost_batch, 'trees': n_rows / trees_batch},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--output', help='Optional json file to write the results to')
+    args = parser.parse_args()
+
+    results = run(args.rows, args.iterations)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
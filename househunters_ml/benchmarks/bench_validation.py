@@ -0,0 +1,69 @@
+"""
+Cost of turning one request payload into model features: the old DataFrame.astype(int) path against the
+RequestValidator, which coerces and range checks every field in one pass.
+
+Both paths are timed on the house of curl-test.sh as json values and as the strings of a url or form
+request, and on a payload with a malformed field (pandas raises, the validator lists the bad field).
+
+Run from the root of the repository:
+    python -m househunters_ml.benchmarks.bench_validation --iterations 5000
+"""
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from househunters_ml.benchmarks.bench_predictor import SAMPLE_HOUSE, summarize, time_calls
+from househunters_ml.registry import registry
+from househunters_ml.validation import ValidationError, request_validator
+
+
+def dataframe_features(house_info):
+    """The features as the handlers of hh_app built them before the validator"""
+    df = pd.DataFrame(columns=registry.col_names)
+    df = pd.concat([df, pd.DataFrame([dict(house_info)])], ignore_index=True)[registry.col_names]
+    return df.astype(int)
+
+
+def run(iterations, warmup=50):
+    validator = request_validator(registry.col_names)
+    payloads = {
+        'json': SAMPLE_HOUSE,
+        'strings': {name: str(value) for name, value in SAMPLE_HOUSE.items()},
+        'malformed': dict(SAMPLE_HOUSE, LivingArea_m2='ninety'),
+    }
+
+    def tolerant(func):
+        def call(house_info):
+            try:
+                func(house_info)
+            except (TypeError, ValueError, ValidationError):
+                pass
+        return call
+
+    paths = {'dataframe_astype': tolerant(dataframe_features), 'validator': tolerant(validator.validate)}
+    results = {}
+    for payload_name, payload in payloads.items():
+        results[payload_name] = {}
+        for path_name, func in paths.items():
+            time_calls(func, payload, warmup)
+            results[payload_name][path_name] = summarize(time_calls(func, payload, iterations))
+        results[payload_name]['speedup_p50'] = (results[payload_name]['dataframe_astype']['p50_us'] /
+                                                results[payload_name]['validator']['p50_us'])
+    results['same_features'] = bool(np.array_equal(dataframe_features(payloads['strings']).to_numpy()[0],
+                                                   validator.validate(payloads['strings'])))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=5000)
+    parser.add_argument('--output', help='Optional json file to write the results to')
+    args = parser.parse_args()
+
+    results = run(args.iterations)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
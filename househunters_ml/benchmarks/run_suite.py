@@ -0,0 +1,270 @@
+"""
+Reproducible benchmark suite of the serving routes and the batch pipeline.
+
+Serving: drives /json_prediction, /url_prediction, /form_prediction and /predict_all (written to a file and
+streamed) at several concurrency levels, in-process through the Flask test client and over HTTP against a
+local threaded server. Records the throughput and the p50/p95/p99 latency of every route and level.
+The prediction cache is cleared before every route and level, so each level predicts its houses again
+instead of serving the ones the previous level cached.
+
+Offline: times test_transformation and the model prediction on synthetic HouseTables of 1x, 10x and 100x
+the size of the 190322 HouseTable.
+
+Everything runs in a temporary working directory with a synthetic HouseTable generated from a fixed seed,
+so runs on different commits get the same input. The results are written as json, and two result files
+can be compared:
+
+    python -m househunters_ml.benchmarks.run_suite --output before.json
+    python -m househunters_ml.benchmarks.run_suite --output after.json
+    python -m househunters_ml.benchmarks.run_suite --compare before.json after.json
+"""
+import argparse
+import importlib.metadata as importlib_metadata
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from househunters_ml.predict import csv_path, test_transformation
+from househunters_ml.registry import registry
+from househunters_ml.serving import prediction_cache
+from househunters_ml.synthetic import synthetic_house_table, write_synthetic_csv
+
+HOUSE_TABLE_ROWS = 3667
+
+
+def random_houses(n_houses, seed=15):
+    """Houses with the model features, different enough that they do not all hit the prediction cache"""
+    rng = np.random.RandomState(seed)
+    return [{
+        'LivingArea_m2': int(rng.randint(23, 385)),
+        'QuietRoad': int(rng.randint(0, 2)),
+        'Num_Bedrooms': int(rng.randint(1, 9)),
+        'StatusRank': int(rng.randint(1, 4000)),
+        'Avg_house_value_WOZ_1000euros': int(rng.randint(100, 900)),
+        'Avg_WOZ_m2': int(rng.randint(1000, 6000)),
+        'CitySide': int(rng.randint(0, 2)),
+        'HouseType_Detached': int(rng.randint(0, 2)),
+        'Age_cat_Before_war': int(rng.randint(0, 2)),
+        'Urbanity_class_5': int(rng.randint(0, 2)),
+    } for _ in range(n_houses)]
+
+
+# Route -> (method, path, how a house is sent)
+ROUTES = {
+    'json_prediction': ('POST', '/json_prediction', 'json'),
+    'url_prediction': ('GET', '/url_prediction', 'query'),
+    'form_prediction': ('POST', '/form_prediction', 'form'),
+    'predict_all': ('GET', '/predict_all', None),
+    'predict_all_stream': ('GET', '/predict_all?stream=1', None),
+}
+
+
+def summarize(latencies, wall_seconds):
+    latencies = np.asarray(latencies)
+    return {
+        'requests': len(latencies),
+        'throughput_rps': len(latencies) / wall_seconds,
+        'p50_ms': float(np.percentile(latencies, 50) * 1e3),
+        'p95_ms': float(np.percentile(latencies, 95) * 1e3),
+        'p99_ms': float(np.percentile(latencies, 99) * 1e3),
+    }
+
+
+def drive(send, houses, concurrency):
+    """Sends every house with `concurrency` threads, returns the latencies and the wall time"""
+    def timed(house):
+        start = time.perf_counter()
+        send(house)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed, houses))
+    return latencies, time.perf_counter() - start
+
+
+def in_process_sender(app, route):
+    method, path, encoding = ROUTES[route]
+    client = app.test_client()
+
+    def send(house):
+        if encoding == 'json':
+            response = client.open(path, method=method, data=json.dumps(house))
+        elif encoding == 'query':
+            response = client.open(path, method=method, query_string=house)
+        elif encoding == 'form':
+            response = client.open(path, method=method, data=house)
+        else:
+            response = client.open(path, method=method)
+        response.get_data()
+        if response.status_code != 200:
+            raise RuntimeError('{} returned {}'.format(route, response.status_code))
+    return send
+
+
+def http_sender(base_url, route):
+    method, path, encoding = ROUTES[route]
+
+    def send(house):
+        url, data, headers = base_url + path, None, {}
+        if encoding == 'json':
+            data = json.dumps(house).encode()
+        elif encoding == 'query':
+            url += '?' + urllib.parse.urlencode(house)
+        elif encoding == 'form':
+            data = urllib.parse.urlencode(house).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        request = urllib.request.Request(url, data=data, headers=headers, method=method)
+        with urllib.request.urlopen(request) as response:
+            response.read()
+    return send
+
+
+def start_http_server(app):
+    """Starts a threaded werkzeug server for app on a free local port"""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{}'.format(server.server_port)
+
+
+def serving_benchmarks(app, mode, concurrency_levels, n_requests, n_batch_requests):
+    results = {}
+    server = None
+    if mode == 'http':
+        server, base_url = start_http_server(app)
+    try:
+        for route in ROUTES:
+            send = in_process_sender(app, route) if mode == 'in_process' else http_sender(base_url, route)
+            n = n_batch_requests if route.startswith('predict_all') else n_requests
+            houses = random_houses(n)
+            send(houses[0])  # warm up
+            results[route] = {}
+            for concurrency in concurrency_levels:
+                prediction_cache.clear()
+                latencies, wall_seconds = drive(send, houses, concurrency)
+                results[route][str(concurrency)] = summarize(latencies, wall_seconds)
+    finally:
+        if server is not None:
+            server.shutdown()
+    return results
+
+
+def offline_benchmarks(scales, repeats=3):
+    """Times test_transformation and the model prediction at multiples of the HouseTable size"""
+    model = registry.model
+    results = {}
+    for scale in scales:
+        house_table = synthetic_house_table(HOUSE_TABLE_ROWS * scale)
+        transform_times, predict_times = [], []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            X_predict = test_transformation(house_table)
+            transform_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            model.predict(X_predict)
+            predict_times.append(time.perf_counter() - start)
+        results['{}x'.format(scale)] = {
+            'rows': len(house_table),
+            'transform_s': min(transform_times),
+            'predict_s': min(predict_times),
+            'rows_per_second': len(house_table) / (min(transform_times) + min(predict_times)),
+        }
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                universal_newlines=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    versions = {}
+    for package in ('numpy', 'pandas', 'xgboost', 'flask', 'werkzeug'):
+        try:
+            versions[package] = importlib_metadata.version(package)
+        except importlib_metadata.PackageNotFoundError:
+            versions[package] = None
+    return {'commit': commit or None, 'python': platform.python_version(), 'platform': platform.platform(),
+            'cpu_count': os.cpu_count(), 'packages': versions, 'timestamp': time.time(),
+            'prediction_cache': {'maxsize': prediction_cache.maxsize, 'ttl_seconds': prediction_cache.ttl,
+                                 'cleared_per_level': True}}
+
+
+def run(concurrency_levels, n_requests, n_batch_requests, scales):
+    from househunters_ml.hh_app import app
+
+    results = {'environment': environment()}
+    previous_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        # The routes read and write relative to the working directory, give them a synthetic HouseTable
+        os.chdir(directory)
+        try:
+            os.makedirs(os.path.dirname(csv_path))
+            write_synthetic_csv(csv_path, HOUSE_TABLE_ROWS)
+            registry.get()
+            results['in_process'] = serving_benchmarks(app, 'in_process', concurrency_levels, n_requests,
+                                                       n_batch_requests)
+            results['http'] = serving_benchmarks(app, 'http', concurrency_levels, n_requests, n_batch_requests)
+        finally:
+            os.chdir(previous_directory)
+    results['offline'] = offline_benchmarks(scales)
+    return results
+
+
+def compare(before, after):
+    """Ratios after/before of every throughput, latency and duration in two result files"""
+    ratios = {}
+
+    def walk(old, new, path):
+        for key, value in new.items():
+            if key == 'environment' or key not in old:
+                continue
+            if isinstance(value, dict):
+                walk(old[key], value, path + [key])
+            elif isinstance(value, (int, float)) and key != 'rows' and key != 'requests' and old[key]:
+                ratios['/'.join(path + [key])] = value / old[key]
+
+    walk(before, after, [])
+    return ratios
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=500, help='Requests per prediction route and level')
+    parser.add_argument('--batch-requests', type=int, default=10, help='Requests per /predict_all route and level')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='Compare two result files instead of running the suite')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            before = json.load(f)
+        with open(args.compare[1]) as f:
+            after = json.load(f)
+        for name, ratio in sorted(compare(before, after).items()):
+            print('{:<70} {:8.3f}'.format(name, ratio))
+        sys.exit(0)
+
+    results = run(args.concurrency, args.requests, args.batch_requests, args.scales)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,98 @@
+"""
+Bounded cache of predictions for repeated houses.
+
+Users re-submitting the sales form or paging back to a url lookup send the same features again. The cache
+keys predictions on the canonical feature row (the values in col_names order, as the model sees them) and
+the version of the model artifacts. Entries expire after ttl seconds, the least recently used entry is
+evicted when the cache is full, and the whole cache is dropped as soon as a different model version shows up.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    """LRU cache with a time to live, for predictions keyed on feature rows and the model version"""
+
+    def __init__(self, maxsize=10000, ttl=300.0, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(features):
+        """Canonical key of a feature row, independent of how the values were sent (strings, ints, order)"""
+        return np.ascontiguousarray(features, dtype=np.float32).tobytes()
+
+    def _check_version(self, version):
+        """Drops every entry when predictions of another model version are asked for; call with the lock held"""
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+            self._version = version
+
+    def get(self, features, version):
+        """Returns the cached prediction of the row, or None"""
+        key = self.key(features)
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > self._timer():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, features, version, value):
+        key = self.key(features)
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (value, self._timer() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, features, version, compute):
+        """Returns the cached prediction, or calls compute() and caches its result"""
+        value = self.get(features, version)
+        if value is None:
+            value = compute()
+            self.put(features, version, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'model_version': self._version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
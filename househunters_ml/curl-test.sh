@@ -22,4 +22,12 @@ curl -X POST -d '{
        'HouseType_Detached', 'Age_cat_Before war', 'Urbanity_class_5'
 
 
-http://127.0.0.1:5008/url_prediction?LivingArea_m2=90&QuietRoad=1&Num_Bedrooms=3&StatusRank=2233&Avg_house_value_WOZ_1000euros=600&Avg_WOZ_m2=60&CitySide=1&HouseType_Detached=0&Age_cat_Before_war=0&Urbanity_class_5=1
\ No newline at end of file
+http://127.0.0.1:5008/url_prediction?LivingArea_m2=90&QuietRoad=1&Num_Bedrooms=3&StatusRank=2233&Avg_house_value_WOZ_1000euros=600&Avg_WOZ_m2=60&CitySide=1&HouseType_Detached=0&Age_cat_Before_war=0&Urbanity_class_5=1
+
+
+curl -X POST -d '[
+{"LivingArea_m2":90, "QuietRoad":1, "Num_Bedrooms":3, "StatusRank":2233, "Avg_house_value_WOZ_1000euros":600, "Avg_WOZ_m2":60, "CitySide":1, "HouseType_Detached":0, "Age_cat_Before_war":0, "Urbanity_class_5":1},
+{"LivingArea_m2":140, "QuietRoad":0, "Num_Bedrooms":4, "StatusRank":1500, "Avg_house_value_WOZ_1000euros":350, "Avg_WOZ_m2":45, "CitySide":0, "HouseType_Detached":1, "Age_cat_Before_war":1, "Urbanity_class_5":0}
+]' http://127.0.0.1:5008/json_prediction
+
+curl -X POST -H 'Content-Type: application/x-ndjson' --data-binary $'{"LivingArea_m2":90, "QuietRoad":1, "Num_Bedrooms":3, "StatusRank":2233, "Avg_house_value_WOZ_1000euros":600, "Avg_WOZ_m2":60, "CitySide":1, "HouseType_Detached":0, "Age_cat_Before_war":0, "Urbanity_class_5":1}\n{"LivingArea_m2":140, "QuietRoad":0, "Num_Bedrooms":4, "StatusRank":1500, "Avg_house_value_WOZ_1000euros":350, "Avg_WOZ_m2":45, "CitySide":0, "HouseType_Detached":1, "Age_cat_Before_war":1, "Urbanity_class_5":0}\n' http://127.0.0.1:5008/json_prediction
@@ -0,0 +1,160 @@
+"""
+Columnar cache of the HouseTable csv.
+
+Parsing the semicolon-delimited csv with comma decimals and '.' thousands separators is slow, and batch
+predictions used to do it on every run. The first read of a csv stores the parsed frame in a binary,
+columnar file next to it (Parquet when pyarrow is installed, a pandas pickle otherwise) and later reads
+load that file instead.
+
+The csv is parsed with the compact dtypes of its declared schema (see schema.py), and the cache keeps them.
+The cache is valid as long as the csv keeps its modification time and size. When only the modification
+time changed (e.g. the file was copied or touched) the content hash decides whether it can still be used.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+from househunters_ml import schema
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+CACHE_DIR_NAME = '.cache'
+
+
+def _file_hash(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+class HouseTableCache:
+    """The cache files of one csv: the columnar data and a json file describing the csv it was built from"""
+
+    def __init__(self, data_location, cache_dir=None):
+        self.data_location = data_location
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(data_location)), CACHE_DIR_NAME)
+        self.cache_dir = cache_dir
+        name = os.path.basename(data_location)
+        self.format = 'parquet' if pq is not None else 'pickle'
+        self.data_path = os.path.join(cache_dir, '{}.{}'.format(name, self.format))
+        self.meta_path = os.path.join(cache_dir, '{}.json'.format(name))
+
+    def _csv_signature(self):
+        stat = os.stat(self.data_location)
+        return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _replace(self, path, write):
+        """
+        Calls write with a temporary file in the cache directory and moves it to path once it is written,
+        every process gets its own temporary file so concurrent builds do not write into each other's
+        """
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix='.tmp', delete=False) as f:
+            tmp_path = f.name
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _write_meta(self, meta):
+        def write(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump(meta, f)
+        self._replace(self.meta_path, write)
+
+    def is_valid(self):
+        """True when the cache was built from the csv as it is on disk now"""
+        meta = self._read_meta()
+        if meta is None or meta.get('format') != self.format or not os.path.exists(self.data_path):
+            return False
+        if meta.get('schema') != schema.SCHEMA_VERSION:
+            return False
+        signature = self._csv_signature()
+        if signature['mtime_ns'] == meta['mtime_ns'] and signature['size'] == meta['size']:
+            return True
+        if signature['size'] == meta['size'] and _file_hash(self.data_location) == meta['sha1']:
+            # Same content with a new modification time, remember it so the hash is not computed again
+            meta.update(signature)
+            self._write_meta(meta)
+            return True
+        return False
+
+    def build(self, frame=None):
+        """Writes the cache from the parsed csv, parsing it first when no frame is given"""
+        signature = self._csv_signature()
+        sha1 = _file_hash(self.data_location)
+        if frame is None:
+            frame = schema.read_csv(self.data_location)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if self.format == 'parquet':
+            self._replace(self.data_path, lambda tmp_path: frame.to_parquet(tmp_path, index=False))
+        else:
+            self._replace(self.data_path, frame.to_pickle)
+
+        meta = dict(signature, sha1=sha1, format=self.format, schema=schema.SCHEMA_VERSION, rows=len(frame))
+        self._write_meta(meta)
+        return frame
+
+    def read(self, columns=None):
+        if self.format == 'parquet':
+            return pd.read_parquet(self.data_path, columns=columns)
+        frame = pd.read_pickle(self.data_path)
+        return frame if columns is None else frame[columns]
+
+    def iter_chunks(self, chunksize, columns=None):
+        """Reads the Parquet cache in chunks of chunksize rows, with the row numbers of the csv as index"""
+        start = 0
+        for batch in pq.ParquetFile(self.data_path).iter_batches(batch_size=chunksize, columns=columns):
+            chunk = batch.to_pandas()
+            chunk.index = pd.RangeIndex(start, start + len(chunk))
+            start += len(chunk)
+            yield chunk
+
+
+def read_house_table(data_location, use_cache=True, columns=None):
+    """Reads the HouseTable from its columnar cache, building the cache when it is missing or outdated"""
+    if not use_cache:
+        return schema.read_csv(data_location, columns)
+
+    cache = HouseTableCache(data_location)
+    if cache.is_valid():
+        return cache.read(columns)
+    try:
+        frame = cache.build()
+    except OSError as e:
+        # A read-only data directory only means there is no cache
+        print('Could not write the HouseTable cache: {}'.format(e))
+        return schema.read_csv(data_location, columns)
+    return frame if columns is None else frame[columns]
+
+
+def iter_house_table(data_location, chunksize, use_cache=True, columns=None):
+    """
+    Reads the HouseTable in chunks of chunksize rows, only the given csv columns when columns is set.
+    A valid Parquet cache is read chunk by chunk, otherwise the csv itself is, so memory stays bounded
+    either way.
+    """
+    if use_cache and pq is not None:
+        cache = HouseTableCache(data_location)
+        if cache.is_valid():
+            return cache.iter_chunks(chunksize, columns)
+    return schema.iter_csv(data_location, chunksize, columns)
@@ -1,7 +1,21 @@
 # This is a web application of a real estate platform called HouseHunters that
-from flask import Flask, request, render_template
-import pandas as pd
-from househunters_ml.predict import XgBoost, col_names, test_transformation
+import os
+import signal
+import time
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context, url_for
+from househunters_ml import metrics
+from househunters_ml.assets import AssetCache
+from househunters_ml.batch import CHUNK_SIZE, stream_predictions_csv
+from househunters_ml.jobs import FINISHED
+from househunters_ml.pages import PRELOADED_PAGES, SALES_FORM, PageCache
+from househunters_ml.predictor import predictor
+from househunters_ml.registry import registry
+from househunters_ml.reloader import reloader
+from househunters_ml.serving import (InvalidParameter, batch_parameters, batcher, explain_houses, is_set,
+                                     job_manager, parse_json_body, positive_int, predict_house,
+                                     prediction_cache, reload_in_background, run_batch_prediction)
+from househunters_ml.store import store
+from househunters_ml.validation import ValidationError
 
 
 def shutdown_server():
@@ -11,13 +25,107 @@ def shutdown_server():
     func()
 
 
-app = Flask(__name__)
+# The static files are served from memory by the AssetCache under /media and /static
+app = Flask(__name__, static_folder=None)
+
+# Media and static files, read once at startup
+assets = AssetCache()
+
+# The pages are rendered once, only the prediction text of the sales form is filled in per request
+pages = PageCache(app.jinja_env)
+pages.preload(*PRELOADED_PAGES)
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    # Watches the model artifacts for a new version, see reloader.py
+    reloader.ensure_started()
+
+
+@app.after_request
+def record_request(response):
+    """Counts every request and its latency per route, responses with a 5xx status also count as errors"""
+    route = request.endpoint or 'unknown'
+    metrics.REQUESTS.inc(route, response.status_code)
+    if response.status_code >= 500:
+        metrics.ERRORS.inc(route)
+    start = g.get('request_start')
+    if start is not None:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, route)
+    bundle = registry.bundle_if_loaded()
+    if bundle is not None:
+        response.headers['X-Model-Version'] = bundle.version
+    return response
+
+
+@app.errorhandler(ValidationError)
+def invalid_house(error):
+    """A house with missing, malformed or out of range fields, every bad field is listed"""
+    return jsonify(errors=error.errors), 422
+
+
+@app.errorhandler(InvalidParameter)
+def invalid_parameter(error):
+    """A query parameter out of its range, e.g. ?chunksize=0, or a request body without a house"""
+    return jsonify(error=str(error)), 400
+
+
+@app.route('/admin/reload', methods=['POST'])
+def reload_model():
+    """
+    Loads, validates and warms up the model artifacts on disk in the background and swaps them in.
+    With ?wait=1 the reply only comes once the new model serves, or with the reason it was rejected.
+    Under the pre-fork server (serve.py) the master is signalled to reload the model for every worker,
+    with ?wait=1 the artifacts are validated in this worker first, without swapping them in here.
+    """
+    master_pid = app.config.get('HH_MASTER_PID')
+    if master_pid is not None and master_pid != os.getpid():
+        if is_set(request.args, 'wait'):
+            try:
+                reloader.load_validated()
+            except Exception:
+                return jsonify(reloader.status()), 422
+        os.kill(master_pid, signal.SIGHUP)
+        return jsonify(dict(reloader.status(), restarting_workers=True)), 202
+
+    if is_set(request.args, 'wait'):
+        try:
+            reloader.reload()
+        except Exception:
+            return jsonify(reloader.status()), 422
+        return jsonify(reloader.status())
+
+    reload_in_background()
+    return jsonify(reloader.status()), 202
+
+
+@app.route('/admin/model', methods=['GET'])
+def model_status():
+    """Version of the active model, the number of reloads and the error of the last failed one"""
+    return jsonify(reloader.status())
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request counts and stage latency histograms in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/', methods=['GET', 'POST'])
 def home():
     """Loads the homepage"""
-    return render_template('hh_home.html')
+    return pages.page('hh_home.html')
+
+
+@app.route('/media/<path:name>', methods=['GET'])
+def media(name):
+    return assets.response('media/' + name, request)
+
+
+@app.route('/static/<path:name>', methods=['GET'])
+def static_file(name):
+    return assets.response('static/' + name, request)
 
 
 @app.route('/shutdown', methods=['GET'])
@@ -28,9 +136,13 @@ def shutdown():
 
 
 def parse_json(request):
-    """Helper function to parse the data supplied in a json when loading the page"""
-    house_info = request.get_json(force=True)
-    return house_info
+    """
+    Helper function to parse the data supplied in a json when loading the page.
+    The body is a single house, a json array of houses or newline-delimited json with one house per line.
+    A line of newline-delimited json that cannot be parsed is returned as a ValueError in its place, a body
+    without a single house that can be parsed is answered with 400, see parse_json_body in serving.py.
+    """
+    return parse_json_body(request.get_data(as_text=True))
 
 
 @app.route('/json_prediction', methods=['GET', 'POST'])
@@ -38,78 +150,151 @@ def predict_json():
     """
     Runs a prediction with the model based on model features supplied through a json in a curl command.
     See curl-test.sh for a test of this function.
-    """
-    # Create empty DataFrame with exact order of columns as needed for prediction
-    df = pd.DataFrame(columns=col_names)
-    print(col_names)
 
-    house_info = parse_json(request)
+    A json array or newline-delimited json with several houses is predicted in one model call, the reply
+    then lists a price or an error for every house in the order they were sent.
+    """
+    with metrics.stage('predict_json', 'parse_json'):
+        house_info = parse_json(request)
 
-    df = df.append(house_info, ignore_index=True)
-    df = df.astype(int)
+    if isinstance(house_info, list):
+        metrics.BATCH_SIZE.observe(len(house_info), 'json_records')
+        with metrics.stage('predict_json', 'predict_records'):
+            results = predictor.predict_records(house_info)
+        predictions = [{'price': price} if error is None else {'error': error} for price, error in results]
+        return jsonify(predictions=predictions)
 
-    # Predict
-    predicted_asking_price = XgBoost.predict(df)[0]
+    # Predict, together with the other requests that arrive at the same time
+    predicted_asking_price = predict_house(house_info, 'predict_json', batched=True)
 
     return ('The suggested asking price for the house is %s' % predicted_asking_price)
 
 
+@app.route('/explain', methods=['GET', 'POST'])
+def explain():
+    """
+    How much every feature adds to or takes off the predicted price, on top of the base value of the model.
+    The house comes from the url (GET) or from a json body, a json array or newline-delimited json explains
+    every house in it in one pass and lists an explanation or an error per house.
+    """
+    if request.method == 'GET':
+        house_info = request.args
+    else:
+        with metrics.stage('explain', 'parse_json'):
+            house_info = parse_json(request)
+    if isinstance(house_info, list):
+        return jsonify(explanations=explain_houses(house_info))
+
+    # Raises the ValidationError of a single invalid house, answered with 422
+    return jsonify(explain_houses([house_info], raise_errors=True)[0])
+
+
 @app.route('/url_prediction', methods=['GET', 'POST'])
 def predict_url():
     """
      Runs a prediction with the model based on model features supplied through a url.
      See curl-test.sh for a test of this function.
      """
-    # Create empty DataFrame with exact order of columns as needed for prediction
-    house_info = {}
-
-    df = pd.DataFrame(columns=col_names)
-
-    for column in col_names:
-        house_info[column] = request.args.get(column)
+    # The predictor picks the model columns out of the url parameters in the right order
+    predicted_asking_price = predict_house(request.args, 'predict_url')
 
-    df = df.append(house_info, ignore_index=True)
-    print(df.values)
-    df = df.astype(int)
-    print(df.dtypes)
+    return ('The suggested asking price for the house is %s' % predicted_asking_price)
 
-    # Predict
-    predicted_asking_price = XgBoost.predict(df)[0]
 
-    return ('The suggested asking price for the house is %s' % predicted_asking_price)
+@app.route('/batching_stats', methods=['GET'])
+def batching_stats():
+    """Queue depth and batch size distribution of the micro-batcher in front of /json_prediction"""
+    return jsonify(batcher.stats())
 
 
-def load_batch_for_prediction(data_location="data/190322 - HouseTable_vDef_excel.csv"):
-    """Loads the data for a batch prediction"""
-    csv_path = "data/190322 - HouseTable_vDef_excel.csv"
-    test_df = pd.read_csv(r'{}'.format(csv_path),  delimiter=';', decimal=',', thousands='.')
-    return test_df
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """Hit, miss and eviction counters of the prediction cache"""
+    return jsonify(prediction_cache.stats())
 
 
 @app.route('/predict_all', methods=['GET'])
 def predict_all():
-    """Runs a batch prediction of the model"""
-    try:
-        X_predict = test_transformation(load_batch_for_prediction())
+    """
+    Runs a batch prediction of the model, see run_batch_prediction for ?workers=N and ?incremental=1.
+    ?workers= and ?chunksize= must be whole numbers of at least 1, otherwise the reply is a 400.
+    With ?stream=1 the HouseTable is read and scored in chunks of ?chunksize= rows and the scored rows
+    are streamed back as csv instead of being written to batch_predictions.csv.
+    With ?async=1 the batch prediction is submitted as a background job, see submit_job.
+    """
+    if is_set(request.args, 'async'):
+        return submit_job()
 
-        # Make new predictions
-        predicted = XgBoost.predict(X_predict)
+    workers, chunksize = batch_parameters(request.args)
+    incremental = is_set(request.args, 'incremental')
+    if is_set(request.args, 'stream') and workers <= 1 and not incremental:
+        return Response(stream_with_context(stream_predictions_csv(chunksize=chunksize)),
+                        mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=batch_predictions.csv'})
 
-        # Save the predictions to a csv file
-        X_predict['correct_prediction'] = predicted
-        X_predict.to_csv('batch_predictions.csv', header=True)
-        return 'prediction was successful'
+    return run_batch_prediction(workers, chunksize, incremental)
 
-    except Exception as e:
-        print(e)
-        return 'Error occurred'
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Submits a batch prediction of the HouseTable as a background job and returns its ID right away.
+    A ?chunksize= below 1 or that is not a whole number is answered with a 400, no job is created.
+    """
+    job = job_manager.submit(chunksize=positive_int(request.args, 'chunksize', CHUNK_SIZE))
+    reply = job.to_dict()
+    reply['status_url'] = url_for('job_status', job_id=job.id)
+    reply['result_url'] = url_for('job_result', job_id=job.id)
+    return jsonify(reply), 202
+
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """Lists all batch prediction jobs of this server"""
+    return jsonify(jobs=[job.to_dict() for job in job_manager.jobs()])
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Status, rows processed, throughput and the error (if any) of a batch prediction job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify(error='unknown job {}'.format(job_id)), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """Downloads the scored csv of a finished batch prediction job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify(error='unknown job {}'.format(job_id)), 404
+    if job.status != FINISHED:
+        return jsonify(job.to_dict()), 409
+    response = send_file(job.result_path, mimetype='text/csv')
+    response.headers['Content-Disposition'] = 'attachment; filename=batch_predictions_{}.csv'.format(job.id)
+    return response
+
+
+@app.route('/prediction/<int:listing_id>', methods=['GET'])
+def stored_prediction(listing_id):
+    """
+    The price of a listing stored by the batch predictions of the current model, or of the model version
+    given as ?version=. Served from the prediction store, see store.py, without calling the model.
+    """
+    version = request.args.get('version') or registry.version
+    prediction = store.get(listing_id, version)
+    if prediction is None:
+        return jsonify(error='no stored prediction for listing {} and model version {}'.format(listing_id, version),
+                       versions=store.versions(listing_id)), 404
+    return jsonify(prediction)
 
 
 # /Index route that displays the form
 @app.route('/post_listing', methods=['GET', 'POST'])
 def post_listing():
     """Web page for posting listings, here you can choose if you are a private or business seller"""
-    return render_template('hh_post_listing.html')
+    return pages.page('hh_post_listing.html')
 
 
 @app.route('/form_prediction', methods=['GET', 'POST'])
@@ -121,27 +306,24 @@ def predict_based_on_form():
     user_input = request.form
 
     if user_input == {}:
-        return render_template('hh_private_sales_form.html')
-
-    house_info = {}
-
-    df = pd.DataFrame(columns=col_names)
-
-    for column in col_names:
-        house_info[column] = user_input[column]
-
-    df = df.append(house_info, ignore_index=True)
-    df = df.astype(int)
+        return pages.page_with(SALES_FORM, 'pred', '')
 
     # Predict
-    predicted_asking_price = XgBoost.predict(df)[0]
+    try:
+        predicted_asking_price = predict_house(user_input, 'predict_based_on_form')
+    except ValidationError as e:
+        prediction_text = 'Please check the information on your house: {}'.format(e)
+        return pages.page_with(SALES_FORM, 'pred', prediction_text), 422
 
-    prediction_text = ('The suggested asking price for the house is ' % predicted_asking_price)
+    prediction_text = ('The suggested asking price for the house is %s' % predicted_asking_price)
 
-    return render_template('hh_private_sales_form.html', pred=prediction_text)
+    with metrics.stage('predict_based_on_form', 'render_template'):
+        return pages.page_with(SALES_FORM, 'pred', prediction_text)
 
 
 if __name__ == '__main__':
+    # Load the model once before serving so the first request does not pay for it
+    registry.get()
     app.run(port=5008,
             debug=True)  # Instantly see changes on the server
 
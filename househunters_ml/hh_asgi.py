@@ -0,0 +1,307 @@
+"""
+Async (ASGI) variant of the HouseHunters web application, with the routes of hh_app.
+
+hh_app is a sync Flask application: every request holds a server thread for as long as it runs, so a slow
+client or a long /predict_all ties one up. Here requests are handled on an asyncio event loop, which reads
+and parses them, while the model and the batch work run on two bounded thread pools: one for single
+predictions and one, smaller, for batch predictions, so a /predict_all never takes the threads that
+single predictions need. Json predictions go through the micro-batcher, whose futures are awaited
+without holding a thread. The micro-batcher, the caches and the batch jobs come from serving.py, like
+those of hh_app, so this module does not import the Flask application.
+
+The routes are those of hh_app except /media, /static (the pages load their css and images from CDNs),
+/batching_stats, /cache_stats and /shutdown. POST /admin/reload reloads the model of this process, there is
+no pre-fork master to signal.
+
+Requires Quart and an ASGI server (uvicorn or hypercorn):
+
+    python -m househunters_ml.hh_asgi --port 5008
+    uvicorn househunters_ml.hh_asgi:app --port 5008
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from jinja2 import Environment, FileSystemLoader
+from quart import Quart, Response, g, jsonify, request, send_file, url_for
+
+from househunters_ml import metrics
+from househunters_ml.batch import CHUNK_SIZE, stream_predictions_csv
+from househunters_ml.jobs import FINISHED
+from househunters_ml.pages import PRELOADED_PAGES, SALES_FORM, PageCache
+from househunters_ml.predictor import predictor
+from househunters_ml.registry import registry
+from househunters_ml.reloader import reloader
+from househunters_ml.serving import (InvalidParameter, batch_parameters, batcher, explain_houses, is_set,
+                                     job_manager, parse_json_body, positive_int, prediction_cache,
+                                     reload_in_background, run_batch_prediction)
+from househunters_ml.store import store
+from househunters_ml.validation import ValidationError
+
+app = Quart(__name__)
+
+# The Jinja environment of Quart renders asynchronously, the pages are rendered once with a plain one
+pages = PageCache(Environment(loader=FileSystemLoader(os.path.join(app.root_path, app.template_folder)),
+                              autoescape=True))
+pages.preload(*PRELOADED_PAGES)
+
+# Model calls of single predictions (url and form) and of json arrays
+inference_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('HH_ASGI_INFERENCE_THREADS', 4)),
+                                    thread_name_prefix='inference')
+
+# Batch predictions, queued behind each other when more than this many are requested at the same time
+batch_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('HH_ASGI_BATCH_THREADS', 1)),
+                                thread_name_prefix='batch')
+
+
+def run_in_pool(pool, func, *args):
+    return asyncio.get_running_loop().run_in_executor(pool, func, *args)
+
+
+@app.before_serving
+async def load_model():
+    # Loading the model takes seconds, do it before the first request and off the event loop
+    await run_in_pool(inference_pool, registry.get)
+
+
+@app.after_serving
+async def stop_jobs():
+    # Running jobs get HH_JOB_DRAIN_TIMEOUT seconds to finish, the others are marked failed
+    await run_in_pool(inference_pool, job_manager.shutdown)
+
+
+@app.before_request
+async def start_timer():
+    g.request_start = time.perf_counter()
+    reloader.ensure_started()
+
+
+@app.after_request
+async def record_request(response):
+    """Counts every request and its latency per route, like hh_app, and reports the model version"""
+    route = request.endpoint or 'unknown'
+    metrics.REQUESTS.inc(route, response.status_code)
+    if response.status_code >= 500:
+        metrics.ERRORS.inc(route)
+    start = g.get('request_start')
+    if start is not None:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, route)
+    bundle = registry.bundle_if_loaded()
+    if bundle is not None:
+        response.headers['X-Model-Version'] = bundle.version
+    return response
+
+
+@app.errorhandler(ValidationError)
+async def invalid_house(error):
+    return jsonify(errors=error.errors), 422
+
+
+@app.errorhandler(InvalidParameter)
+async def invalid_parameter(error):
+    return jsonify(error=str(error)), 400
+
+
+@app.route('/admin/reload', methods=['POST'])
+async def reload_model():
+    """Reloads the model artifacts like hh_app, on the inference pool with ?wait=1"""
+    if is_set(request.args, 'wait'):
+        try:
+            await run_in_pool(inference_pool, reloader.reload)
+        except Exception:
+            return jsonify(reloader.status()), 422
+        return jsonify(reloader.status())
+    reload_in_background()
+    return jsonify(reloader.status()), 202
+
+
+@app.route('/admin/model', methods=['GET'])
+async def model_status():
+    return jsonify(reloader.status())
+
+
+@app.route('/metrics', methods=['GET'])
+async def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/', methods=['GET', 'POST'])
+async def home():
+    """Loads the homepage"""
+    return pages.page('hh_home.html')
+
+
+async def predict_house(house_info, route, batched=False):
+    """
+    predict_house of hh_app: the features are checked and the cache is looked up on the event loop, a miss
+    waits for the micro-batcher (batched=True) or for a thread of the inference pool.
+    """
+    with metrics.stage(route, 'features'):
+        row = predictor.to_row(house_info)
+    version = registry.version
+    with metrics.stage(route, 'cache_lookup'):
+        predicted_asking_price = prediction_cache.get(row, version)
+    if predicted_asking_price is None:
+        with metrics.stage(route, 'predict'):
+            if batched:
+                predicted_asking_price = await asyncio.wait_for(asyncio.wrap_future(batcher.submit_row(row)),
+                                                                batcher.timeout)
+            else:
+                predicted_asking_price = (await run_in_pool(inference_pool, predictor.predict_rows, row[None, :]))[0]
+        prediction_cache.put(row, version, predicted_asking_price)
+    return predicted_asking_price
+
+
+@app.route('/json_prediction', methods=['GET', 'POST'])
+async def predict_json():
+    """Runs a prediction of one house, a json array of houses or newline-delimited json, like hh_app"""
+    body = await request.get_data(as_text=True)
+    with metrics.stage('predict_json', 'parse_json'):
+        house_info = parse_json_body(body)
+
+    if isinstance(house_info, list):
+        metrics.BATCH_SIZE.observe(len(house_info), 'json_records')
+        with metrics.stage('predict_json', 'predict_records'):
+            results = await run_in_pool(inference_pool, predictor.predict_records, house_info)
+        predictions = [{'price': price} if error is None else {'error': error} for price, error in results]
+        return jsonify(predictions=predictions)
+
+    predicted_asking_price = await predict_house(house_info, 'predict_json', batched=True)
+    return 'The suggested asking price for the house is %s' % predicted_asking_price
+
+
+@app.route('/explain', methods=['GET', 'POST'])
+async def explain():
+    """Per-feature price contributions of one house or of a batch of houses, like hh_app"""
+    if request.method == 'GET':
+        house_info = request.args
+    else:
+        house_info = parse_json_body(await request.get_data(as_text=True))
+    if isinstance(house_info, list):
+        return jsonify(explanations=await run_in_pool(inference_pool, explain_houses, house_info))
+
+    # raise_errors: a single invalid house is answered with 422
+    return jsonify((await run_in_pool(inference_pool, explain_houses, [house_info], True))[0])
+
+
+@app.route('/url_prediction', methods=['GET', 'POST'])
+async def predict_url():
+    """Runs a prediction with the model based on model features supplied through a url"""
+    predicted_asking_price = await predict_house(request.args, 'predict_url')
+    return 'The suggested asking price for the house is %s' % predicted_asking_price
+
+
+@app.route('/predict_all', methods=['GET'])
+async def predict_all():
+    """
+    Runs a batch prediction on the batch pool, with the options of hh_app (?stream=1, ?workers=N,
+    ?incremental=1, ?chunksize=, ?async=1). A streamed batch reads, scores and sends one chunk at a time.
+    """
+    if is_set(request.args, 'async'):
+        return await submit_job()
+
+    workers, chunksize = batch_parameters(request.args)
+    incremental = is_set(request.args, 'incremental')
+    if is_set(request.args, 'stream') and workers <= 1 and not incremental:
+        chunks = stream_predictions_csv(chunksize=chunksize)
+
+        async def stream():
+            while True:
+                text = await run_in_pool(batch_pool, next, chunks, None)
+                if text is None:
+                    return
+                yield text
+
+        return Response(stream(), mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=batch_predictions.csv'})
+
+    return await run_in_pool(batch_pool, run_batch_prediction, workers, chunksize, incremental)
+
+
+@app.route('/jobs', methods=['POST'])
+async def submit_job():
+    """Submits a batch prediction of the HouseTable as a background job, like hh_app"""
+    job = job_manager.submit(chunksize=positive_int(request.args, 'chunksize', CHUNK_SIZE))
+    reply = job.to_dict()
+    reply['status_url'] = url_for('job_status', job_id=job.id)
+    reply['result_url'] = url_for('job_result', job_id=job.id)
+    return jsonify(reply), 202
+
+
+@app.route('/jobs', methods=['GET'])
+async def list_jobs():
+    return jsonify(jobs=[job.to_dict() for job in job_manager.jobs()])
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+async def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify(error='unknown job {}'.format(job_id)), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+async def job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify(error='unknown job {}'.format(job_id)), 404
+    if job.status != FINISHED:
+        return jsonify(job.to_dict()), 409
+    response = await send_file(job.result_path, mimetype='text/csv')
+    response.headers['Content-Disposition'] = 'attachment; filename=batch_predictions_{}.csv'.format(job.id)
+    return response
+
+
+@app.route('/prediction/<int:listing_id>', methods=['GET'])
+async def stored_prediction(listing_id):
+    """The price of a listing stored by the batch predictions, like hh_app, looked up on the inference pool"""
+    version = request.args.get('version') or registry.version
+    prediction = await run_in_pool(inference_pool, store.get, listing_id, version)
+    if prediction is None:
+        versions = await run_in_pool(inference_pool, store.versions, listing_id)
+        error = 'no stored prediction for listing {} and model version {}'.format(listing_id, version)
+        return jsonify(error=error, versions=versions), 404
+    return jsonify(prediction)
+
+
+@app.route('/post_listing', methods=['GET', 'POST'])
+async def post_listing():
+    """Web page for posting listings, here you can choose if you are a private or business seller"""
+    return pages.page('hh_post_listing.html')
+
+
+@app.route('/form_prediction', methods=['GET', 'POST'])
+async def predict_based_on_form():
+    """
+    Web page where once you fill in the information on your house
+    you get a prediction of how much you should ask for your house
+    """
+    user_input = await request.form
+
+    if not user_input:
+        return pages.page_with(SALES_FORM, 'pred', '')
+
+    try:
+        predicted_asking_price = await predict_house(user_input, 'predict_based_on_form')
+    except ValidationError as e:
+        prediction_text = 'Please check the information on your house: {}'.format(e)
+        return pages.page_with(SALES_FORM, 'pred', prediction_text), 422
+
+    prediction_text = 'The suggested asking price for the house is %s' % predicted_asking_price
+
+    with metrics.stage('predict_based_on_form', 'render_template'):
+        return pages.page_with(SALES_FORM, 'pred', prediction_text)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5008)
+    args = parser.parse_args()
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
@@ -0,0 +1,134 @@
+"""
+Incremental batch predictions: only rows that changed since the last run are transformed and predicted.
+
+From one HouseTable export to the next only a small part of the listings change. Every run fingerprints
+the columns of each row that the model reads, with a hash keyed on the model version, and keeps the
+fingerprint, the features and the prediction of every listing ID in a state file next to the output csv.
+The next run reuses the stored features and prediction of every listing whose fingerprint did not
+change, and only scores new and changed listings. A new model changes every fingerprint, so its first run
+scores everything.
+
+    python -m househunters_ml.incremental --output output/predictions.csv
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from househunters_ml import data_cache, metrics
+from househunters_ml.predict import ID_COLUMN, csv_path, load_house_table, source_columns, test_transformation
+from househunters_ml.predictor import predictor
+from househunters_ml.registry import registry
+from househunters_ml.store import store
+
+FINGERPRINT_COLUMN = '_fingerprint'
+
+
+def fingerprints(house_table, columns, model_version):
+    """A 64 bit hash per row of the given columns, different for every model version"""
+    hash_key = (model_version + '0' * 16)[:16]
+    return pd.util.hash_pandas_object(house_table[columns], index=False, hash_key=hash_key).to_numpy()
+
+
+def state_path_for(output_path):
+    """The state of an output csv lives in a hidden directory next to it"""
+    directory, name = os.path.split(os.path.abspath(output_path))
+    extension = 'parquet' if data_cache.pq is not None else 'pkl'
+    return os.path.join(directory, '.incremental', '{}.{}'.format(name, extension))
+
+
+def load_state(state_path):
+    """Fingerprint, features and prediction of every listing ID of the previous run, None before the first"""
+    if not os.path.exists(state_path):
+        return None
+    if state_path.endswith('.parquet'):
+        return pd.read_parquet(state_path)
+    return pd.read_pickle(state_path)
+
+
+def save_state(state, state_path):
+    """Writes the state to a temporary file of its own and then moves it over the previous state in one step"""
+    directory = os.path.dirname(state_path)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as f:
+        try:
+            if state_path.endswith('.parquet'):
+                state.to_parquet(f)
+            else:
+                state.to_pickle(f)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    os.replace(f.name, state_path)
+
+
+def score_incremental(data_location=csv_path, output_path='output/predictions.csv', column='predictions',
+                      state_path=None, bundle=None):
+    """
+    Scores the HouseTable into output_path, reusing the predictions of the previous run for every listing
+    that did not change. Every row is fingerprinted and scored with one model: bundle, or the one the
+    registry serves when the run starts. Returns the number of rows scored and skipped.
+    """
+    start = time.perf_counter()
+    bundle = bundle or registry.get()
+    state_path = state_path or state_path_for(output_path)
+    columns = source_columns(bundle.col_names)
+    house_table = load_house_table(data_location, columns=[ID_COLUMN] + columns)
+    current = fingerprints(house_table, columns, bundle.version)
+
+    previous = load_state(state_path)
+    expected_columns = [FINGERPRINT_COLUMN] + list(bundle.col_names) + [column]
+    if previous is not None and list(previous.columns) != expected_columns:
+        # Written for other model columns or another prediction column, start over
+        previous = None
+    unchanged = np.zeros(len(house_table), dtype=bool)
+    if previous is not None:
+        positions = previous.index.get_indexer(house_table[ID_COLUMN])
+        found = positions >= 0
+        stored = previous[FINGERPRINT_COLUMN].to_numpy()
+        unchanged[found] = stored[positions[found]] == current[found]
+
+    changed = house_table[~unchanged]
+    scored = test_transformation(changed, bundle.col_names)
+    if len(scored):
+        metrics.BATCH_SIZE.observe(len(scored), 'incremental')
+        scored[column] = predictor.predict_rows(scored.to_numpy(dtype=np.float32), bundle)
+    else:
+        scored[column] = np.empty(0, dtype=np.float32)
+
+    pieces = [scored]
+    if unchanged.any():
+        reused = previous.iloc[positions[unchanged]].drop(columns=FINGERPRINT_COLUMN)
+        reused.index = house_table.index[unchanged]
+        pieces.append(reused[scored.columns])
+    X_predict = pd.concat(pieces).reindex(house_table.index) if len(pieces) > 1 else scored
+    X_predict.to_csv(output_path)
+    # Unchanged listings were stored by an earlier run with the same model version
+    store.upsert_many(changed[ID_COLUMN], scored[column], bundle.version)
+
+    state = X_predict.set_axis(house_table[ID_COLUMN].to_numpy(), axis=0)
+    state.insert(0, FINGERPRINT_COLUMN, current)
+    save_state(state[~state.index.duplicated(keep='last')], state_path)
+
+    return {
+        'rows': len(house_table),
+        'scored': int(len(changed)),
+        'skipped': int(unchanged.sum()),
+        'model_version': bundle.version,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=csv_path, help='HouseTable csv to score')
+    parser.add_argument('--output', default='output/predictions.csv')
+    parser.add_argument('--state', help='State file of the previous run, defaults to one next to the output')
+    args = parser.parse_args()
+
+    print(json.dumps(score_incremental(args.data, args.output, state_path=args.state), indent=2))
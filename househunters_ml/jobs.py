@@ -0,0 +1,290 @@
+"""
+Background jobs for batch predictions.
+
+A batch prediction submitted as a job runs on a small worker pool instead of in the request thread, so
+large batches do not hold on to a web worker. Every job has an ID that can be used to follow its progress
+(rows processed, throughput, the error if it failed) and to download the scored csv once it is finished.
+
+The state of every job is also written to <job id>.json in the job directory whenever it changes, so the
+workers of the pre-fork server (serve.py) can all answer for a job that one of them runs. Finished and
+failed jobs are removed, together with their result, HH_JOB_TTL seconds after they ended, and the oldest
+ones go first when there are more than HH_MAX_JOBS of them.
+
+A worker that stops gives its running jobs HH_JOB_DRAIN_TIMEOUT seconds to finish and marks the rest
+failed, see shutdown. A worker can also die without stopping (killed by the master for missing
+heartbeats, or crashed): a queued or running job whose process is gone, or that saved no progress for
+HH_JOB_STALE_AFTER seconds, is marked failed by the first process that reads it.
+"""
+import errno
+import json
+import os
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from househunters_ml import metrics
+from househunters_ml.batch import CHUNK_SIZE, iter_scored_chunks
+from househunters_ml.predict import csv_path
+
+JOB_DIR = os.environ.get('HH_JOB_DIR', 'output/jobs')
+JOB_TTL = float(os.environ.get('HH_JOB_TTL', 24 * 3600))
+MAX_JOBS = int(os.environ.get('HH_MAX_JOBS', 100))
+DRAIN_TIMEOUT = float(os.environ.get('HH_JOB_DRAIN_TIMEOUT', 30))
+STALE_AFTER = float(os.environ.get('HH_JOB_STALE_AFTER', 600))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+
+
+class JobAborted(Exception):
+    """The process running a job stops before the job finished"""
+
+
+def process_exists(pid):
+    """Whether a process with this pid runs on this machine"""
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno != errno.ESRCH
+    return True
+
+
+class Job:
+    """State of one batch prediction, updated by the worker that runs it"""
+
+    def __init__(self, data_location, chunksize, result_path):
+        self.id = uuid.uuid4().hex
+        self.data_location = data_location
+        self.chunksize = chunksize
+        self.result_path = result_path
+        self.status = QUEUED
+        self.rows_processed = 0
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # The process that runs the job and when it last saved progress
+        self.owner_pid = os.getpid()
+        self.saved_at = None
+
+    @property
+    def throughput(self):
+        """Rows per second since the job started running"""
+        if self.started_at is None:
+            return 0.0
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.rows_processed / elapsed if elapsed > 0 else 0.0
+
+    # Attributes written to the state file of a job
+    STATE = ['id', 'data_location', 'chunksize', 'result_path', 'status', 'rows_processed', 'error',
+             'submitted_at', 'started_at', 'finished_at', 'owner_pid', 'saved_at']
+
+    @classmethod
+    def from_state(cls, state):
+        job = cls.__new__(cls)
+        for name in cls.STATE:
+            setattr(job, name, state.get(name))
+        return job
+
+    @property
+    def ended(self):
+        return self.status in (FINISHED, FAILED)
+
+    def orphaned(self, now=None):
+        """Whether the job will never end: its process is gone, or it runs but stopped saving its progress"""
+        if self.ended:
+            return False
+        if self.owner_pid is None or not process_exists(self.owner_pid):
+            return True
+        now = time.time() if now is None else now
+        return self.status == RUNNING and now - (self.saved_at or self.started_at or 0) > STALE_AFTER
+
+    def fail(self, error):
+        self.error = error
+        self.finished_at = time.time()
+        self.status = FAILED
+
+    def save(self, job_dir):
+        """Writes the state of the job to <id>.json in job_dir, replacing the previous state in one step"""
+        self.saved_at = time.time()
+        with tempfile.NamedTemporaryFile('w', dir=job_dir, suffix='.tmp', delete=False) as f:
+            json.dump({name: getattr(self, name) for name in self.STATE}, f)
+        os.replace(f.name, os.path.join(job_dir, '{}.json'.format(self.id)))
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'rows_processed': self.rows_processed,
+            'rows_per_second': self.throughput,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+        }
+
+
+class JobManager:
+    """Runs batch predictions on a pool of worker threads and keeps track of their state"""
+
+    def __init__(self, max_workers=2, job_dir=JOB_DIR, ttl=JOB_TTL, max_jobs=MAX_JOBS):
+        self.job_dir = job_dir
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def submit(self, data_location=csv_path, chunksize=CHUNK_SIZE):
+        """Queues a batch prediction and returns its Job right away"""
+        os.makedirs(self.job_dir, exist_ok=True)
+        self.expire()
+        job = Job(data_location, chunksize, result_path=None)
+        # Known here before its state file exists, see _load
+        with self._lock:
+            self._jobs[job.id] = job
+        job.save(self.job_dir)
+        self._executor.submit(self._run, job)
+        return job
+
+    def _load(self, job_id):
+        """
+        The state of a job run by another process, None if there is no such job. A job whose process died
+        before it ended is marked failed and its partial result removed.
+        """
+        try:
+            with open(os.path.join(self.job_dir, '{}.json'.format(job_id))) as f:
+                job = Job.from_state(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+        # The jobs of this process are in _jobs, one with its pid that is not was left by an earlier process
+        if not job.ended and (job.owner_pid == os.getpid() or job.orphaned()):
+            job.fail('the process running the job ({}) stopped before it ended'.format(job.owner_pid))
+            self._remove(job.id, '.csv.part')
+            job.save(self.job_dir)
+        return job
+
+    def get(self, job_id):
+        """Returns the Job with this ID, or None if there is no such job"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None and self._expired_elsewhere(job):
+            return None
+        if job is None and job_id.isalnum():
+            job = self._load(job_id)
+        return job
+
+    def _expired_elsewhere(self, job):
+        """Whether another worker of the pre-fork server removed an ended job of this process"""
+        if not job.ended or os.path.exists(self._path(job.id, '.json')):
+            return False
+        with self._lock:
+            self._jobs.pop(job.id, None)
+        return True
+
+    def jobs(self):
+        """All jobs of the job directory, the ones of this process with their live state"""
+        with self._lock:
+            jobs = dict(self._jobs)
+        jobs = {job_id: job for job_id, job in jobs.items() if not self._expired_elsewhere(job)}
+        if os.path.isdir(self.job_dir):
+            for file_name in os.listdir(self.job_dir):
+                job_id, extension = os.path.splitext(file_name)
+                if extension == '.json' and job_id not in jobs:
+                    job = self._load(job_id)
+                    if job is not None:
+                        jobs[job_id] = job
+        return sorted(jobs.values(), key=lambda job: job.submitted_at)
+
+    def _path(self, job_id, extension):
+        return os.path.abspath(os.path.join(self.job_dir, job_id + extension))
+
+    def _remove(self, job_id, *extensions):
+        for extension in extensions:
+            try:
+                os.remove(self._path(job_id, extension))
+            except OSError:
+                pass
+
+    def expire(self, now=None):
+        """
+        Removes the jobs that ended more than ttl seconds ago and the oldest ended ones above max_jobs.
+        Jobs whose process died count as failed when they were found, see _load.
+        """
+        now = time.time() if now is None else now
+        jobs = self.jobs()
+        ended = [job for job in jobs if job.ended]
+        expired = [job for job in ended if now - job.finished_at > self.ttl]
+        # Running and queued jobs count towards the cap but are never removed
+        excess = len(jobs) - len(expired) - self.max_jobs
+        if excess > 0:
+            expired += [job for job in ended if job not in expired][:excess]
+        for job in expired:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            self._remove(job.id, '.json', '.csv', '.csv.part')
+        return len(expired)
+
+    def shutdown(self, timeout=DRAIN_TIMEOUT):
+        """
+        Stops the jobs of this process before it exits. Queued jobs are marked failed, running ones get
+        timeout seconds to finish and are then aborted at their next chunk or marked failed.
+        """
+        deadline = time.time() + timeout
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if job.status == QUEUED:
+                job.fail('the server stopped before the job ran')
+                job.save(self.job_dir)
+        while any(job.status == RUNNING for job in jobs) and time.time() < deadline:
+            time.sleep(0.1)
+        self._stopping.set()
+        for job in jobs:
+            if job.status == RUNNING:
+                job.fail('the server stopped while the job was running')
+                self._remove(job.id, '.csv.part')
+                job.save(self.job_dir)
+
+    def _run(self, job):
+        if job.ended:
+            # Failed by shutdown while it was queued
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        job.save(self.job_dir)
+        # The csv only gets its final name when it is complete
+        partial_path = self._path(job.id, '.csv.part')
+        try:
+            with open(partial_path, 'w', newline='') as f:
+                header = True
+                for scored in iter_scored_chunks(job.data_location, job.chunksize):
+                    if self._stopping.is_set():
+                        raise JobAborted('the server stopped while the job was running')
+                    with metrics.stage('predict_all', 'write'):
+                        scored.to_csv(f, header=header)
+                    header = False
+                    job.rows_processed += len(scored)
+                    job.save(self.job_dir)
+                if self._stopping.is_set():
+                    # Failed by shutdown while it scored the last chunk
+                    raise JobAborted('the server stopped while the job was running')
+            os.replace(partial_path, self._path(job.id, '.csv'))
+        except Exception as e:
+            traceback.print_exc()
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            job.fail('{}: {}'.format(type(e).__name__, e))
+        else:
+            # Whoever sees the status finished also sees when it finished and where the result is
+            job.finished_at = time.time()
+            job.result_path = self._path(job.id, '.csv')
+            job.status = FINISHED
+        job.save(self.job_dir)
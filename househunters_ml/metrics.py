@@ -0,0 +1,136 @@
+"""
+Latency histograms and counters of the prediction routes, exposed in the Prometheus text format at /metrics.
+
+Every prediction route times its stages (parsing, building the features, the cache lookup, the model call,
+rendering) and batch predictions time every chunk (read, transform, predict, write). Recording a value is a
+bisect over the bucket bounds and an increment under a lock, cheap enough to leave on in production.
+
+The metrics live in the memory of one process: behind the pre-fork server (serve.py) every worker has
+its own, and /metrics shows the worker that happened to handle the scrape.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0, 30.0, 60.0)
+
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536)
+
+
+def _format_labels(labelnames, values, extra=''):
+    pairs = ['{}="{}"'.format(name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+             for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per combination of label values"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labelvalues, value in sorted(values.items()):
+            yield '{}{} {}'.format(self.name, _format_labels(self.labelnames, labelvalues), _format_value(value))
+
+
+class Histogram:
+    """Counts of observed values per bucket, plus their sum and count, per combination of label values"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts (last one is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, *labelvalues):
+        """Context manager that observes the seconds spent in its block"""
+        return _Timer(self, labelvalues)
+
+    def samples(self):
+        with self._lock:
+            series = {labelvalues: (list(counts), total) for labelvalues, (counts, total) in self._series.items()}
+        bounds = [_format_value(float(bound)) for bound in self.buckets] + ['+Inf']
+        for labelvalues, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                yield '{}_bucket{} {}'.format(self.name, _format_labels(self.labelnames, labelvalues,
+                                                                         'le="{}"'.format(bound)), cumulative)
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield '{}_sum{} {}'.format(self.name, labels, _format_value(total))
+            yield '{}_count{} {}'.format(self.name, labels, cumulative)
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labelvalues', 'start')
+
+    def __init__(self, histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+        return False
+
+
+REQUESTS = Counter('hh_requests_total', 'Requests handled, by route and status code', ('route', 'status'))
+ERRORS = Counter('hh_request_errors_total', 'Requests that raised an error or returned a 5xx status', ('route',))
+REQUEST_SECONDS = Histogram('hh_request_seconds', 'Time spent handling a request, by route', ('route',))
+STAGE_SECONDS = Histogram('hh_stage_seconds', 'Time spent in each stage of a route or batch chunk',
+                          ('route', 'stage'))
+BATCH_SIZE = Histogram('hh_batch_size', 'Number of rows predicted with one model call, by source', ('source',),
+                       buckets=SIZE_BUCKETS)
+
+ALL_METRICS = [REQUESTS, ERRORS, REQUEST_SECONDS, STAGE_SECONDS, BATCH_SIZE]
+
+
+def stage(route, name):
+    """Times a stage of a route: with stage('predict_json', 'predict'): ..."""
+    return STAGE_SECONDS.time(route, name)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in ALL_METRICS:
+        lines.append('# HELP {} {}'.format(metric.name, metric.documentation))
+        lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,64 @@
+"""
+Pages of the web application rendered once instead of on every request.
+
+The home page and the post listing page have no variables, and of the sales form only the prediction
+text changes between requests, yet every request rendered the whole template through Jinja. A PageCache
+renders a page the first time it is asked for (the web application preloads its pages at startup) and
+keeps the html. A page with one variable is pre-rendered with a marker in place of the variable and
+split around it, so a request only escapes its own value and joins it with the static parts. A template
+whose variable does not render as plain escaped text (a filter on it, for instance) is rendered per
+request as before.
+
+With auto_reload on the Jinja environment (Flask debug mode) a page is rendered again once its
+template changed on disk.
+"""
+from markupsafe import Markup, escape
+
+# Stands in for the variable of a page while it is pre-rendered
+FRAGMENT_MARKER = '\x00fragment\x00'
+
+# Value that must come out escaped and unchanged for a pre-rendered page to be used
+PROBE = 'probe <&> "\''
+
+# Pages of the web applications, the sales form with its prediction text
+SALES_FORM = 'hh_private_sales_form.html'
+PRELOADED_PAGES = ('hh_home.html', 'hh_post_listing.html', (SALES_FORM, 'pred'))
+
+
+class PageCache:
+    """Pre-rendered pages of the templates of a Jinja environment"""
+
+    def __init__(self, environment):
+        self.environment = environment
+        # (template name, variable) -> (template, parts around the variable, or None to render per request)
+        self._pages = {}
+
+    def _parts(self, name, variable=None):
+        entry = self._pages.get((name, variable))
+        if entry is not None and not (self.environment.auto_reload and not entry[0].is_up_to_date):
+            return entry
+        template = self.environment.get_template(name)
+        if variable is None:
+            parts = [template.render()]
+        else:
+            parts = template.render({variable: Markup(FRAGMENT_MARKER)}).split(FRAGMENT_MARKER)
+            if template.render({variable: PROBE}) != str(escape(PROBE)).join(parts):
+                parts = None
+        entry = self._pages[(name, variable)] = (template, parts)
+        return entry
+
+    def preload(self, *names):
+        """Renders pages ahead of their first request, a name is a template or a (template, variable) pair"""
+        for name in names:
+            self._parts(*((name,) if isinstance(name, str) else name))
+
+    def page(self, name):
+        """The html of a template without variables"""
+        return self._parts(name)[1][0]
+
+    def page_with(self, name, variable, value):
+        """The html of a template with one variable, set to value (escaped like Jinja would)"""
+        template, parts = self._parts(name, variable)
+        if parts is None:
+            return template.render({variable: value})
+        return str(escape(value)).join(parts)
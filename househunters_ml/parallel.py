@@ -0,0 +1,148 @@
+"""
+Batch predictions of the HouseTable on all cores.
+
+The HouseTable is split into row ranges of chunksize rows, which a pool of worker processes transform and
+predict in parallel. The scored ranges come back in input order and are appended to the output csv one
+after the other, so the file is identical to the one written by a single process.
+
+The pool is forked after the model and the HouseTable are loaded: the workers share both with the parent
+copy-on-write, and only the row ranges and the scored rows travel between the processes. Every worker
+predicts with a single thread, the pool itself provides the parallelism.
+
+    python -m househunters_ml.parallel --workers 4 --chunksize 20000
+    python -m househunters_ml.parallel --scaling 1 2 4 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from househunters_ml.batch import CHUNK_SIZE
+from househunters_ml.predict import ID_COLUMN, csv_path, load_house_table, source_columns, test_transformation
+from househunters_ml.predictor import predictor
+from househunters_ml.registry import registry
+from househunters_ml.store import store
+
+BATCH_WORKERS = int(os.environ.get('HH_BATCH_WORKERS', 0)) or None
+START_METHOD = os.environ.get('HH_BATCH_START_METHOD', 'fork')
+
+# The HouseTable being scored and the model bundle scoring it, set in every worker by _init_worker
+_house_table = None
+_bundle = None
+
+
+def row_ranges(n_rows, chunksize=CHUNK_SIZE):
+    """(start, stop) of consecutive ranges of at most chunksize rows"""
+    return [(start, min(start + chunksize, n_rows)) for start in range(0, n_rows, chunksize)]
+
+
+def score_range(house_table, start, stop, column='predictions', bundle=None):
+    """
+    Transforms and predicts rows start to stop of the HouseTable, keeping their row numbers as index,
+    with the model of bundle or, by default, the one the registry serves
+    """
+    bundle = bundle or registry.get()
+    X_predict = test_transformation(house_table.iloc[start:stop], bundle.col_names)
+    X_predict[column] = predictor.predict_rows(X_predict.to_numpy(dtype=np.float32), bundle)
+    return X_predict
+
+
+def _init_worker(house_table, bundle):
+    global _house_table, _bundle
+    _house_table = house_table
+    _bundle = bundle
+    # Cores are shared out over the workers, not over the threads of one prediction
+    bundle.model.get_booster().set_param('nthread', 1)
+
+
+def _score_range(task):
+    return score_range(_house_table, *task, bundle=_bundle)
+
+
+def iter_scored_ranges(house_table, workers=None, chunksize=CHUNK_SIZE, column='predictions', bundle=None):
+    """
+    Yields the HouseTable scored range by range, in input order, as the pool finishes them. Every range is
+    scored with bundle, or with the one the registry serves when the first range is scored.
+    """
+    workers = workers or BATCH_WORKERS or os.cpu_count() or 1
+    # Loaded before forking so the workers inherit the model instead of each loading their own
+    bundle = bundle or registry.get()
+    tasks = [(start, stop, column) for start, stop in row_ranges(len(house_table), chunksize)]
+    if workers == 1:
+        for task in tasks:
+            yield score_range(house_table, *task, bundle=bundle)
+        return
+
+    context = multiprocessing.get_context(START_METHOD)
+    with context.Pool(workers, initializer=_init_worker, initargs=(house_table, bundle)) as pool:
+        # imap keeps the input order while up to `workers` ranges are scored at the same time
+        for scored in pool.imap(_score_range, tasks):
+            yield scored
+
+
+def predict_parallel(data_location=csv_path, output_path='output/predictions.csv', workers=None,
+                     chunksize=CHUNK_SIZE, column='predictions', bundle=None):
+    """
+    Scores the HouseTable with a pool of workers into output_path, returns the rows and the timings.
+    All rows are scored with bundle, or with the one the registry serves when the run starts.
+    """
+    workers = workers or BATCH_WORKERS or os.cpu_count() or 1
+    bundle = bundle or registry.get()
+    start = time.perf_counter()
+    house_table = load_house_table(data_location, columns=[ID_COLUMN] + source_columns(bundle.col_names))
+    read_seconds = time.perf_counter() - start
+
+    header = True
+    with open(output_path, 'w', newline='') as f:
+        for scored in iter_scored_ranges(house_table, workers, chunksize, column, bundle):
+            scored.to_csv(f, header=header)
+            header = False
+            store.upsert_many(house_table[ID_COLUMN].loc[scored.index], scored[column], bundle.version)
+    seconds = time.perf_counter() - start
+    return {
+        'rows': len(house_table),
+        'workers': workers,
+        'chunksize': chunksize,
+        'chunks': len(row_ranges(len(house_table), chunksize)),
+        'read_s': read_seconds,
+        'score_s': seconds - read_seconds,
+        'seconds': seconds,
+        'rows_per_second': len(house_table) / seconds,
+    }
+
+
+def scaling_report(data_location=csv_path, worker_counts=(1, 2, 4), chunksize=CHUNK_SIZE,
+                   output_path='output/predictions.csv'):
+    """
+    Scores the HouseTable once per worker count and reports the speedup over one worker and the scaling
+    efficiency (speedup / workers, 1.0 is perfect scaling). An untimed run first builds the cache of the
+    HouseTable and loads the model, and the speedup compares the scoring only, not the read.
+    """
+    predict_parallel(data_location, output_path, 1, chunksize)
+    runs = [predict_parallel(data_location, output_path, workers, chunksize) for workers in worker_counts]
+    baseline = next((run for run in runs if run['workers'] == 1), runs[0])
+    for run in runs:
+        run['speedup'] = baseline['score_s'] / run['score_s'] * baseline['workers']
+        run['efficiency'] = run['speedup'] / run['workers']
+    return {'cpu_count': os.cpu_count(), 'runs': runs}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=csv_path, help='HouseTable csv to score')
+    parser.add_argument('--output', default='output/predictions.csv')
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS,
+                        help='Number of worker processes, defaults to HH_BATCH_WORKERS or the number of cores')
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE, help='Rows per range sent to a worker')
+    parser.add_argument('--scaling', type=int, nargs='+', metavar='WORKERS',
+                        help='Score once per worker count and report the scaling efficiency')
+    args = parser.parse_args()
+
+    if args.scaling:
+        results = scaling_report(args.data, args.scaling, args.chunksize, args.output)
+    else:
+        results = predict_parallel(args.data, args.output, args.workers, args.chunksize)
+    print(json.dumps(results, indent=2))
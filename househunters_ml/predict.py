@@ -1,8 +1,9 @@
-import numpy as np
 import pandas as pd
 import random
 import warnings
-import pickle
+from househunters_ml.data_cache import read_house_table
+from househunters_ml.registry import registry
+from househunters_ml.transform import transform_plan
 warnings.filterwarnings("ignore")
 pd.options.mode.chained_assignment = None
 
@@ -11,79 +12,48 @@ random.seed(15)
 
 csv_path = "data/190322 - HouseTable_vDef_excel.csv"
 
-df = pd.read_csv(r'{}'.format(csv_path),  delimiter=';', decimal=',', thousands='.')
+# Listing ID of every row of the HouseTable
+ID_COLUMN = 'ID'
 
-test_df = pd.read_csv(r'{}'.format(csv_path),  delimiter=';', decimal=',', thousands='.')
 
+def load_house_table(data_location=csv_path, columns=None):
+    """
+    Reads the HouseTable csv, only used by batch predictions and never on import.
+    After the first read the parsed table comes from a columnar cache next to the csv, see data_cache.py.
+    Columns are read with the compact dtypes of schema.py, only the given csv columns when columns is set.
+    """
+    return read_house_table(data_location, columns=columns)
 
-# Load the model
-XgBoost = pickle.load(open('model/model.pickle', 'rb'))
 
-# Load the column names
-col_names = pickle.load(open('model/columns.pickle', 'rb'))
+def __getattr__(name):
+    """
+    The model and the column names used to be loaded at import time as module globals.
+    They are now served from the registry, which loads them on first use.
+    """
+    if name == 'XgBoost':
+        return registry.model
+    if name == 'col_names':
+        return registry.col_names
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 
-#TODO: Figure out how this horrendous function can be improved, which parts are redundant.
-def test_transformation(prediction_set):
-    prediction_set_copy = prediction_set.copy()
-    prediction_set_copy = prediction_set_copy.rename(columns={"#Bedrooms": "Num_Bedrooms"})
+def source_columns(col_names=None):
+    """The HouseTable csv columns that test_transformation needs for col_names, the model's by default"""
+    return transform_plan(registry.col_names if col_names is None else col_names).csv_columns
 
-    prediction_set_copy['Age_cat'] = prediction_set_copy['ConstructionYear']
-    prediction_set_copy['Age_cat'][prediction_set_copy['ConstructionYear'] < 1940] = 'Before_war'
-    prediction_set_copy['Age_cat'][(prediction_set_copy['ConstructionYear'] >= 1940) &
-                                   (prediction_set_copy['ConstructionYear'] < 1990)] = 'Existing'
-    prediction_set_copy['Age_cat'][prediction_set_copy['ConstructionYear'] >= 1990] = 'New_construction'
 
-    #    iii. Create dummy-variable whether a house in the city- or countryside
-    cityside = ['Noord Holland',
-                'Zuid Holland',
-                'Utrecht'
-                ]
-
-    countryside = ['Zeeland',
-                   'Fryslân',
-                   'Groningen',
-                   'Drenthe'
-                   ]
-
-    prediction_set_copy['CitySide'] = prediction_set_copy['Province'].isin(cityside).astype(np.int8)
-    prediction_set_copy['CountrySide'] = prediction_set_copy['Province'].isin(countryside).astype(np.int8)
-
-    prediction_set_copy['good_hood'] = (prediction_set_copy.Num_benefit_total - prediction_set_copy.Num_AOW) < 1000
-    prediction_set_copy['enough_bedroom'] = prediction_set_copy['Num_Bedrooms']
-
-    dataProv = prediction_set_copy['Province']
-    dataHouse = prediction_set_copy['HouseType']
-    dataAge = prediction_set_copy['Age_cat']
-    dataUrban = prediction_set_copy['Urbanity_class']
-
-    # Get/add dummies
-    categoricals = ['Province',
-                    'HouseType',
-                    'Age_cat',
-                    'Urbanity_class',
-                    'Garden'
-                    ]
-    prediction_set_copy = pd.get_dummies(prediction_set_copy, columns=categoricals)
-
-    # Add the original categorical column
-    prediction_set_copy['Province'] = dataProv
-    prediction_set_copy['HouseType'] = dataHouse
-    prediction_set_copy['Age_cat'] = dataAge
-    prediction_set_copy['Urbanity_class'] = dataUrban
-
-    prediction_set_copy = prediction_set_copy[col_names]
-
-    return prediction_set_copy
+def test_transformation(prediction_set, col_names=None):
+    """
+    Turns raw HouseTable rows into the model features, in the order of col_names (of the current model by
+    default). Only the source columns and derived features that col_names needs are computed, see
+    transform.py.
+    """
+    return transform_plan(registry.col_names if col_names is None else col_names).apply(prediction_set)
 
 
 if __name__ == '__main__':
+    from househunters_ml.parallel import predict_parallel
 
-    X_predict = test_transformation(df)
-
-    # Make new predictions
-    predicted = XgBoost.predict(X_predict)
-
-    # Save the predictions to a csv file
-    X_predict['predictions'] = predicted
-    X_predict.to_csv('output/predictions.csv')
\ No newline at end of file
+    # Transform, predict and save the predictions to a csv file, in row ranges on all cores
+    # (HH_BATCH_WORKERS=1 scores on a single core, see parallel.py for the options)
+    print(predict_parallel(output_path='output/predictions.csv'))
\ No newline at end of file
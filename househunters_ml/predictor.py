@@ -0,0 +1,133 @@
+"""
+Scores single houses without building a pandas DataFrame.
+
+The handlers of hh_app used to create an empty DataFrame with the model columns, append the house to it
+and cast it with astype(int) before every prediction. The Predictor writes the values straight into a
+preallocated NumPy row in the order of col_names and hands it to the booster of the model.
+
+Single rows and batches share one inference path: the features are kept in C-contiguous float32 arrays,
+the dtype of the booster, and predicted in place, so no DMatrix is built and nothing is converted or
+copied per call. Boosters of XGBoost versions without inplace_predict fall back to a DMatrix.
+"""
+import threading
+
+import numpy as np
+import xgboost as xgb
+
+from househunters_ml.registry import registry
+from househunters_ml.validation import request_validator
+
+
+def predict_inplace(booster, rows, feature_names):
+    """Predicts a 2d array in the order of feature_names, only copied when it is not C-contiguous float32"""
+    rows = np.ascontiguousarray(rows, dtype=np.float32)
+    if hasattr(booster, 'inplace_predict'):
+        return booster.inplace_predict(rows)
+    return booster.predict(xgb.DMatrix(rows, feature_names=feature_names))
+
+
+class Predictor:
+    """Maps house dictionaries onto the model columns and predicts with the booster directly"""
+
+    def __init__(self, model_registry=registry):
+        self.registry = model_registry
+        # (bundle, booster, feature names), swapped as a whole so threads never see a mix of two models
+        self._state = (None, None, None)
+        self._local = threading.local()
+
+    def _refresh(self):
+        """Picks up the bundle of the registry, the booster is only looked up again when it changed"""
+        bundle = self.registry.get()
+        state = self._state
+        if bundle is not state[0]:
+            state = (bundle, bundle.model.get_booster(), list(bundle.col_names))
+            self._state = state
+        return state
+
+    @property
+    def col_names(self):
+        return self._refresh()[0].col_names
+
+    def row_buffer(self, n_columns=None):
+        """
+        The preallocated (1, n_columns) float32 row of the calling thread, every thread gets its own so
+        concurrent requests do not overwrite each other. The row is reused by the next call of the thread.
+        """
+        if n_columns is None:
+            n_columns = len(self._refresh()[2])
+        row = getattr(self._local, 'row', None)
+        if row is None or row.shape[1] != n_columns:
+            row = np.empty((1, n_columns), dtype=np.float32)
+            self._local.row = row
+        return row
+
+    def to_row(self, house_info, out=None, col_names=None):
+        """
+        Writes the model features of house_info into a row in the order of col_names.
+        Raises a ValidationError listing the missing, malformed and out of range fields, see validation.py.
+        """
+        if col_names is None:
+            col_names = self.col_names
+        return request_validator(col_names).validate(house_info, out)
+
+    def predict_rows(self, rows, bundle=None):
+        """
+        Predicts a 2d array whose columns are in the order of col_names, with the model of the registry or
+        with that of bundle, which batch runs pass so all their rows are scored by the same model
+        """
+        if bundle is None:
+            _, booster, feature_names = self._refresh()
+        else:
+            booster, feature_names = bundle.model.get_booster(), list(bundle.col_names)
+        return predict_inplace(booster, rows, feature_names)
+
+    def contributions_rows(self, rows):
+        """
+        Per-feature contributions to the predictions of a 2d array of rows (SHAP values along the tree paths),
+        computed in one pass over the booster. One column per feature in the order of col_names and a last
+        column with the base value, every row adds up to its prediction.
+        """
+        _, booster, feature_names = self._refresh()
+        return booster.predict(xgb.DMatrix(rows, feature_names=feature_names), pred_contribs=True)
+
+    def predict_one(self, house_info):
+        """Predicts the asking price of a single house given as a dictionary (json, url args or form)"""
+        _, booster, feature_names = self._refresh()
+        row = self.row_buffer(len(feature_names))
+        self.to_row(house_info, out=row[0], col_names=feature_names)
+        return predict_inplace(booster, row, feature_names)[0]
+
+    def predict_records(self, records):
+        """
+        Predicts many houses with one vectorized model call.
+        Returns one (price, error) pair per record in input order, invalid records get an error message
+        instead of a price and do not stop the others from being predicted. A record can also be the
+        exception raised while parsing it, its message is then returned as the error.
+        """
+        _, booster, feature_names = self._refresh()
+        rows = np.empty((len(records), len(feature_names)), dtype=np.float32)
+        errors = [None] * len(records)
+        valid = []
+        for i, record in enumerate(records):
+            if isinstance(record, Exception):
+                errors[i] = str(record)
+                continue
+            try:
+                if not isinstance(record, dict):
+                    raise ValueError('a house must be a json object, got {!r}'.format(record))
+                self.to_row(record, out=rows[len(valid)], col_names=feature_names)
+            except ValueError as e:
+                errors[i] = str(e)
+            else:
+                valid.append(i)
+
+        prices = [None] * len(records)
+        if valid:
+            predictions = predict_inplace(booster, rows[:len(valid)], feature_names)
+            for i, prediction in zip(valid, predictions):
+                prices[i] = float(prediction)
+        return list(zip(prices, errors))
+
+
+# The predictor shared by the routes of the web application
+predictor = Predictor()
@@ -0,0 +1,101 @@
+"""
+Keeps the model artifacts (model.pickle and columns.pickle) of the HouseHunters prediction engine.
+
+Nothing is read at import time. The first caller that needs the model or the column manifest loads
+both from disk, every later caller in the same process gets the objects that are already in memory.
+"""
+import hashlib
+import os
+import pickle
+import threading
+from collections import namedtuple
+
+MODEL_DIR = os.environ.get('HH_MODEL_DIR',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model'))
+
+# The model and the column names it was trained on always travel together. The version is a hash of the
+# artifact files, so anything derived from a model (e.g. cached predictions) can tell which model it came from
+# (the signature holds the modification times and sizes of the files it was read from, see signature())
+ModelBundle = namedtuple('ModelBundle', ['model', 'col_names', 'version', 'signature'])
+
+
+class ModelRegistry:
+    """Lazily loads the model and the column manifest once per process"""
+
+    def __init__(self, model_dir=MODEL_DIR):
+        self.model_dir = model_dir
+        self._bundle = None
+        self._lock = threading.Lock()
+
+    @property
+    def model_path(self):
+        return os.path.join(self.model_dir, 'model.pickle')
+
+    @property
+    def columns_path(self):
+        return os.path.join(self.model_dir, 'columns.pickle')
+
+    def signature(self):
+        """Modification times and sizes of the artifact files, None while one of them is missing"""
+        try:
+            return tuple((stat.st_mtime_ns, stat.st_size)
+                         for stat in map(os.stat, (self.model_path, self.columns_path)))
+        except OSError:
+            return None
+
+    def load(self):
+        """Reads the artifacts from disk, regardless of whether they were loaded before"""
+        # Taken before reading, so files replaced while they are read count as changed afterwards
+        signature = self.signature()
+        with open(self.model_path, 'rb') as f:
+            model_bytes = f.read()
+        with open(self.columns_path, 'rb') as f:
+            columns_bytes = f.read()
+        version = hashlib.sha1(model_bytes + columns_bytes).hexdigest()[:12]
+        return ModelBundle(model=pickle.loads(model_bytes), col_names=pickle.loads(columns_bytes),
+                           version=version, signature=signature)
+
+    def get(self):
+        """Returns the loaded bundle, loading it on the first call"""
+        bundle = self._bundle
+        if bundle is None:
+            with self._lock:
+                if self._bundle is None:
+                    self._bundle = self.load()
+                bundle = self._bundle
+        return bundle
+
+    def install(self, bundle):
+        """Replaces the bundle that is served, callers that already got the old one keep using it"""
+        with self._lock:
+            self._bundle = bundle
+
+    def reload(self):
+        """Loads the artifacts from disk again and replaces the bundle that is served"""
+        bundle = self.load()
+        self.install(bundle)
+        return bundle
+
+    def bundle_if_loaded(self):
+        """The bundle that is served, None when nothing was loaded yet (never loads it)"""
+        return self._bundle
+
+    @property
+    def loaded(self):
+        return self._bundle is not None
+
+    @property
+    def model(self):
+        return self.get().model
+
+    @property
+    def col_names(self):
+        return self.get().col_names
+
+    @property
+    def version(self):
+        return self.get().version
+
+
+# The registry shared by the web application and the batch scripts
+registry = ModelRegistry()
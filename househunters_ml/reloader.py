@@ -0,0 +1,178 @@
+"""
+Hot reload of the model artifacts without restarting the server.
+
+A watcher thread polls the modification time and size of model.pickle and columns.pickle. Once they
+differ from those of the files the served bundle was read from (ModelBundle.signature, so a process
+forked after the files changed still notices) and then stayed the same for one more poll (so a file
+that is still being copied is not read), the new bundle is loaded, validated and warmed up in the
+background while the old one keeps serving.
+Only then is it swapped into the registry in one assignment: requests that already picked up the old
+bundle finish on it, the next ones get the new one. A bundle that fails to load or validate is reported
+and the old one stays active.
+
+POST /admin/reload triggers the same reload without waiting for the watcher. Under the pre-fork server
+(serve.py) the workers neither watch nor reload on their own: the master polls the files with changed()
+and replaces the workers once they changed, like on SIGHUP.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from househunters_ml.predictor import predict_inplace
+from househunters_ml.registry import registry
+
+WATCH_INTERVAL = float(os.environ.get('HH_MODEL_WATCH_INTERVAL', 2.0))
+
+# Rows predicted with a new model before it is swapped in
+WARM_UP_ROWS = 64
+
+
+class InvalidModelError(ValueError):
+    """The model artifacts on disk cannot be served"""
+
+
+def validate(bundle):
+    """Checks that the model and the column manifest of a bundle belong together"""
+    col_names = list(bundle.col_names)
+    if not col_names or not all(isinstance(name, str) for name in col_names):
+        raise InvalidModelError('columns.pickle must hold a non-empty list of column names')
+    if len(set(col_names)) != len(col_names):
+        raise InvalidModelError('columns.pickle holds duplicate column names')
+    if not hasattr(bundle.model, 'get_booster'):
+        raise InvalidModelError('model.pickle holds a {}, not an XGBoost model'.format(type(bundle.model).__name__))
+    booster = bundle.model.get_booster()
+    if booster.num_features() != len(col_names):
+        raise InvalidModelError('the model expects {} features, columns.pickle lists {}'.format(
+            booster.num_features(), len(col_names)))
+    if booster.feature_names is not None and list(booster.feature_names) != col_names:
+        raise InvalidModelError('the feature names of the model differ from columns.pickle')
+
+
+def warm_up(bundle, n_rows=WARM_UP_ROWS):
+    """Predicts a batch with the new booster so its first real request does not pay for the setup"""
+    booster = bundle.model.get_booster()
+    rows = np.zeros((n_rows, len(bundle.col_names)), dtype=np.float32)
+    predictions = predict_inplace(booster, rows, list(bundle.col_names))
+    if predictions.shape != (n_rows,) or not np.all(np.isfinite(predictions)):
+        raise InvalidModelError('the model does not return one finite prediction per row')
+
+
+class ModelReloader:
+    """Watches the artifacts of a registry and swaps in new versions once they are loaded and validated"""
+
+    def __init__(self, model_registry=registry, interval=WATCH_INTERVAL):
+        self.registry = model_registry
+        self.interval = interval
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._rejected_signature = None
+        self._pending_signature = None
+        self.loaded_at = None
+        self.reloads = 0
+        self.last_error = None
+
+    def ensure_started(self):
+        """Starts the watcher thread on first use, and again in a process forked after it was started"""
+        if self.interval <= 0 or (self._thread is not None and self._pid == os.getpid()):
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._watch, name='model-reloader', daemon=True)
+                self._thread.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                print('Model reload failed, the previous model stays active: {}'.format(e))
+
+    def changed(self):
+        """
+        True once the artifacts differ from those of the served bundle and stayed unchanged for one poll.
+        Before the first bundle is loaded there is nothing to reload.
+        """
+        signature = self.registry.signature()
+        active = self.registry.bundle_if_loaded()
+        if signature is None or active is None or signature in (active.signature, self._rejected_signature):
+            self._pending_signature = None
+            return False
+        if signature != self._pending_signature:
+            # Changed since the last poll, maybe still being written
+            self._pending_signature = signature
+            return False
+        self._pending_signature = None
+        return True
+
+    def check(self):
+        """Reloads once changed() says the artifacts changed, returns True if it did"""
+        if not self.changed():
+            return False
+        self.reload()
+        return True
+
+    def _load_validated(self, warm):
+        signature = self.registry.signature()
+        try:
+            bundle = self.registry.load()
+            validate(bundle)
+            if warm:
+                warm_up(bundle)
+        except Exception as e:
+            self.last_error = '{}: {}'.format(type(e).__name__, e)
+            # Do not try the same broken files again on every poll
+            self._rejected_signature = signature
+            raise
+        self._rejected_signature = None
+        self.last_error = None
+        return bundle
+
+    def load_validated(self, warm=True):
+        """
+        Loads, validates and warms up the artifacts on disk like reload, but does not swap them in.
+        Raises when they cannot be served, the reason is kept in last_error.
+        """
+        with self._reload_lock:
+            return self._load_validated(warm)
+
+    def reload(self, warm=True):
+        """
+        Loads, validates and warms up the artifacts on disk, then swaps them in.
+        Returns the active bundle. Raises (and keeps the old bundle) when the new one cannot be served.
+        warm=False skips the warm-up prediction, for processes that fork afterwards.
+        """
+        with self._reload_lock:
+            bundle = self._load_validated(warm)
+            active = self.registry.bundle_if_loaded()
+            if active is not None and active.version == bundle.version:
+                if active.signature != bundle.signature:
+                    # The same artifacts written again, only the files to compare with changed
+                    active = active._replace(signature=bundle.signature)
+                    self.registry.install(active)
+                return active
+            self.registry.install(bundle)
+            self.loaded_at = time.time()
+            self.reloads += 1
+            return bundle
+
+    def status(self):
+        bundle = self.registry.bundle_if_loaded()
+        return {
+            'version': bundle.version if bundle is not None else None,
+            'watching': self._thread is not None and self._pid == os.getpid(),
+            'watch_interval_s': self.interval,
+            'reloading': self._reload_lock.locked(),
+            'reloads': self.reloads,
+            'loaded_at': self.loaded_at,
+            'last_error': self.last_error,
+        }
+
+
+# The reloader of the registry shared by the web application
+reloader = ModelReloader()
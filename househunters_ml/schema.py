@@ -0,0 +1,167 @@
+"""
+Declared schema of the HouseTable csv: the compact dtype, value range and categories of every column.
+
+Read with the default dtypes, every 0/1 flag and small enum of the HouseTable (QuietRoad, Garden,
+Urbanity_class, ...) takes an int64 or float64 and every Province and HouseType a Python string object.
+read_csv parses only the requested columns and checks every chunk against the schema as it is parsed,
+then stores it as category, int8/int16/int32 and float32.
+
+Integers are parsed as float64 and only narrowed once their range is checked: pandas silently wraps
+values that do not fit a narrow integer dtype, and reports missing values without the column name.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Bumped whenever the schema changes, so columnar caches built with an older schema are rebuilt
+SCHEMA_VERSION = 2
+
+# Rows parsed and checked at a time by read_csv
+PARSE_CHUNK_SIZE = 100000
+
+# The provinces as written in the 190322 csv, which holds Fryslân double-encoded: read as utf-8 it is
+# FryslÃ¢n, like in the notebooks
+PROVINCES = ['Drenthe', 'Flevoland', 'FryslÃ¢n', 'Gelderland', 'Groningen', 'Limburg', 'Noord Brabant',
+             'Noord Holland', 'Overijssel', 'Utrecht', 'Zeeland', 'Zuid Holland']
+
+# Provinces accepted in a HouseTable, Fryslân also correctly encoded
+PROVINCE_CATEGORIES = sorted(PROVINCES + ['Fryslân'])
+
+HOUSE_TYPES = ['Apartment', 'CornerHouse', 'Detached', 'NotSpecified', 'Semidetached', 'TownHouse']
+
+Field = namedtuple('Field', ['dtype', 'minimum', 'maximum', 'nullable', 'categories'],
+                   defaults=(None, None, False, None))
+
+
+def _flag():
+    return Field('int8', 0, 1)
+
+
+# Columns of the HouseTable csv, under their names in the csv. Columns that are not declared here are read
+# with the default dtypes of pandas and are not checked. The dtypes and bounds follow the 190322 csv as
+# described in the notebooks (3667 rows): Price goes down to -17507 and Avg_WOZ_m2 has fractional values,
+# bounds are only set where a value outside of them cannot be real (negative areas, distances and counts).
+HOUSE_TABLE_SCHEMA = {
+    'ID': Field('int32', 0),
+    'Price': Field('int32'),
+    'Province': Field('category', categories=PROVINCE_CATEGORIES),
+    'HouseType': Field('category', categories=HOUSE_TYPES),
+    'ConstructionYear': Field('int16', 1000, 2100),
+    'CapacityHouse_m3': Field('float32', 0),
+    'LivingArea_m2': Field('float32', 0),
+    'ResidentialNeighborhood': _flag(),
+    'QuietRoad': _flag(),
+    'Garden': Field('float32', 0, 1, nullable=True),
+    'FirePlace': _flag(),
+    'Balcony': _flag(),
+    'Attic': _flag(),
+    'Back': _flag(),
+    '#Bedrooms': Field('int8', 0, 100),
+    'StatusRank': Field('int16', 0),
+    'StatusScore': Field('float32'),
+    'Urbanity_class': Field('int8', 1, 5),
+    'Avg_house_value_WOZ_1000euros': Field('int16', 0),
+    'Num_benefit_total': Field('int32', 0),
+    'Num_WWB': Field('int32', 0),
+    'Num_AO': Field('int32', 0),
+    'Num_WW': Field('int32', 0),
+    'Num_AOW': Field('int32', 0),
+    'Municipality_Distance_hospital_km': Field('float32', 0),
+    'Municipality_Distance_childDaycare_km': Field('float32', 0),
+    'Municipality_Distance_largeSupermarket_km': Field('float32', 0),
+    'Municipality_Distance_trainstation_km': Field('float32', 0),
+    # A model feature, float32 is what the booster predicts on
+    'Avg_WOZ_m2': Field('float32', 0),
+    'Garden_validation': _flag(),
+}
+
+
+class SchemaError(ValueError):
+    """The HouseTable does not match its schema, problems lists every offending column"""
+
+    def __init__(self, problems):
+        self.problems = problems
+        super().__init__('HouseTable does not match its schema: {}'.format('; '.join(problems)))
+
+
+def compact_dtype(field):
+    if field.categories is not None:
+        return pd.CategoricalDtype(field.categories)
+    return np.dtype(field.dtype)
+
+
+def _parse_dtype(field):
+    if field.categories is not None:
+        return 'category'
+    if np.dtype(field.dtype).kind in 'iu':
+        return 'float64'
+    return field.dtype
+
+
+def _problem(problems, name, bad, what):
+    count = int(bad.sum())
+    if count:
+        problems.append('{}: {} {} (first at row {})'.format(name, count, what, bad.index[bad.to_numpy()][0]))
+
+
+def conform(frame, schema=HOUSE_TABLE_SCHEMA):
+    """Checks a parsed chunk against the schema and converts its columns to their compact dtypes"""
+    problems = []
+    for name in frame.columns:
+        field = schema.get(name)
+        if field is None:
+            continue
+        column = frame[name]
+        missing = column.isna()
+        if not field.nullable:
+            _problem(problems, name, missing, 'missing values')
+
+        if field.categories is not None:
+            _problem(problems, name, ~missing & ~column.isin(field.categories),
+                     'values not in {}'.format(', '.join(field.categories)))
+            continue
+
+        values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+        present = ~missing.to_numpy()
+        minimum, maximum = field.minimum, field.maximum
+        if np.dtype(field.dtype).kind in 'iu':
+            _problem(problems, name, pd.Series(present & (values != np.round(values)), index=frame.index),
+                     'values that are not integers')
+            limits = np.iinfo(field.dtype)
+            minimum = limits.min if minimum is None else max(minimum, limits.min)
+            maximum = limits.max if maximum is None else min(maximum, limits.max)
+        else:
+            _problem(problems, name, pd.Series(present & ~np.isfinite(values), index=frame.index),
+                     'values that are not finite')
+        with np.errstate(invalid='ignore'):
+            if minimum is not None:
+                _problem(problems, name, pd.Series(present & (values < minimum), index=frame.index),
+                         'values below {}'.format(minimum))
+            if maximum is not None:
+                _problem(problems, name, pd.Series(present & (values > maximum), index=frame.index),
+                         'values above {}'.format(maximum))
+
+    if problems:
+        raise SchemaError(problems)
+    return frame.astype({name: compact_dtype(schema[name]) for name in frame.columns if name in schema})
+
+
+def iter_csv(data_location, chunksize, columns=None, schema=HOUSE_TABLE_SCHEMA):
+    """
+    Parses the HouseTable csv in chunks of chunksize rows, reading only the given csv columns (all of them
+    by default). Every chunk is checked against the schema and converted to compact dtypes, a SchemaError
+    stops the parse at the first chunk with problems.
+    """
+    dtype = {name: _parse_dtype(field) for name, field in schema.items() if columns is None or name in columns}
+    reader = pd.read_csv(r'{}'.format(data_location), delimiter=';', decimal=',', thousands='.',
+                         usecols=columns, dtype=dtype, chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            yield conform(chunk, schema)
+
+
+def read_csv(data_location, columns=None, schema=HOUSE_TABLE_SCHEMA):
+    """Parses the whole HouseTable csv with compact dtypes, see iter_csv"""
+    chunks = list(iter_csv(data_location, PARSE_CHUNK_SIZE, columns, schema))
+    return chunks[0] if len(chunks) == 1 else pd.concat(chunks)
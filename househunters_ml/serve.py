@@ -0,0 +1,303 @@
+"""
+Pre-fork production server for the HouseHunters web application.
+
+The master process loads the model and the column manifest once, freezes the garbage collector so the
+loaded objects are not written to again, opens the listening socket and then forks the workers. The
+workers share the model pages with the master copy-on-write and all accept connections on the same socket.
+
+    python -m househunters_ml.serve --workers 4 --port 5008
+
+Signals to the master:
+    SIGHUP      graceful restart: load and validate the model artifacts, then replace the workers one at a time
+    SIGTERM     graceful stop: workers finish the requests they are handling, then exit
+    SIGUSR1     print the health and memory report of every worker
+
+Every worker writes a heartbeat to memory shared with the master. A worker that dies or stops sending
+heartbeats is replaced. /workers returns the health report, including the RSS of every worker and the
+part of it that is shared (see Pss and Shared_* in proc(5)).
+
+Requests are spread over the workers, so state that must be the same for all of them does not live in
+the memory of one: the batch prediction jobs are kept in the job directory (see jobs.py) and POST
+/admin/reload sends SIGHUP to the master, which reloads the model for every worker. For the same reason
+the workers do not watch the model artifacts: the master polls them every HH_MODEL_WATCH_INTERVAL
+seconds and, once a new model is on disk, restarts the workers like on SIGHUP.
+"""
+import argparse
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from multiprocessing.sharedctypes import RawArray
+
+from flask import jsonify
+from werkzeug.serving import make_server
+
+from househunters_ml.predictor import predictor
+from househunters_ml.registry import registry
+from househunters_ml.reloader import reloader
+from househunters_ml.serving import job_manager
+from househunters_ml.store import store
+
+HEARTBEAT_INTERVAL = 1.0
+
+# Slots of a worker in the shared status table
+PID, HEARTBEAT, REQUESTS = range(3)
+SLOT_SIZE = 3
+
+
+def memory_usage(pid):
+    """RSS of a process and how much of it is shared with other processes, in MB (Linux only)"""
+    usage = {}
+    wanted = {'Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty'}
+    try:
+        with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in wanted:
+                    usage[key.lower() + '_mb'] = int(value.split()[0]) / 1024
+    except OSError:
+        try:
+            with open('/proc/{}/status'.format(pid)) as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        usage['rss_mb'] = int(line.split()[1]) / 1024
+        except OSError:
+            pass
+    if 'shared_clean_mb' in usage:
+        usage['shared_mb'] = usage['shared_clean_mb'] + usage['shared_dirty_mb']
+    return usage
+
+
+class PreforkServer:
+    """Master process: loads the model, forks the workers and keeps them running"""
+
+    def __init__(self, app, host='127.0.0.1', port=5008, workers=None, heartbeat_timeout=30.0):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.n_workers = workers or os.cpu_count() or 1
+        self.heartbeat_timeout = heartbeat_timeout
+        self.status = RawArray('d', self.n_workers * SLOT_SIZE)
+        self.workers = {}  # pid -> slot
+        self.socket = None
+        self._restart_requested = False
+        self._stop_requested = False
+        self._report_requested = False
+        self._worker_slot = None
+        # The master watches the model artifacts in place of the workers, see serve_forever
+        self.watch_interval = reloader.interval
+        # The request threads of a worker all count into its slot
+        self._count_lock = threading.Lock()
+
+        app.add_url_rule('/workers', 'workers', self.workers_view)
+        app.after_request(self._count_request)
+
+    # Worker side
+
+    def _count_request(self, response):
+        if self._worker_slot is not None:
+            with self._count_lock:
+                self.status[self._worker_slot * SLOT_SIZE + REQUESTS] += 1
+        return response
+
+    def workers_view(self):
+        """Health and memory report of all workers, served by whichever worker gets the request"""
+        return jsonify(master_pid=os.getppid(), served_by=os.getpid(), workers=self.report())
+
+    def _run_worker(self, slot):
+        """Body of a forked worker, never returns"""
+        for signum in (signal.SIGHUP, signal.SIGUSR1):
+            signal.signal(signum, signal.SIG_DFL)
+        # A new model reaches the workers through a restart by the master, never through a reload of their own
+        reloader.interval = 0
+        self._worker_slot = slot
+        base = slot * SLOT_SIZE
+        self.status[base + PID] = os.getpid()
+        self.status[base + HEARTBEAT] = time.time()
+        self.status[base + REQUESTS] = 0
+
+        server = make_server(self.host, self.port, self.app, threaded=True, fd=self.socket.fileno())
+        # Let server_close wait for the requests that are still being handled
+        server.daemon_threads = False
+        server.block_on_close = True
+
+        stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+
+        threading.Thread(target=server.serve_forever, name='serve', daemon=True).start()
+        while not stopping.wait(HEARTBEAT_INTERVAL):
+            self.status[base + HEARTBEAT] = time.time()
+
+        server.shutdown()
+        server.server_close()
+        # Jobs still running would otherwise stay 'running' forever once the process exits
+        job_manager.shutdown()
+        os._exit(0)
+
+    # Master side
+
+    def _spawn(self, slot):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self._run_worker(slot)
+            finally:
+                os._exit(1)
+        self.workers[pid] = slot
+        self.status[slot * SLOT_SIZE + PID] = pid
+        self.status[slot * SLOT_SIZE + HEARTBEAT] = time.time()
+        return pid
+
+    def _stop_worker(self, pid, timeout=30.0):
+        """Asks a worker to finish its requests and waits for it to exit"""
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if done:
+                break
+            time.sleep(0.1)
+        else:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.workers.pop(pid, None)
+
+    def _reap(self):
+        """Replaces workers that exited on their own"""
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot = self.workers.pop(pid, None)
+            if slot is not None and not self._stop_requested:
+                print('Worker {} exited, starting a new one'.format(pid), file=sys.stderr)
+                self._spawn(slot)
+
+    def _check_heartbeats(self):
+        now = time.time()
+        for pid, slot in list(self.workers.items()):
+            if now - self.status[slot * SLOT_SIZE + HEARTBEAT] > self.heartbeat_timeout:
+                print('Worker {} stopped sending heartbeats, replacing it'.format(pid), file=sys.stderr)
+                os.kill(pid, signal.SIGKILL)
+
+    def _restart(self, new_model_only=False):
+        """
+        Loads and validates the model in the master, then replaces the workers one by one so some always serve.
+        When the new artifacts cannot be served the current workers keep running with the model they have.
+        With new_model_only the workers are only replaced when the artifacts hold another model version.
+        """
+        print('Reloading the model and restarting the workers', file=sys.stderr)
+        version = registry.version
+        try:
+            # Without the warm-up prediction: OpenMP threads it would start do not survive a fork
+            bundle = reloader.reload(warm=False)
+        except Exception as e:
+            print('Model reload failed, the workers keep serving the previous model: {}: {}'.format(
+                type(e).__name__, e), file=sys.stderr)
+            return
+        if new_model_only and bundle.version == version:
+            return
+        self._warm_up()
+        for pid, slot in list(self.workers.items()):
+            self._stop_worker(pid)
+            self._spawn(slot)
+
+    def report(self):
+        workers = []
+        now = time.time()
+        for slot in range(self.n_workers):
+            base = slot * SLOT_SIZE
+            pid = int(self.status[base + PID])
+            heartbeat_age = now - self.status[base + HEARTBEAT]
+            worker = {'slot': slot, 'pid': pid,
+                      'healthy': pid > 0 and heartbeat_age <= self.heartbeat_timeout,
+                      'heartbeat_age_s': heartbeat_age,
+                      'requests': int(self.status[base + REQUESTS])}
+            worker.update(memory_usage(pid))
+            workers.append(worker)
+        return workers
+
+    def _warm_up(self):
+        """Loads everything the workers need before forking, so they share it instead of loading it again"""
+        registry.get()
+        # Looks up the booster, without predicting: OpenMP threads started by a prediction do not survive a fork
+        predictor.col_names
+        store.setup()
+        gc.collect()
+        if hasattr(gc, 'freeze'):
+            # Objects that exist now are never touched by the garbage collector of the workers
+            gc.freeze()
+
+    def _handle_signal(self, signum, frame):
+        if signum == signal.SIGHUP:
+            self._restart_requested = True
+        elif signum == signal.SIGUSR1:
+            self._report_requested = True
+        else:
+            self._stop_requested = True
+
+    def serve_forever(self):
+        # POST /admin/reload of a worker signals the master, so that every worker gets the new model
+        self.app.config['HH_MASTER_PID'] = os.getpid()
+        self._warm_up()
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(128)
+        self.socket.set_inheritable(True)
+
+        for slot in range(self.n_workers):
+            self._spawn(slot)
+        print('Serving on http://{}:{} with {} workers (master pid {})'.format(
+            self.host, self.port, self.n_workers, os.getpid()), file=sys.stderr)
+
+        for signum in (signal.SIGHUP, signal.SIGUSR1, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._handle_signal)
+
+        watched_at = time.time()
+        while not self._stop_requested:
+            time.sleep(HEARTBEAT_INTERVAL)
+            if self._restart_requested:
+                self._restart_requested = False
+                self._restart()
+            elif self.watch_interval > 0 and time.time() - watched_at >= self.watch_interval:
+                watched_at = time.time()
+                if reloader.changed():
+                    self._restart(new_model_only=True)
+            if self._report_requested:
+                self._report_requested = False
+                print(json.dumps({'master': memory_usage(os.getpid()), 'workers': self.report()}, indent=2),
+                      file=sys.stderr)
+            self._reap()
+            self._check_heartbeats()
+
+        for pid in list(self.workers):
+            self._stop_worker(pid)
+        self.socket.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5008)
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('HH_WORKERS', 0)) or None,
+                        help='Number of worker processes, defaults to the number of cores')
+    args = parser.parse_args()
+
+    from househunters_ml.hh_app import app
+    PreforkServer(app, host=args.host, port=args.port, workers=args.workers).serve_forever()
@@ -0,0 +1,229 @@
+"""
+Inference shared by the web applications: the Flask application (hh_app.py) and its ASGI variant (hh_asgi.py).
+
+The micro-batcher, the prediction caches, the batch jobs and the helpers that predict and explain houses
+live here, so both applications use them without importing each other. Nothing in this module depends
+on a web framework, and importing it builds no application, reads no template and starts no thread.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+from househunters_ml import metrics
+from househunters_ml.batch import CHUNK_SIZE
+from househunters_ml.batching import MicroBatcher
+from househunters_ml.cache import PredictionCache
+from househunters_ml.incremental import score_incremental
+from househunters_ml.jobs import JobManager
+from househunters_ml.parallel import predict_parallel
+from househunters_ml.predict import ID_COLUMN, csv_path, load_house_table, source_columns, test_transformation
+from househunters_ml.predictor import predictor
+from househunters_ml.registry import registry
+from househunters_ml.reloader import reloader
+from househunters_ml.store import store
+
+# Concurrent json predictions are collected into one model call, tune with the environment variables
+batcher = MicroBatcher(predictor,
+                       window_ms=float(os.environ.get('HH_BATCH_WINDOW_MS', 2)),
+                       max_batch_size=int(os.environ.get('HH_MAX_BATCH_SIZE', 32)),
+                       timeout=float(os.environ.get('HH_BATCH_TIMEOUT_S', 10)))
+
+# Predictions of houses that were asked for before are served from here
+prediction_cache = PredictionCache(maxsize=int(os.environ.get('HH_CACHE_SIZE', 10000)),
+                                   ttl=float(os.environ.get('HH_CACHE_TTL', 300)))
+
+# Per-feature contributions of houses that were explained before
+contribution_cache = PredictionCache(maxsize=int(os.environ.get('HH_CONTRIBUTION_CACHE_SIZE', 10000)),
+                                     ttl=float(os.environ.get('HH_CACHE_TTL', 300)))
+
+# Batch predictions submitted as jobs run here, outside of the request threads
+job_manager = JobManager(max_workers=int(os.environ.get('HH_JOB_WORKERS', 2)))
+
+
+def predict_house(house_info, route, batched=False):
+    """
+    Predicts a single house through the prediction cache. On a miss the house is predicted with the
+    micro-batcher (batched=True) or directly with the predictor. The stages are timed under route.
+    """
+    with metrics.stage(route, 'features'):
+        # A row handed to the micro-batcher waits in its queue, otherwise the row of the thread is reused
+        row = predictor.to_row(house_info, out=None if batched else predictor.row_buffer()[0])
+    version = registry.version
+    with metrics.stage(route, 'cache_lookup'):
+        predicted_asking_price = prediction_cache.get(row, version)
+    if predicted_asking_price is None:
+        with metrics.stage(route, 'predict'):
+            if batched:
+                predicted_asking_price = batcher.submit_row(row).result(batcher.timeout)
+            else:
+                predicted_asking_price = predictor.predict_rows(row[None, :])[0]
+        prediction_cache.put(row, version, predicted_asking_price)
+    return predicted_asking_price
+
+
+def explain_houses(houses, raise_errors=False):
+    """
+    Per-feature price contributions of many houses. Every house is validated into one matrix, houses that
+    were explained before come from the contribution cache and the others are computed in one vectorized
+    pass over the booster. Returns one {'price', 'base_value', 'contributions'} or {'error'} per house;
+    with raise_errors=True the ValidationError of an invalid house is raised instead.
+    """
+    col_names = predictor.col_names
+    version = registry.version
+    rows = np.empty((len(houses), len(col_names)), dtype=np.float32)
+    values = [None] * len(houses)
+    errors = [None] * len(houses)
+    with metrics.stage('explain', 'features'):
+        for i, house in enumerate(houses):
+            try:
+                if isinstance(house, Exception):
+                    raise house
+                predictor.to_row(house, out=rows[i], col_names=col_names)
+            except ValueError as e:
+                if raise_errors:
+                    raise
+                errors[i] = str(e)
+    with metrics.stage('explain', 'cache_lookup'):
+        misses = []
+        for i in range(len(houses)):
+            if errors[i] is None:
+                values[i] = contribution_cache.get(rows[i], version)
+                if values[i] is None:
+                    misses.append(i)
+    if misses:
+        metrics.BATCH_SIZE.observe(len(misses), 'explain')
+        with metrics.stage('explain', 'contributions'):
+            contributions = predictor.contributions_rows(rows[misses])
+        for i, row_contributions in zip(misses, contributions):
+            contribution_cache.put(rows[i], version, row_contributions)
+            values[i] = row_contributions
+
+    explanations = []
+    for row_contributions, error in zip(values, errors):
+        if error is not None:
+            explanations.append({'error': error})
+            continue
+        explanations.append({
+            'price': float(row_contributions.sum()),
+            'base_value': float(row_contributions[-1]),
+            'contributions': dict(zip(col_names, row_contributions[:-1].tolist())),
+        })
+    return explanations
+
+
+class InvalidParameter(ValueError):
+    """A query parameter that cannot be used, the applications answer it with 400"""
+
+
+class InvalidBody(InvalidParameter):
+    """A request body without a single house that can be parsed, answered with 400 like InvalidParameter"""
+
+
+def parse_json_body(body):
+    """
+    Parses a request body with a single house, a json array of houses or newline-delimited json with one
+    house per line. A line of newline-delimited json that cannot be parsed is returned as a ValueError in
+    its place. Raises InvalidBody for an empty body and for one in which no line can be parsed.
+    """
+    if not body.strip():
+        raise InvalidBody('the request body is empty, send a house as json')
+    try:
+        return json.loads(body)
+    except ValueError as e:
+        houses = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                houses.append(json.loads(line))
+            except ValueError as line_error:
+                houses.append(ValueError('invalid json: {}'.format(line_error)))
+        if all(isinstance(house, ValueError) for house in houses):
+            raise InvalidBody('the request body is neither json nor newline-delimited json: {}'.format(e))
+        return houses
+
+
+def positive_int(args, name, default):
+    """The query parameter name as a whole number of at least 1, default when it is not given"""
+    value = args.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise InvalidParameter('{} must be a whole number, not {!r}'.format(name, value))
+    if number < 1:
+        raise InvalidParameter('{} must be at least 1, not {}'.format(name, number))
+    return number
+
+
+def batch_parameters(args):
+    """?workers= and ?chunksize= of a batch prediction, raises InvalidParameter for values below 1"""
+    return positive_int(args, 'workers', 1), positive_int(args, 'chunksize', CHUNK_SIZE)
+
+
+def load_batch_for_prediction(data_location=csv_path, col_names=None):
+    """Loads the data for a batch prediction, only the listing IDs and the columns the model needs"""
+    return load_house_table(data_location, columns=[ID_COLUMN] + source_columns(col_names))
+
+
+def run_batch_prediction(workers=1, chunksize=CHUNK_SIZE, incremental=False):
+    """
+    Predicts the whole HouseTable into batch_predictions.csv and the prediction store, returns the reply.
+    With workers > 1 the HouseTable is scored in ranges of chunksize rows by that many worker processes,
+    with incremental=True only the listings that changed since the last incremental run are scored.
+    The whole run reads, scores and stores with the model bundle served when it starts.
+    """
+    try:
+        bundle = registry.get()
+        if incremental:
+            result = score_incremental(csv_path, 'batch_predictions.csv', column='correct_prediction',
+                                       bundle=bundle)
+            return 'prediction was successful, {scored} rows scored and {skipped} unchanged rows skipped'.format(
+                **result)
+
+        if workers > 1:
+            predict_parallel(csv_path, 'batch_predictions.csv', workers, chunksize, column='correct_prediction',
+                             bundle=bundle)
+            return 'prediction was successful'
+
+        with metrics.stage('predict_all', 'read'):
+            house_table = load_batch_for_prediction(col_names=bundle.col_names)
+        with metrics.stage('predict_all', 'transform'):
+            X_predict = test_transformation(house_table, bundle.col_names)
+
+        # Make new predictions
+        metrics.BATCH_SIZE.observe(len(X_predict), 'predict_all')
+        with metrics.stage('predict_all', 'predict'):
+            predicted = bundle.model.predict(X_predict)
+
+        # Save the predictions to a csv file
+        X_predict['correct_prediction'] = predicted
+        with metrics.stage('predict_all', 'write'):
+            X_predict.to_csv('batch_predictions.csv', header=True)
+        with metrics.stage('predict_all', 'store'):
+            store.upsert_many(house_table[ID_COLUMN], predicted, bundle.version)
+        return 'prediction was successful'
+
+    except Exception as e:
+        print(e)
+        # A 5xx status, so the failure counts in metrics.ERRORS
+        return 'Error occurred', 500
+
+
+def reload_in_background():
+    """Reloads the model artifacts on a thread of its own, a failure is printed and kept in reloader.status()"""
+    def reload():
+        try:
+            reloader.reload()
+        except Exception as e:
+            print('Model reload failed: {}'.format(e))
+
+    threading.Thread(target=reload, name='model-reload', daemon=True).start()
+
+
+def is_set(args, name):
+    """True when a query parameter is set to 1, true or yes"""
+    return args.get(name, '0').lower() in ('1', 'true', 'yes')
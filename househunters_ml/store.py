@@ -0,0 +1,139 @@
+"""
+Indexed store of batch predictions, keyed by listing ID and model version.
+
+Batch predictions used to end up only in a csv that is overwritten by every run. Every batch run now also
+upserts its predictions into an SQLite database, whose primary key (listing_id, model_version) makes
+looking up the stored price of one listing a single index lookup, without loading the csv or calling the
+model. A batch is written as one transaction with executemany, so storing a full HouseTable is cheap.
+
+The database is at HH_PREDICTION_STORE (output/predictions.sqlite3 by default), an empty value turns
+the store off. The directory, the WAL journal and the table are set up once, by the first caller or by
+the pre-fork server before it starts the workers. Connections are kept in a small pool
+(HH_PREDICTION_STORE_CONNECTIONS) and handed to one thread at a time, so request threads do not each open
+their own.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from itertools import repeat
+
+import numpy as np
+
+STORE_PATH = os.environ.get('HH_PREDICTION_STORE', 'output/predictions.sqlite3')
+
+# Idle connections kept open, more threads than this open and close their own
+POOL_SIZE = int(os.environ.get('HH_PREDICTION_STORE_CONNECTIONS', 4))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS predictions (
+    listing_id INTEGER NOT NULL,
+    model_version TEXT NOT NULL,
+    price REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (listing_id, model_version)
+) WITHOUT ROWID
+'''
+
+
+class PredictionStore:
+    """Batch predictions in an SQLite database, read and written through a pool of connections"""
+
+    def __init__(self, path=STORE_PATH, pool_size=POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._set_up = False
+        # Process the pool belongs to: a connection must not be used across a fork, workers open their own
+        self._pid = None
+        self._pool = None
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _open(self):
+        connection = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False)
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def setup(self):
+        """Creates the directory and the table, forked workers find the database set up by the master"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if not self._set_up:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                connection = sqlite3.connect(self.path, timeout=30.0)
+                try:
+                    # The journal mode is stored in the database file, it only has to be set once
+                    connection.execute('PRAGMA journal_mode=WAL')
+                    connection.execute(SCHEMA)
+                finally:
+                    connection.close()
+                self._set_up = True
+
+    def _idle_connections(self):
+        """The pool of the current process"""
+        if self._pid != os.getpid():
+            self.setup()
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pool = queue.LifoQueue(maxsize=self.pool_size)
+                    self._pid = os.getpid()
+        return self._pool
+
+    @contextmanager
+    def _connection(self):
+        pool = self._idle_connections()
+        try:
+            connection = pool.get_nowait()
+        except queue.Empty:
+            connection = self._open()
+        try:
+            yield connection
+        finally:
+            try:
+                pool.put_nowait(connection)
+            except queue.Full:
+                connection.close()
+
+    def upsert_many(self, listing_ids, prices, model_version):
+        """Stores the prices of many listings for a model version in one transaction, returns the count"""
+        if not self.enabled:
+            return 0
+        rows = list(zip(np.asarray(listing_ids, dtype=np.int64).tolist(), repeat(model_version),
+                        np.asarray(prices, dtype=np.float64).tolist(), repeat(time.time())))
+        with self._connection() as connection, connection:
+            connection.executemany('INSERT OR REPLACE INTO predictions (listing_id, model_version, price, '
+                                   'updated_at) VALUES (?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def get(self, listing_id, model_version):
+        """The stored prediction of a listing for a model version as a dict, None when there is none"""
+        if not self.enabled:
+            return None
+        with self._connection() as connection:
+            row = connection.execute(
+                'SELECT price, updated_at FROM predictions WHERE listing_id = ? AND model_version = ?',
+                (int(listing_id), model_version)).fetchone()
+        if row is None:
+            return None
+        return {'listing_id': int(listing_id), 'model_version': model_version, 'price': row[0],
+                'updated_at': row[1]}
+
+    def versions(self, listing_id):
+        """Model versions that have a stored prediction for the listing, most recently written first"""
+        if not self.enabled:
+            return []
+        with self._connection() as connection:
+            rows = connection.execute(
+                'SELECT model_version FROM predictions WHERE listing_id = ? ORDER BY updated_at DESC',
+                (int(listing_id),)).fetchall()
+        return [row[0] for row in rows]
+
+
+# The store written by the batch predictions and read by /prediction/<id>
+store = PredictionStore()
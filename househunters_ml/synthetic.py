@@ -0,0 +1,261 @@
+"""
+Synthetic HouseTables for scale testing, learned from the 190322 HouseTable.
+
+A HouseTableProfile learns the marginal distribution of every column of the real csv: frequencies of the
+values of categorical and low-cardinality columns (Province, HouseType, Urbanity_class, Garden including its
+missing values, ...) and quantiles of the numeric columns (ConstructionYear, LivingArea_m2, the Num_benefit_*
+counts, ...) together with their number of decimals and share of missing values. Rows are sampled from
+these marginals independently, so the columns of a synthetic row are not correlated like real ones are.
+
+Synthetic rows are streamed to a csv with the schema and number formatting of the original (';' delimited,
+',' decimals and, when the original uses them, '.' thousands separators):
+
+    python -m househunters_ml.synthetic --rows 1000000 --seed 15 --output data/HouseTable_1M.csv
+
+Where the csv is not available (the benchmarks run anywhere) the rows are sampled from described_profile:
+the minimum, quartiles and maximum of the columns that the notebooks describe for the 190322 HouseTable.
+"""
+import argparse
+import functools
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from househunters_ml.predict import csv_path, load_house_table
+from househunters_ml.schema import HOUSE_TYPES, PROVINCES
+
+# Numeric columns with at most this many distinct values are sampled as categories
+MAX_CATEGORIES = 25
+
+# Quantiles stored per numeric column, sampling interpolates between them
+N_QUANTILES = 201
+
+THOUSANDS_PATTERN = re.compile(r'^-?\d{1,3}(\.\d{3})+(,\d+)?$')
+
+
+def _decimals(values):
+    """Largest number of decimals among the values (at most 6)"""
+    for decimals in range(7):
+        if np.allclose(values, np.round(values, decimals)):
+            return decimals
+    return 6
+
+
+def uses_thousands_separator(data_location, n_lines=1000):
+    """True when numbers in the csv are written with '.' thousands separators, e.g. 335.594"""
+    with open(data_location, encoding='utf-8', errors='replace') as f:
+        next(f, None)
+        for _, line in zip(range(n_lines), f):
+            if any(THOUSANDS_PATTERN.match(field.strip()) for field in line.rstrip('\n').split(';')):
+                return True
+    return False
+
+
+def _whole_numbers(column):
+    """True for columns whose values are all integers, even when pandas read them as floats"""
+    if column['kind'] == 'numeric':
+        return column['integer'] or column['decimals'] == 0
+    if column['kind'] == 'categorical':
+        values = [value for value in column['values'] if value is not None]
+        return bool(values) and all(isinstance(value, (int, float)) and float(value).is_integer()
+                                    for value in values)
+    return False
+
+
+class HouseTableProfile:
+    """Per-column marginal distributions of a HouseTable, and sampling of synthetic rows from them"""
+
+    def __init__(self, columns, thousands_separator=False):
+        self.columns = columns
+        self.thousands_separator = thousands_separator
+
+    @classmethod
+    def learn(cls, frame, thousands_separator=False):
+        columns = []
+        for name in frame.columns:
+            series = frame[name]
+            null_fraction = float(series.isna().mean())
+            present = series.dropna()
+            is_numeric = pd.api.types.is_numeric_dtype(series)
+
+            if is_numeric and name == 'ID' and present.is_unique:
+                column = {'name': name, 'kind': 'sequence', 'start': int(present.min())}
+            elif not is_numeric or present.nunique() <= MAX_CATEGORIES:
+                counts = series.value_counts(dropna=False, normalize=True)
+                values = [None if pd.isna(value) else (value.item() if hasattr(value, 'item') else value)
+                          for value in counts.index]
+                column = {'name': name, 'kind': 'categorical', 'values': values,
+                          'probabilities': counts.tolist(), 'dtype': str(series.dtype)}
+            else:
+                grid = np.linspace(0, 1, N_QUANTILES)
+                column = {'name': name, 'kind': 'numeric',
+                          'quantiles': present.quantile(grid).tolist(),
+                          'integer': bool(pd.api.types.is_integer_dtype(series)),
+                          'decimals': _decimals(present.to_numpy(dtype=float)),
+                          'null_fraction': null_fraction}
+            columns.append(column)
+        return cls(columns, thousands_separator)
+
+    @classmethod
+    def from_csv(cls, data_location=csv_path):
+        return cls.learn(load_house_table(data_location), uses_thousands_separator(data_location))
+
+    def to_json(self, path):
+        with open(path, 'w') as f:
+            json.dump({'columns': self.columns, 'thousands_separator': self.thousands_separator}, f, indent=2)
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path) as f:
+            profile = json.load(f)
+        return cls(profile['columns'], profile['thousands_separator'])
+
+    def sample(self, n_rows, rng, first_row=0):
+        """n_rows synthetic rows, first_row numbers the rows so sequences continue across chunks"""
+        data = {}
+        for column in self.columns:
+            kind = column['kind']
+            if kind == 'sequence':
+                data[column['name']] = np.arange(first_row, first_row + n_rows) + column['start']
+            elif kind == 'categorical':
+                probabilities = np.asarray(column['probabilities'])
+                picks = rng.choice(len(column['values']), size=n_rows, p=probabilities / probabilities.sum())
+                values = pd.Series(column['values'], dtype=object if 'float' not in column['dtype'] else float)
+                data[column['name']] = values.iloc[picks].reset_index(drop=True)
+            else:
+                grid = np.linspace(0, 1, len(column['quantiles']))
+                values = np.interp(rng.random_sample(n_rows), grid, column['quantiles'])
+                values = np.round(values, 0 if column['integer'] else column['decimals'])
+                values[rng.random_sample(n_rows) < column['null_fraction']] = np.nan
+                data[column['name']] = values
+        frame = pd.DataFrame(data)
+        for column in self.columns:
+            if _whole_numbers(column):
+                # Integers, with missing values where there are any, so they are written as 1 and not 1,0
+                frame[column['name']] = frame[column['name']].astype('Int64' if frame[column['name']].isna().any()
+                                                                     else np.int64)
+        return frame
+
+    def _format_thousands(self, frame):
+        """Writes the numbers of frame as text with '.' thousands separators and ',' decimals"""
+        formatted = frame.copy()
+        for name in frame.columns:
+            series = frame[name]
+            if not pd.api.types.is_numeric_dtype(series):
+                continue
+            decimals = next((c.get('decimals', 0) for c in self.columns if c['name'] == name), 0)
+            if pd.api.types.is_integer_dtype(series):
+                decimals = 0
+            formatted[name] = [
+                '' if pd.isna(value) else
+                '{:,.{}f}'.format(value, decimals).replace(',', '_').replace('.', ',').replace('_', '.')
+                for value in series]
+        return formatted
+
+    def write_csv(self, path, n_rows, seed=15, chunksize=100000):
+        """Streams n_rows synthetic rows to a csv in chunks, the same seed always gives the same file"""
+        rng = np.random.RandomState(seed)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            for first_row in range(0, n_rows, chunksize):
+                chunk = self.sample(min(chunksize, n_rows - first_row), rng, first_row)
+                if self.thousands_separator:
+                    chunk = self._format_thousands(chunk)
+                chunk.to_csv(f, sep=';', decimal=',', index=False, header=first_row == 0)
+
+
+def _numeric(name, quantiles, decimals=0):
+    return {'name': name, 'kind': 'numeric', 'quantiles': quantiles, 'integer': decimals == 0,
+            'decimals': decimals, 'null_fraction': 0.0}
+
+
+def _categorical(name, values, probabilities=None, dtype='int64'):
+    if probabilities is None:
+        probabilities = [1 / len(values)] * len(values)
+    return {'name': name, 'kind': 'categorical', 'values': values, 'probabilities': probabilities, 'dtype': dtype}
+
+
+def _flag(name, share_of_ones):
+    return _categorical(name, [0, 1], [1 - share_of_ones, share_of_ones])
+
+
+def described_profile():
+    """
+    The profile of the 190322 HouseTable (3667 rows) from the describe() and isnull() output of the notebooks:
+    minimum, quartiles and maximum of the numeric columns and the share of ones of the flags. Columns the
+    notebooks do not show (Attic, Back, #Bedrooms, StatusRank, StatusScore, Urbanity_class,
+    Avg_house_value_WOZ_1000euros) take the ranges of the rows that are shown, Num_benefit_total the sum of
+    the quartiles of its parts. Categories are sampled uniformly.
+    """
+    # Share of the houses with a garden, without one and unknown
+    garden = [0.663476 * (1 - 0.259007), 0.336524 * (1 - 0.259007), 0.259007]
+    columns = [
+        {'name': 'ID', 'kind': 'sequence', 'start': 2250795},
+        _numeric('Price', [-17507, 221208.5, 300683, 411392.5, 1594992]),
+        _categorical('Province', PROVINCES, dtype='object'),
+        _categorical('HouseType', HOUSE_TYPES, dtype='object'),
+        _numeric('ConstructionYear', [1816, 1955, 1975, 1994.5, 2019]),
+        _numeric('CapacityHouse_m3', [68, 322, 406, 544, 1653.9], decimals=1),
+        _numeric('LivingArea_m2', [23, 96.3, 120, 150, 384.03], decimals=2),
+        _flag('ResidentialNeighborhood', 0.209163),
+        _flag('QuietRoad', 0.186528),
+        _categorical('Garden', [1.0, 0.0, None], garden, dtype='float64'),
+        _flag('FirePlace', 0.035724),
+        _flag('Balcony', 0.136079),
+        _flag('Attic', 0.5),
+        _flag('Back', 0.5),
+        _numeric('#Bedrooms', [1, 8]),
+        _numeric('StatusRank', [1, 4000]),
+        _numeric('StatusScore', [-3, 3], decimals=2),
+        _categorical('Urbanity_class', [1, 2, 3, 4, 5]),
+        _numeric('Avg_house_value_WOZ_1000euros', [100, 900]),
+        _numeric('Num_benefit_total', [0, 1020, 1940, 2960, 10290]),
+        _numeric('Num_WWB', [0, 60, 150, 300, 2720]),
+        _numeric('Num_AO', [0, 180, 330, 500, 1510]),
+        _numeric('Num_WW', [0, 110, 200, 290, 900]),
+        _numeric('Num_AOW', [0, 670, 1260, 1870, 5160]),
+        _numeric('Municipality_Distance_hospital_km', [1.5, 3.3, 5.7, 11.4, 63.7], decimals=1),
+        _numeric('Municipality_Distance_childDaycare_km', [0.4, 0.5, 0.7, 1.0, 6.3], decimals=1),
+        _numeric('Municipality_Distance_largeSupermarket_km', [0.5, 0.7, 0.9, 1.1, 2.6], decimals=1),
+        _numeric('Municipality_Distance_trainstation_km', [1.0, 2.4, 3.0, 7.3, 50.7], decimals=1),
+        _numeric('Avg_WOZ_m2', [800, 1500, 1700, 2000, 5350], decimals=6),
+        _flag('Garden_validation', 0.647668),
+    ]
+    return HouseTableProfile(columns)
+
+
+@functools.lru_cache(maxsize=None)
+def default_profile():
+    """The profile learned from the HouseTable csv when it is there, described_profile otherwise"""
+    if os.path.exists(csv_path):
+        return HouseTableProfile.from_csv(csv_path)
+    return described_profile()
+
+
+def synthetic_house_table(n_rows, seed=15, profile=None):
+    """A raw HouseTable frame (as read from the csv) with n_rows synthetic rows, from default_profile"""
+    return (profile or default_profile()).sample(n_rows, np.random.RandomState(seed))
+
+
+def write_synthetic_csv(path, n_rows, seed=15, profile=None):
+    """Writes n_rows synthetic rows to a HouseTable csv at path"""
+    (profile or default_profile()).write_csv(path, n_rows, seed=seed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, required=True)
+    parser.add_argument('--seed', type=int, default=15)
+    parser.add_argument('--output', required=True, help='Path of the synthetic csv')
+    parser.add_argument('--source', default=csv_path, help='HouseTable csv to learn the distributions from')
+    parser.add_argument('--profile', help='Use a profile saved with --save-profile instead of the source csv')
+    parser.add_argument('--save-profile', help='Write the learned profile to this json file')
+    parser.add_argument('--chunksize', type=int, default=100000)
+    args = parser.parse_args()
+
+    profile = HouseTableProfile.from_json(args.profile) if args.profile else HouseTableProfile.from_csv(args.source)
+    if args.save_profile:
+        profile.to_json(args.save_profile)
+    profile.write_csv(args.output, args.rows, seed=args.seed, chunksize=args.chunksize)
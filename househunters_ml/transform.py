@@ -0,0 +1,131 @@
+"""
+Feature engineering of the HouseTable, driven by the columns the model needs.
+
+The original test_transformation copied the whole frame, built every derived feature and one-hot encoded
+all categoricals, only to select the handful of columns in col_names at the end. A TransformPlan looks at
+col_names first, works out which source columns and derived features they depend on and only computes
+those, with vectorized comparisons instead of chained assignments and get_dummies.
+"""
+import numpy as np
+import pandas as pd
+
+CITYSIDE = ['Noord Holland',
+            'Zuid Holland',
+            'Utrecht'
+            ]
+
+COUNTRYSIDE = ['Zeeland',
+               'Fryslân',
+               'Groningen',
+               'Drenthe'
+               ]
+
+# Columns that have a different name in the HouseTable csv than in the model
+SOURCE_NAMES = {'Num_Bedrooms': '#Bedrooms'}
+
+# Age categories as half-open [start, end) ranges of the construction year
+AGE_CATEGORIES = {'Before_war': (-np.inf, 1940),
+                  'Existing': (1940, 1990),
+                  'New_construction': (1990, np.inf)}
+
+# Categoricals that the model sees as one-hot encoded <prefix>_<value> columns
+CATEGORICALS = ['Province',
+                'HouseType',
+                'Age_cat',
+                'Urbanity_class',
+                'Garden'
+                ]
+
+
+def age_category(construction_year):
+    """Bins construction years into the AGE_CATEGORIES, years that are missing stay missing"""
+    bins = [-np.inf] + [end for _, end in AGE_CATEGORIES.values()]
+    return pd.cut(construction_year, bins=bins, right=False, labels=list(AGE_CATEGORIES)).astype(object)
+
+
+def _in_age_category(construction_year, category):
+    start, end = AGE_CATEGORIES[category]
+    return (construction_year >= start) & (construction_year < end)
+
+
+# Derived features: the columns they are computed from and how
+DERIVED_FEATURES = {
+    'CitySide': (['Province'], lambda df: df['Province'].isin(CITYSIDE).astype(np.int8)),
+    'CountrySide': (['Province'], lambda df: df['Province'].isin(COUNTRYSIDE).astype(np.int8)),
+    'good_hood': (['Num_benefit_total', 'Num_AOW'],
+                  lambda df: (df['Num_benefit_total'] - df['Num_AOW']) < 1000),
+    'enough_bedroom': (['Num_Bedrooms'], lambda df: df['Num_Bedrooms']),
+    'Age_cat': (['ConstructionYear'], lambda df: age_category(df['ConstructionYear'])),
+}
+
+
+def _dummy(column, value):
+    """One column of get_dummies: 1 where column equals the value in the name of the dummy"""
+    if pd.api.types.is_numeric_dtype(column):
+        try:
+            value = float(value)
+        except ValueError:
+            return pd.Series(0, index=column.index, dtype=np.uint8)
+    return (column == value).astype(np.uint8)
+
+
+class TransformPlan:
+    """The source columns and computation steps needed to build col_names from raw HouseTable rows"""
+
+    def __init__(self, col_names):
+        self.col_names = list(col_names)
+        self.steps = [self._plan(feature) for feature in self.col_names]
+        self.source_columns = sorted({column for _, columns, _ in self.steps for column in columns})
+
+    @staticmethod
+    def _plan(feature):
+        """Returns (feature, model names of the source columns, function computing it from a frame)"""
+        if feature in DERIVED_FEATURES:
+            columns, compute = DERIVED_FEATURES[feature]
+            return feature, columns, compute
+
+        for prefix in CATEGORICALS:
+            if feature.startswith(prefix + '_'):
+                value = feature[len(prefix) + 1:]
+                if prefix == 'Age_cat' and value in AGE_CATEGORIES:
+                    return feature, ['ConstructionYear'], \
+                        lambda df: _in_age_category(df['ConstructionYear'], value).astype(np.uint8)
+                if prefix == 'Age_cat':
+                    return feature, ['ConstructionYear'], \
+                        lambda df: _dummy(age_category(df['ConstructionYear']), value)
+                return feature, [prefix], lambda df: _dummy(df[prefix], value)
+
+        return feature, [feature], lambda df: df[feature]
+
+    @property
+    def csv_columns(self):
+        """The source columns under their names in the HouseTable csv, for usecols when reading it"""
+        return [SOURCE_NAMES.get(column, column) for column in self.source_columns]
+
+    def _sources(self, prediction_set):
+        """Picks only the needed source columns, under their model names, without copying the frame"""
+        sources = {}
+        for column in self.source_columns:
+            if column not in prediction_set.columns and SOURCE_NAMES.get(column) in prediction_set.columns:
+                sources[column] = prediction_set[SOURCE_NAMES[column]]
+            else:
+                sources[column] = prediction_set[column]
+        return sources
+
+    def apply(self, prediction_set):
+        """Builds a frame with exactly the columns of col_names, in that order"""
+        sources = self._sources(prediction_set)
+        features = {feature: compute(sources) for feature, _, compute in self.steps}
+        return pd.DataFrame(features, index=prediction_set.index, columns=self.col_names)
+
+
+_plans = {}
+
+
+def transform_plan(col_names):
+    """Returns the TransformPlan of col_names, plans are only made once for the same columns"""
+    key = tuple(col_names)
+    plan = _plans.get(key)
+    if plan is None:
+        plan = _plans[key] = TransformPlan(key)
+    return plan
@@ -0,0 +1,159 @@
+"""
+Compiles the trees of the XGBoost model into flat NumPy arrays and evaluates them with NumPy only.
+
+The model is a small regressor (max_depth=3, about 80-100 trees). All trees are concatenated into one set
+of contiguous node arrays: the feature a node splits on (-1 for leaves), the split threshold, the node to go
+to when the value is below the threshold, above it or missing, and the leaf values. A batch is scored by
+moving every (row, tree) pair one level down per step, which takes max_depth steps for the whole forest.
+
+The compiled arrays can be saved next to the model and loaded again without importing xgboost:
+    python -m househunters_ml.trees
+"""
+import json
+import os
+
+import numpy as np
+
+from househunters_ml.registry import registry
+
+# Objectives whose prediction is the plain sum of the leaves plus the base score
+IDENTITY_OBJECTIVES = ('reg:squarederror', 'reg:linear')
+
+# Rows scored at once, bounds the (rows x trees) node index matrix
+EVALUATION_CHUNK = 65536
+
+
+def _parse_base_score(value):
+    """The base score is stored as e.g. '5E-1' or, in newer XGBoost versions, '[4.8200462E5]'"""
+    return float(str(value).strip('[]'))
+
+
+def model_base_score(model):
+    """Reads the base score from the booster config, older XGBoost versions only have it on the model"""
+    booster = model.get_booster()
+    if hasattr(booster, 'save_config'):
+        config = json.loads(booster.save_config())
+        objective = config['learner']['objective']['name']
+        if objective not in IDENTITY_OBJECTIVES:
+            raise ValueError('cannot compile a model with objective {}'.format(objective))
+        return _parse_base_score(config['learner']['learner_model_param']['base_score'])
+    base_score = getattr(model, 'base_score', None)
+    return 0.5 if base_score is None else float(base_score)
+
+
+class TreeEnsemble:
+    """The trees of a booster as flat node arrays, with a vectorized NumPy evaluator"""
+
+    def __init__(self, feature, threshold, yes, no, missing, value, roots, base_score, max_depth, feature_names):
+        self.feature = feature
+        self.threshold = threshold
+        self.yes = yes
+        self.no = no
+        self.missing = missing
+        self.value = value
+        self.roots = roots
+        self.base_score = np.float32(base_score)
+        self.max_depth = int(max_depth)
+        self.feature_names = list(feature_names)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def predict(self, X):
+        """Predicts a 2d array whose columns are in the order of feature_names"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != len(self.feature_names):
+            raise ValueError('expected rows with {} features, got shape {}'.format(len(self.feature_names), X.shape))
+        out = np.empty(len(X), dtype=np.float32)
+        for start in range(0, len(X), EVALUATION_CHUNK):
+            out[start:start + EVALUATION_CHUNK] = self._predict_chunk(X[start:start + EVALUATION_CHUNK])
+        return out
+
+    def _predict_chunk(self, X):
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            feature = self.feature[nodes]
+            split = feature >= 0
+            x = X[rows, np.where(split, feature, 0)]
+            child = np.where(x < self.threshold[nodes], self.yes[nodes], self.no[nodes])
+            child = np.where(np.isnan(x), self.missing[nodes], child)
+            nodes = np.where(split, child, nodes)
+        return self.value[nodes].sum(axis=1, dtype=np.float32) + self.base_score
+
+    def save(self, path):
+        np.savez(path, feature=self.feature, threshold=self.threshold, yes=self.yes, no=self.no,
+                 missing=self.missing, value=self.value, roots=self.roots,
+                 base_score=np.float32(self.base_score), max_depth=np.int32(self.max_depth),
+                 feature_names=np.array(self.feature_names))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls(arrays['feature'], arrays['threshold'], arrays['yes'], arrays['no'], arrays['missing'],
+                       arrays['value'], arrays['roots'], arrays['base_score'], arrays['max_depth'],
+                       [str(name) for name in arrays['feature_names']])
+
+
+def compile_trees(tree_dumps, feature_names, base_score):
+    """Flattens the json tree dumps of a booster (booster.get_dump(dump_format='json')) into a TreeEnsemble"""
+    feature_index = {name: i for i, name in enumerate(feature_names)}
+    # Boosters trained without feature names split on f0, f1, ...
+    feature_index.update({'f{}'.format(i): i for i in range(len(feature_names))})
+
+    feature, threshold, yes, no, missing, value, roots = [], [], [], [], [], [], []
+    max_depth = 0
+    for dump in tree_dumps:
+        tree = json.loads(dump)
+        # Node ids are only unique within a tree, give every node a position in the global arrays
+        nodes = []
+        stack = [(tree, 0)]
+        while stack:
+            node, depth = stack.pop()
+            nodes.append(node)
+            max_depth = max(max_depth, depth)
+            stack.extend((child, depth + 1) for child in node.get('children', []))
+        offset = len(feature)
+        position = {node['nodeid']: offset + i for i, node in enumerate(nodes)}
+        roots.append(position[tree['nodeid']])
+
+        for node in nodes:
+            if 'leaf' in node:
+                index = position[node['nodeid']]
+                feature.append(-1)
+                threshold.append(0.0)
+                yes.append(index)
+                no.append(index)
+                missing.append(index)
+                value.append(node['leaf'])
+            else:
+                feature.append(feature_index[node['split']])
+                threshold.append(node['split_condition'])
+                yes.append(position[node['yes']])
+                no.append(position[node['no']])
+                missing.append(position[node['missing']])
+                value.append(0.0)
+
+    return TreeEnsemble(np.array(feature, dtype=np.int32), np.array(threshold, dtype=np.float32),
+                        np.array(yes, dtype=np.int32), np.array(no, dtype=np.int32),
+                        np.array(missing, dtype=np.int32), np.array(value, dtype=np.float32),
+                        np.array(roots, dtype=np.int32), base_score, max_depth, feature_names)
+
+
+def compile_model(model, feature_names):
+    """Compiles an XGBRegressor into a TreeEnsemble"""
+    tree_dumps = model.get_booster().get_dump(dump_format='json')
+    return compile_trees(tree_dumps, feature_names, model_base_score(model))
+
+
+def compiled_path(model_registry=registry):
+    return os.path.join(model_registry.model_dir, 'trees.npz')
+
+
+if __name__ == '__main__':
+    bundle = registry.get()
+    ensemble = compile_model(bundle.model, bundle.col_names)
+    ensemble.save(compiled_path())
+    print('Compiled {} trees ({} nodes, depth {}) into {}'.format(
+        ensemble.n_trees, len(ensemble.feature), ensemble.max_depth, compiled_path()))
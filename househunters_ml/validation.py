@@ -0,0 +1,116 @@
+"""
+Typed validation of the houses sent to the prediction routes.
+
+The handlers used to put the raw strings of request.args and request.form (or the values of a json body)
+into a DataFrame and cast it with astype(int): a missing or malformed field ended in an unhandled 500. A
+RequestValidator is generated from col_names: flags (CitySide, the one-hot columns like
+HouseType_Detached) must be 0 or 1, every other feature takes its range from the HouseTable schema of its
+source column. A single pass over the features coerces each value into the float32 row that is handed
+to the model, and collects an error for every field that is missing, not a number or out of range.
+
+Values become whole numbers like they did with astype(int): numbers and numeric strings are truncated
+toward zero, so "120" and 120.7 both give 120.
+"""
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from househunters_ml.schema import HOUSE_TABLE_SCHEMA
+from househunters_ml.transform import CATEGORICALS, DERIVED_FEATURES, SOURCE_NAMES
+
+FeatureSpec = namedtuple('FeatureSpec', ['name', 'minimum', 'maximum'])
+
+# Derived features that are 0/1 flags, the others take the range of the column they are computed from
+FLAG_FEATURES = {'CitySide', 'CountrySide', 'good_hood'}
+
+
+class ValidationError(ValueError):
+    """A house with invalid fields, errors holds one {'field', 'error'[, 'value']} dict per field"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join('{}: {}'.format(error['field'], error['error']) for error in errors))
+
+
+def feature_spec(feature):
+    """The range of a model feature, from its kind and the schema of the HouseTable column it comes from"""
+    if feature in FLAG_FEATURES or any(feature.startswith(prefix + '_') for prefix in CATEGORICALS):
+        return FeatureSpec(feature, 0, 1)
+    source = feature
+    if feature in DERIVED_FEATURES:
+        source = DERIVED_FEATURES[feature][0][0]
+    field = HOUSE_TABLE_SCHEMA.get(SOURCE_NAMES.get(source, source))
+    if field is None or field.categories is not None:
+        return FeatureSpec(feature, None, None)
+    return FeatureSpec(feature, field.minimum, field.maximum)
+
+
+def _coerce(value):
+    """A whole number from a json value or a form/url string, truncated like astype(int)"""
+    if isinstance(value, (bool, int)):
+        return int(value)
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise ValueError(value)
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            return _coerce(float(value))
+    raise TypeError(value)
+
+
+def _describe(value):
+    return value if isinstance(value, (str, int, float, bool)) else repr(value)
+
+
+class RequestValidator:
+    """Checks and converts the fields of a house into a model row, in the order of col_names"""
+
+    def __init__(self, col_names):
+        self.col_names = list(col_names)
+        self.specs = [feature_spec(feature) for feature in self.col_names]
+
+    def validate(self, house_info, out=None):
+        """
+        Writes the features of house_info (a dict, or the args or form of a request) into out and returns
+        it. Raises a ValidationError listing every bad field.
+        """
+        if not hasattr(house_info, 'get'):
+            raise ValidationError([{'field': '', 'error': 'a house must be a json object, got {!r}'.format(
+                house_info)}])
+        if out is None:
+            out = np.empty(len(self.specs), dtype=np.float32)
+        errors = []
+        for i, (name, minimum, maximum) in enumerate(self.specs):
+            value = house_info.get(name)
+            if value is None or value == '':
+                errors.append({'field': name, 'error': 'missing'})
+                continue
+            try:
+                number = _coerce(value)
+            except (TypeError, ValueError, OverflowError):
+                errors.append({'field': name, 'error': 'not a number', 'value': _describe(value)})
+                continue
+            if (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+                errors.append({'field': name, 'value': _describe(value), 'error': 'must be between {} and {}'.format(
+                    '-inf' if minimum is None else minimum, 'inf' if maximum is None else maximum)})
+                continue
+            out[i] = number
+        if errors:
+            raise ValidationError(errors)
+        return out
+
+
+_validators = {}
+
+
+def request_validator(col_names):
+    """Returns the RequestValidator of col_names, validators are only generated once for the same columns"""
+    key = tuple(col_names)
+    validator = _validators.get(key)
+    if validator is None:
+        validator = _validators[key] = RequestValidator(key)
+    return validator
@@ -0,0 +1,102 @@
+"""
+Fixtures shared by the tests.
+
+The model in househunters_ml/model was pickled by an old XGBoost version, so the tests train a small
+regressor on the same columns and write it to a temporary model directory. The web application runs in a
+temporary working directory, with the sample HouseTable in data/ and its outputs in output/.
+"""
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost as xgb
+
+# Reloads are triggered by the tests, not by the watcher thread
+os.environ.setdefault('HH_MODEL_WATCH_INTERVAL', '0')
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Rows of the 190322 csv with what the notebooks show of it: a negative Price, fractional Avg_WOZ_m2,
+# empty Garden values, the double-encoded FryslÃ¢n and the Garden_validation column
+SAMPLE_CSV = os.path.join(DATA_DIR, 'house_table_sample.csv')
+
+COL_NAMES = pd.Index(['LivingArea_m2', 'QuietRoad', 'Num_Bedrooms', 'StatusRank',
+                      'Avg_house_value_WOZ_1000euros', 'Avg_WOZ_m2', 'CitySide', 'HouseType_Detached',
+                      'Age_cat_Before_war', 'Urbanity_class_5'])
+
+
+def random_features(n_rows, seed=15, missing_share=0.05):
+    """Features in the ranges of the HouseTable, a share of them missing"""
+    rng = np.random.RandomState(seed)
+    X = np.column_stack([
+        rng.uniform(23, 384, n_rows), rng.randint(0, 2, n_rows), rng.randint(1, 8, n_rows),
+        rng.randint(1, 4000, n_rows), rng.randint(100, 900, n_rows), rng.uniform(800, 5350, n_rows),
+        rng.randint(0, 2, n_rows), rng.randint(0, 2, n_rows), rng.randint(0, 2, n_rows), rng.randint(0, 2, n_rows),
+    ]).astype(np.float32)
+    X[rng.rand(*X.shape) < missing_share] = np.nan
+    return X
+
+
+@pytest.fixture(scope='session')
+def trained_model():
+    """An XGBRegressor like the one of the prediction engine, trained with missing values"""
+    X = random_features(2000)
+    price = 1000 * np.nan_to_num(X[:, 0]) + 50 * np.nan_to_num(X[:, 5]) + 20000 * np.nan_to_num(X[:, 7])
+    return xgb.XGBRegressor(max_depth=3, n_estimators=40).fit(pd.DataFrame(X, columns=COL_NAMES), price)
+
+
+@pytest.fixture(scope='session')
+def model_dir(tmp_path_factory, trained_model):
+    """A model directory with model.pickle and columns.pickle"""
+    directory = tmp_path_factory.mktemp('model')
+    with open(str(directory / 'model.pickle'), 'wb') as f:
+        pickle.dump(trained_model, f)
+    with open(str(directory / 'columns.pickle'), 'wb') as f:
+        pickle.dump(COL_NAMES, f)
+    return str(directory)
+
+
+@pytest.fixture(scope='session')
+def workdir(tmp_path_factory):
+    """Working directory of the web application, with the sample HouseTable at csv_path"""
+    from househunters_ml.predict import csv_path
+
+    directory = tmp_path_factory.mktemp('work')
+    os.makedirs(str(directory / os.path.dirname(csv_path)))
+    shutil.copy(SAMPLE_CSV, str(directory / csv_path))
+    previous = os.getcwd()
+    os.chdir(str(directory))
+    yield directory
+    os.chdir(previous)
+
+
+@pytest.fixture(scope='session')
+def served_model(model_dir):
+    """The shared registry, it loads the model of model_dir on first use"""
+    from househunters_ml.registry import registry
+
+    registry.model_dir = model_dir
+    return registry
+
+
+@pytest.fixture(scope='session')
+def app(served_model, workdir):
+    """The Flask application"""
+    from househunters_ml.hh_app import app
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def house():
+    """A valid house with every model feature"""
+    return {'LivingArea_m2': 120, 'QuietRoad': 1, 'Num_Bedrooms': 3, 'StatusRank': 1200,
+            'Avg_house_value_WOZ_1000euros': 300, 'Avg_WOZ_m2': 2500, 'CitySide': 1, 'HouseType_Detached': 0,
+            'Age_cat_Before_war': 0, 'Urbanity_class_5': 1}
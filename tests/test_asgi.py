@@ -0,0 +1,52 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip('quart')
+
+
+@pytest.fixture(scope='module')
+def asgi_app(served_model, workdir):
+    """The ASGI application, requested without its serving hooks so the shared job pool keeps running"""
+    from househunters_ml.hh_asgi import app
+    return app
+
+
+def request(app, method, path, **kwargs):
+    async def send():
+        response = await app.test_client().open(path, method=method, **kwargs)
+        return response.status_code, await response.get_data(as_text=True)
+    return asyncio.run(send())
+
+
+def test_asgi_predicts_like_the_flask_app(asgi_app, client, house):
+    status, text = request(asgi_app, 'POST', '/json_prediction', data=json.dumps(house))
+
+    assert status == 200
+    assert text == client.post('/json_prediction', data=json.dumps(house)).get_data(as_text=True)
+    assert request(asgi_app, 'GET', '/url_prediction', query_string=house) == (200, text)
+
+
+def test_asgi_answers_a_bad_house_or_parameter_with_an_error(asgi_app, house):
+    status, text = request(asgi_app, 'POST', '/json_prediction', data=json.dumps(dict(house, QuietRoad='yes')))
+    assert status == 422 and 'QuietRoad' in text
+
+    status, text = request(asgi_app, 'GET', '/predict_all', query_string={'chunksize': 0})
+    assert status == 400 and 'chunksize' in text
+
+
+def test_asgi_streams_every_row(asgi_app):
+    status, text = request(asgi_app, 'GET', '/predict_all', query_string={'stream': 1, 'chunksize': 5})
+
+    assert status == 200
+    assert len(text.splitlines()) == 1 + 12
+
+
+def test_asgi_explains_like_the_flask_app(asgi_app, client, house):
+    status, text = request(asgi_app, 'POST', '/explain', data=json.dumps(house))
+
+    assert status == 200
+    assert json.loads(text) == client.post('/explain', json=house).get_json()
+    status, text = request(asgi_app, 'POST', '/explain', data=json.dumps(dict(house, CitySide=3)))
+    assert status == 422 and 'CitySide' in text
@@ -0,0 +1,51 @@
+import gzip
+
+CSS = '/static/hh_home.css'
+GIF = '/media/giphy.gif'
+
+
+def test_compressible_asset_is_sent_gzipped(client):
+    plain = client.get(CSS)
+    compressed = client.get(CSS, headers={'Accept-Encoding': 'gzip, deflate'})
+
+    assert plain.status_code == compressed.status_code == 200
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == plain.data
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    # Each encoding is its own representation with its own strong ETag
+    assert plain.headers['ETag'] != compressed.headers['ETag']
+    assert 'max-age' in compressed.headers['Cache-Control']
+
+
+def test_gzip_refused_with_q0_is_not_sent(client):
+    response = client.get(CSS, headers={'Accept-Encoding': 'gzip;q=0, identity'})
+
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == client.get(CSS).data
+
+
+def test_matching_etag_gets_304(client):
+    etag = client.get(CSS, headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+
+    assert client.get(CSS, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}).status_code == 304
+    # The ETag of the gzipped body does not match the plain one
+    assert client.get(CSS, headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_range_is_served_from_the_plain_file(client):
+    body = client.get(CSS).data
+
+    response = client.get(CSS, headers={'Range': 'bytes=10-19', 'Accept-Encoding': 'gzip'})
+
+    assert response.status_code == 206
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == body[10:20]
+    assert response.headers['Content-Range'] == 'bytes 10-19/{}'.format(len(body))
+
+
+def test_unknown_asset_is_404(client):
+    assert client.get(GIF).status_code == 200
+    assert client.get('/static/missing.css').status_code == 404
+    # Templates are not served
+    assert client.get('/static/hh_home.html').status_code == 404
@@ -0,0 +1,77 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from househunters_ml.batching import MicroBatcher
+
+
+class SlowPredictor:
+    """Predicts twice the first feature, holding its first call until release is set so rows can queue up"""
+
+    def __init__(self, error=None):
+        self.called = threading.Event()
+        self.release = threading.Event()
+        self.error = error
+        self.batch_sizes = []
+
+    def predict_rows(self, rows):
+        self.called.set()
+        self.release.wait(10)
+        self.batch_sizes.append(len(rows))
+        if self.error is not None and len(self.batch_sizes) > 1:
+            raise self.error
+        return rows[:, 0] * 2
+
+
+def row(value):
+    return np.full(3, value, dtype=np.float32)
+
+
+def queue_behind_a_running_batch(batcher, predictor, n_rows):
+    """Submits a row the dispatcher takes alone and n_rows that wait behind it, returns all futures"""
+    first = batcher.submit_row(row(0))
+    assert predictor.called.wait(5)
+    return [first] + [batcher.submit_row(row(i)) for i in range(1, n_rows + 1)]
+
+
+def test_batches_hold_at_most_max_batch_size_rows():
+    predictor = SlowPredictor()
+    batcher = MicroBatcher(predictor, window_ms=100, max_batch_size=4)
+    futures = queue_behind_a_running_batch(batcher, predictor, 9)
+
+    predictor.release.set()
+
+    assert [future.result(5) for future in futures] == [2.0 * i for i in range(10)]
+    assert predictor.batch_sizes == [1, 4, 4, 1]
+    assert batcher.stats()['batch_sizes'] == {1: 2, 4: 2}
+
+
+def test_partial_batch_is_flushed_when_the_window_closes():
+    predictor = SlowPredictor()
+    batcher = MicroBatcher(predictor, window_ms=50, max_batch_size=32)
+    futures = queue_behind_a_running_batch(batcher, predictor, 2)
+
+    start = time.monotonic()
+    predictor.release.set()
+    prices = [future.result(5) for future in futures]
+
+    assert prices == [0.0, 2.0, 4.0]
+    assert predictor.batch_sizes == [1, 2]
+    # The two queued rows waited for a third one until the window closed
+    assert 0.04 <= time.monotonic() - start < 5
+
+
+def test_error_of_a_batch_reaches_each_of_its_callers():
+    predictor = SlowPredictor(error=RuntimeError('booster failed'))
+    batcher = MicroBatcher(predictor, window_ms=50, max_batch_size=32)
+    futures = queue_behind_a_running_batch(batcher, predictor, 3)
+
+    predictor.release.set()
+
+    assert futures[0].result(5) == 0.0
+    for future in futures[1:]:
+        with pytest.raises(RuntimeError, match='booster failed'):
+            future.result(5)
+    assert predictor.batch_sizes == [1, 3]
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from househunters_ml.cache import PredictionCache
+from househunters_ml.serving import prediction_cache
+from tests.conftest import COL_NAMES, random_features
+
+
+class Clock:
+    """A timer for the cache that only moves when the test moves it"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def row(value):
+    return np.full(10, value, dtype=np.float32)
+
+
+def test_entries_expire_after_the_ttl():
+    clock = Clock()
+    cache = PredictionCache(maxsize=10, ttl=60, timer=clock)
+    cache.put(row(1), 'v1', 100.0)
+
+    clock.now = 59.9
+    assert cache.get(row(1), 'v1') == 100.0
+    clock.now = 60.1
+    assert cache.get(row(1), 'v1') is None
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['expirations'], stats['size']) == (1, 1, 1, 0)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(maxsize=2, ttl=60, timer=Clock())
+    cache.put(row(1), 'v1', 100.0)
+    cache.put(row(2), 'v1', 200.0)
+    # Row 1 was used last, so row 2 makes room for row 3
+    assert cache.get(row(1), 'v1') == 100.0
+
+    cache.put(row(3), 'v1', 300.0)
+
+    assert cache.get(row(2), 'v1') is None
+    assert (cache.get(row(1), 'v1'), cache.get(row(3), 'v1')) == (100.0, 300.0)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_other_model_version_drops_every_entry():
+    cache = PredictionCache(maxsize=10, ttl=60, timer=Clock())
+    cache.put(row(1), 'v1', 100.0)
+    cache.put(row(2), 'v1', 200.0)
+
+    assert cache.get(row(1), 'v2') is None
+    cache.put(row(1), 'v2', 110.0)
+
+    assert cache.get(row(1), 'v2') == 110.0
+    assert cache.stats()['size'] == 1 and cache.stats()['invalidations'] == 1
+    # Going back to the old version does not bring its entries back
+    assert cache.get(row(2), 'v1') is None
+
+
+def test_same_features_sent_differently_share_an_entry():
+    cache = PredictionCache(maxsize=10, ttl=60, timer=Clock())
+    computed = []
+
+    def compute():
+        computed.append(1)
+        return 100.0
+
+    assert cache.get_or_compute(np.arange(10, dtype=np.float64), 'v1', compute) == 100.0
+    assert cache.get_or_compute(list(range(10)), 'v1', compute) == 100.0
+    assert len(computed) == 1
+
+
+def test_reloaded_model_is_not_answered_from_the_cache(client, house, served_model):
+    old_bundle = served_model.get()
+    before = client.post('/json_prediction', json=house).get_data(as_text=True)
+    assert client.post('/json_prediction', json=house).get_data(as_text=True) == before
+    invalidations = prediction_cache.stats()['invalidations']
+    X = random_features(200, seed=3)
+    model = xgb.XGBRegressor(max_depth=2, n_estimators=5).fit(pd.DataFrame(X, columns=COL_NAMES), np.arange(200))
+
+    served_model.install(old_bundle._replace(model=model, version='0123456789abcdef'))
+    try:
+        after = client.post('/json_prediction', json=house).get_data(as_text=True)
+    finally:
+        served_model.install(old_bundle)
+
+    assert after != before
+    assert prediction_cache.stats()['invalidations'] == invalidations + 1
@@ -0,0 +1,41 @@
+import pytest
+
+from househunters_ml.predictor import predictor
+from tests.conftest import COL_NAMES
+
+
+def test_contributions_add_up_to_the_price(client, house):
+    explanation = client.post('/explain', json=house).get_json()
+
+    assert sorted(explanation['contributions']) == sorted(COL_NAMES)
+    total = explanation['base_value'] + sum(explanation['contributions'].values())
+    assert total == pytest.approx(explanation['price'], rel=1e-4)
+    price = client.get('/url_prediction', query_string=house).get_data(as_text=True).rsplit(' ', 1)[1]
+    assert explanation['price'] == pytest.approx(float(price), rel=1e-4)
+    assert client.get('/explain', query_string=house).get_json() == explanation
+
+
+def test_single_house_is_validated_once(client, house, monkeypatch):
+    calls = []
+
+    def to_row(*args, **kwargs):
+        calls.append(args[0])
+        return type(predictor).to_row(predictor, *args, **kwargs)
+
+    monkeypatch.setattr(predictor, 'to_row', to_row)
+
+    assert client.post('/explain', json=house).status_code == 200
+    response = client.post('/explain', json=dict(house, CitySide=3))
+
+    assert len(calls) == 2
+    assert response.status_code == 422
+    assert response.get_json()['errors'][0]['field'] == 'CitySide'
+
+
+def test_batch_lists_an_explanation_or_an_error_per_house(client, house):
+    response = client.post('/explain', json=[house, dict(house, Num_Bedrooms='many'), house])
+
+    assert response.status_code == 200
+    explanations = response.get_json()['explanations']
+    assert explanations[0] == explanations[2]
+    assert 'Num_Bedrooms' in explanations[1]['error']
@@ -0,0 +1,61 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from househunters_ml.incremental import score_incremental
+from tests.conftest import SAMPLE_CSV
+
+
+@pytest.fixture
+def house_table(tmp_path):
+    """A HouseTable csv of its own, so a test can change its rows"""
+    path = str(tmp_path / 'house_table.csv')
+    shutil.copy(SAMPLE_CSV, path)
+    return path
+
+
+def score(house_table, tmp_path, bundle=None):
+    return score_incremental(house_table, str(tmp_path / 'predictions.csv'), bundle=bundle)
+
+
+def test_rerun_skips_every_unchanged_row(house_table, tmp_path, workdir, served_model):
+    first = score(house_table, tmp_path)
+    written = pd.read_csv(str(tmp_path / 'predictions.csv'))
+
+    second = score(house_table, tmp_path)
+
+    assert (first['scored'], first['skipped']) == (12, 0)
+    assert (second['scored'], second['skipped']) == (0, 12)
+    pd.testing.assert_frame_equal(pd.read_csv(str(tmp_path / 'predictions.csv')), written)
+    assert [name for name in os.listdir(str(tmp_path / '.incremental')) if name.endswith('.tmp')] == []
+
+
+def test_only_a_changed_row_is_rescored(house_table, tmp_path, workdir, served_model):
+    score(house_table, tmp_path)
+    before = pd.read_csv(str(tmp_path / 'predictions.csv'))
+    with open(house_table) as f:
+        text = f.read()
+    # The LivingArea_m2 of the first listing, the same number of bytes
+    assert text.count(';362,77;') == 1
+    with open(house_table, 'w') as f:
+        f.write(text.replace(';362,77;', ';123,45;'))
+
+    result = score(house_table, tmp_path)
+
+    after = pd.read_csv(str(tmp_path / 'predictions.csv'))
+    assert (result['scored'], result['skipped']) == (1, 11)
+    assert after['LivingArea_m2'][0] == pytest.approx(123.45)
+    assert after['predictions'][0] != before['predictions'][0]
+    pd.testing.assert_frame_equal(after.iloc[1:], before.iloc[1:])
+
+
+def test_new_model_version_rescores_everything(house_table, tmp_path, workdir, served_model):
+    score(house_table, tmp_path)
+    bundle = served_model.get()
+
+    result = score(house_table, tmp_path, bundle._replace(version='0123456789abcdef'))
+
+    assert (result['scored'], result['skipped']) == (12, 0)
+    assert result['model_version'] == '0123456789abcdef'
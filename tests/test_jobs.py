@@ -0,0 +1,147 @@
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from househunters_ml import jobs
+from househunters_ml.jobs import FAILED, FINISHED, RUNNING, JobManager
+
+
+def wait_for(get_status, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = get_status()
+        if status in (FINISHED, FAILED):
+            return status
+        time.sleep(0.05)
+    raise AssertionError('the job did not end within {} seconds'.format(timeout))
+
+
+def test_job_runs_in_the_background_and_serves_its_result(client):
+    response = client.post('/jobs', query_string={'chunksize': 5})
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job['status'] in ('queued', 'running', FINISHED)
+
+    assert wait_for(lambda: client.get(job['status_url']).get_json()['status']) == FINISHED
+    status = client.get(job['status_url']).get_json()
+    assert status['rows_processed'] == 12
+    assert status['finished_at'] >= status['started_at'] >= status['submitted_at']
+
+    result = client.get(job['result_url'])
+    assert result.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(result.get_data(as_text=True))))
+    assert len(rows) == 12
+    assert all(row['correct_prediction'] for row in rows)
+    assert job['job_id'] in [listed['job_id'] for listed in client.get('/jobs').get_json()['jobs']]
+
+
+def test_async_predict_all_submits_a_job(client):
+    response = client.get('/predict_all', query_string={'async': 1})
+
+    assert response.status_code == 202
+    assert wait_for(lambda: client.get(response.get_json()['status_url']).get_json()['status']) == FINISHED
+
+
+def test_bad_chunksize_is_400_and_creates_no_job(client):
+    submitted = len(client.get('/jobs').get_json()['jobs'])
+
+    for query in ({'chunksize': 0}, {'chunksize': 'many'}):
+        assert client.post('/jobs', query_string=query).status_code == 400
+        assert client.get('/predict_all', query_string=dict(query, **{'async': 1})).status_code == 400
+
+    assert len(client.get('/jobs').get_json()['jobs']) == submitted
+
+
+def test_unknown_job_is_404(client):
+    assert client.get('/jobs/0123456789abcdef').status_code == 404
+    assert client.get('/jobs/0123456789abcdef/result').status_code == 404
+
+
+def test_failed_job_reports_its_error_and_has_no_result(tmp_path, served_model):
+    manager = JobManager(max_workers=1, job_dir=str(tmp_path))
+
+    job = manager.submit(data_location=str(tmp_path / 'missing.csv'))
+
+    assert wait_for(lambda: job.status) == FAILED
+    assert 'FileNotFoundError' in job.error
+    assert job.result_path is None and job.finished_at is not None
+    # Another process sees the same state
+    assert JobManager(job_dir=str(tmp_path)).get(job.id).to_dict() == job.to_dict()
+
+
+def test_ended_jobs_expire_with_their_result(tmp_path, workdir, served_model):
+    manager = JobManager(max_workers=1, job_dir=str(tmp_path), ttl=60, max_jobs=10)
+    job = manager.submit()
+    wait_for(lambda: job.status)
+    assert os.path.exists(job.result_path)
+
+    assert manager.expire(now=time.time() + 61) == 1
+
+    assert manager.get(job.id) is None
+    assert os.listdir(str(tmp_path)) == []
+
+
+def left_running(job_dir, owner_pid, saved_at):
+    """The state file and partial result of a running job, as a process leaves them when it dies"""
+    job = jobs.Job('data.csv', 5, result_path=None)
+    job.status = RUNNING
+    job.started_at = saved_at
+    job.owner_pid = owner_pid
+    with open(os.path.join(job_dir, job.id + '.json'), 'w') as f:
+        json.dump(dict({name: getattr(job, name) for name in job.STATE}, saved_at=saved_at), f)
+    with open(os.path.join(job_dir, job.id + '.csv.part'), 'w') as f:
+        f.write('ID,correct_prediction\n')
+    return job.id
+
+
+def test_job_of_a_dead_process_fails_and_expires(tmp_path):
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    job_id = left_running(str(tmp_path), dead.pid, time.time())
+    manager = JobManager(job_dir=str(tmp_path), ttl=60)
+
+    job = manager.get(job_id)
+
+    assert job.status == FAILED and str(dead.pid) in job.error
+    assert not os.path.exists(str(tmp_path / (job_id + '.csv.part')))
+    assert JobManager(job_dir=str(tmp_path)).get(job_id).status == FAILED
+    assert manager.expire(now=job.finished_at + 61) == 1
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_running_job_without_progress_fails(tmp_path):
+    # The parent of the test process is alive, but the job saved nothing for longer than STALE_AFTER
+    job_id = left_running(str(tmp_path), os.getppid(), time.time() - jobs.STALE_AFTER - 1)
+
+    assert JobManager(job_dir=str(tmp_path)).get(job_id).status == FAILED
+
+
+def test_shutdown_fails_the_queued_and_aborts_the_running_job(tmp_path, monkeypatch):
+    release = threading.Event()
+
+    def slow_chunks(data_location, chunksize):
+        release.wait(30)
+        yield pd.DataFrame({'correct_prediction': [1.0]})
+
+    monkeypatch.setattr(jobs, 'iter_scored_chunks', slow_chunks)
+    manager = JobManager(max_workers=1, job_dir=str(tmp_path))
+    running, queued = manager.submit(), manager.submit()
+    while running.status != RUNNING:
+        time.sleep(0.05)
+
+    manager.shutdown(timeout=0.2)
+
+    assert running.status == FAILED and 'while the job was running' in running.error
+    assert queued.status == FAILED and 'before the job ran' in queued.error
+    release.set()
+    manager._executor.shutdown(wait=True)
+    assert running.status == FAILED
+    assert sorted(os.listdir(str(tmp_path))) == sorted([running.id + '.json', queued.id + '.json'])
+    assert JobManager(job_dir=str(tmp_path)).get(running.id).status == FAILED
@@ -0,0 +1,46 @@
+import re
+
+from househunters_ml import metrics
+
+# A sample line of the Prometheus text exposition format: name, optional labels, value
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[a-zA-Z_]+="[^"]*"(,[a-zA-Z_]+="[^"]*")*\})? \S+$')
+
+
+def samples(text):
+    values = {}
+    for line in text.splitlines():
+        if not line.startswith('#'):
+            assert SAMPLE.match(line), line
+            name, value = line.rsplit(' ', 1)
+            values[name] = float(value)
+    return values
+
+
+def test_metrics_are_in_the_exposition_format(client, house):
+    assert client.post('/json_prediction', json=house).status_code == 200
+
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    for metric in metrics.ALL_METRICS:
+        assert '# TYPE {} {}'.format(metric.name, metric.kind) in text
+    values = samples(text)
+    assert values['hh_requests_total{route="predict_json",status="200"}'] >= 1
+    count = values['hh_stage_seconds_count{route="predict_json",stage="predict"}']
+    assert values['hh_stage_seconds_bucket{route="predict_json",stage="predict",le="+Inf"}'] == count >= 1
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram('test_seconds', 'Test', ('route',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, 'a"b')
+
+    assert list(histogram.samples()) == [
+        'test_seconds_bucket{route="a\\"b",le="0.1"} 1',
+        'test_seconds_bucket{route="a\\"b",le="1.0"} 3',
+        'test_seconds_bucket{route="a\\"b",le="+Inf"} 4',
+        'test_seconds_sum{route="a\\"b"} 6.05',
+        'test_seconds_count{route="a\\"b"} 4',
+    ]
@@ -0,0 +1,45 @@
+from flask import render_template
+from jinja2 import DictLoader, Environment
+
+from househunters_ml.pages import SALES_FORM, PageCache
+
+
+def environment(templates, auto_reload=False):
+    return Environment(loader=DictLoader(templates), autoescape=True, auto_reload=auto_reload)
+
+
+def test_page_with_a_variable_escapes_like_jinja():
+    env = environment({'form.html': '<p>{{ pred }}</p><footer>{{ 1 + 1 }}</footer>'})
+    pages = PageCache(env)
+
+    for value in ('', 'price 250000', '<script>alert("x")</script> & more'):
+        assert pages.page_with('form.html', 'pred', value) == env.get_template('form.html').render(pred=value)
+
+
+def test_variable_with_a_filter_is_rendered_per_request():
+    env = environment({'form.html': '<p>{{ pred|upper }}</p>'})
+    pages = PageCache(env)
+
+    assert pages.page_with('form.html', 'pred', 'a <b>') == '<p>A &lt;B&gt;</p>'
+
+
+def test_page_is_kept_until_its_template_changes_with_auto_reload():
+    templates = {'home.html': '<h1>home</h1>'}
+    kept, reloaded = PageCache(environment(templates)), PageCache(environment(templates, auto_reload=True))
+    kept.preload('home.html')
+    reloaded.preload('home.html')
+
+    templates['home.html'] = '<h1>new home</h1>'
+
+    assert kept.page('home.html') == '<h1>home</h1>'
+    assert reloaded.page('home.html') == '<h1>new home</h1>'
+
+
+def test_sales_form_matches_the_rendered_template(app, client, house):
+    response = client.post('/form_prediction', data=house)
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    pred = text[text.index('The suggested'):].split('<', 1)[0]
+
+    with app.test_request_context():
+        assert text == render_template(SALES_FORM, pred=pred)
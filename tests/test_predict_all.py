@@ -0,0 +1,35 @@
+import csv
+import io
+
+import pytest
+
+
+def test_streamed_batch_has_one_header_and_every_row(client):
+    response = client.get('/predict_all', query_string={'stream': 1, 'chunksize': 5})
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0][-1] == 'correct_prediction'
+    assert len(rows) == 1 + 12
+    assert all(row[0].isdigit() for row in rows[1:])
+
+
+def test_streamed_batch_matches_the_written_one(client, workdir):
+    streamed = client.get('/predict_all', query_string={'stream': 1, 'chunksize': 5}).get_data(as_text=True)
+
+    assert client.get('/predict_all').status_code == 200
+    with open(str(workdir / 'batch_predictions.csv')) as f:
+        written = list(csv.reader(f))
+    streamed = list(csv.reader(io.StringIO(streamed)))
+    assert [row[0] for row in streamed] == [row[0] for row in written]
+    assert [float(row[-1]) for row in streamed[1:]] == pytest.approx([float(row[-1]) for row in written[1:]])
+
+
+@pytest.mark.parametrize('query', [{'stream': 1, 'chunksize': 0}, {'workers': 2, 'chunksize': 0},
+                                   {'workers': 0}, {'workers': 'two'}, {'chunksize': ''}])
+def test_bad_workers_or_chunksize_is_400(client, query):
+    response = client.get('/predict_all', query_string=query)
+
+    assert response.status_code == 400
+    assert response.get_json()['error']
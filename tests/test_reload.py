@@ -0,0 +1,147 @@
+import os
+import pickle
+import shutil
+import signal
+
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost as xgb
+
+from househunters_ml.batch import iter_house_table, iter_scored_chunks, score_chunk
+from househunters_ml.registry import ModelRegistry
+from househunters_ml.reloader import ModelReloader
+from househunters_ml.store import store
+from tests.conftest import COL_NAMES, random_features
+
+
+def other_model():
+    """A smaller model on the same columns, whose predictions differ from the trained one"""
+    X = random_features(200, seed=3)
+    return xgb.XGBRegressor(max_depth=2, n_estimators=5).fit(pd.DataFrame(X, columns=COL_NAMES), np.arange(200))
+
+
+def broken_pickle(directory):
+    with open(str(directory / 'model.pickle'), 'wb') as f:
+        f.write(b'not a pickle')
+
+
+def too_few_columns(directory):
+    with open(str(directory / 'columns.pickle'), 'wb') as f:
+        pickle.dump(COL_NAMES[:-1], f)
+
+
+def not_a_model(directory):
+    with open(str(directory / 'model.pickle'), 'wb') as f:
+        pickle.dump({'weights': [1, 2, 3]}, f)
+
+
+@pytest.mark.parametrize('break_artifacts', [broken_pickle, too_few_columns, not_a_model])
+def test_broken_model_is_rejected_and_the_old_one_keeps_serving(client, house, model_dir, served_model, tmp_path,
+                                                                monkeypatch, break_artifacts):
+    version = served_model.version
+    before = client.post('/json_prediction', json=house).get_data(as_text=True)
+    broken_dir = tmp_path / 'model'
+    shutil.copytree(model_dir, str(broken_dir))
+    break_artifacts(broken_dir)
+    monkeypatch.setattr(served_model, 'model_dir', str(broken_dir))
+
+    response = client.post('/admin/reload', query_string={'wait': 1})
+
+    assert response.status_code == 422
+    assert response.get_json()['last_error']
+    assert response.get_json()['version'] == version
+    assert served_model.version == version
+    after = client.post('/json_prediction', json=house)
+    assert after.status_code == 200 and after.get_data(as_text=True) == before
+
+
+def test_valid_model_is_swapped_in(client, model_dir, served_model, tmp_path, monkeypatch):
+    new_dir = tmp_path / 'model'
+    shutil.copytree(model_dir, str(new_dir))
+    with open(str(new_dir / 'model.pickle'), 'rb') as f:
+        model = pickle.load(f)
+    model.set_params(n_estimators=20)
+    with open(str(new_dir / 'model.pickle'), 'wb') as f:
+        pickle.dump(model, f)
+    old_bundle = served_model.get()
+    monkeypatch.setattr(served_model, 'model_dir', str(new_dir))
+
+    try:
+        response = client.post('/admin/reload', query_string={'wait': 1})
+
+        assert response.status_code == 200
+        assert response.get_json()['last_error'] is None
+        assert response.headers['X-Model-Version'] == served_model.version != old_bundle.version
+    finally:
+        served_model.install(old_bundle)
+
+
+def test_files_changed_before_the_watcher_started_are_reloaded(model_dir, tmp_path):
+    directory = tmp_path / 'model'
+    shutil.copytree(model_dir, str(directory))
+    model_registry = ModelRegistry(str(directory))
+    old_version = model_registry.version
+    with open(str(directory / 'model.pickle'), 'wb') as f:
+        pickle.dump(other_model(), f)
+    # Like a worker forked after the files changed, its watcher starts after the bundle was loaded
+    reloader = ModelReloader(model_registry, interval=3600)
+    reloader.ensure_started()
+
+    # The first poll sees the change, the second one that the files stayed the same
+    assert not reloader.check()
+    assert reloader.check()
+    assert model_registry.version != old_version
+    assert not reloader.check() and not reloader.check()
+
+
+def test_a_batch_run_scores_every_chunk_with_one_model(app, served_model):
+    old_bundle = served_model.get()
+    chunks = iter_scored_chunks(chunksize=5)
+    scored = [next(chunks)]
+    served_model.install(old_bundle._replace(model=other_model(), version='other'))
+    try:
+        scored.extend(chunks)
+    finally:
+        served_model.install(old_bundle)
+
+    expected = score_chunk(next(iter(iter_house_table(chunksize=100))), old_bundle)
+    predictions = pd.concat(scored)['correct_prediction']
+    assert len(scored) == 3
+    np.testing.assert_array_equal(predictions.to_numpy(), expected['correct_prediction'].to_numpy())
+    listing_id = int(next(iter(iter_house_table(chunksize=100)))['ID'].iloc[-1])
+    assert store.get(listing_id, old_bundle.version) is not None
+    assert store.get(listing_id, 'other') is None
+
+
+def test_changed_files_are_only_reported(model_dir, tmp_path):
+    directory = tmp_path / 'model'
+    shutil.copytree(model_dir, str(directory))
+    model_registry = ModelRegistry(str(directory))
+    version = model_registry.version
+    with open(str(directory / 'model.pickle'), 'wb') as f:
+        pickle.dump(other_model(), f)
+    reloader = ModelReloader(model_registry, interval=0)
+
+    assert not reloader.changed()
+    assert reloader.changed()
+    assert model_registry.version == version
+
+
+def test_prefork_worker_signals_the_master_and_keeps_its_model(app, client, model_dir, served_model, tmp_path,
+                                                               monkeypatch):
+    new_dir = tmp_path / 'model'
+    shutil.copytree(model_dir, str(new_dir))
+    with open(str(new_dir / 'model.pickle'), 'wb') as f:
+        pickle.dump(other_model(), f)
+    version = served_model.version
+    monkeypatch.setattr(served_model, 'model_dir', str(new_dir))
+    monkeypatch.setitem(app.config, 'HH_MASTER_PID', os.getpid() + 1)
+    signals = []
+    monkeypatch.setattr(os, 'kill', lambda pid, signum: signals.append((pid, signum)))
+
+    response = client.post('/admin/reload', query_string={'wait': 1})
+
+    assert response.status_code == 202 and response.get_json()['restarting_workers']
+    assert signals == [(os.getpid() + 1, signal.SIGHUP)]
+    assert served_model.version == version
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+from househunters_ml import predict, schema
+from tests.conftest import DATA_DIR, SAMPLE_CSV
+
+
+def test_sample_of_the_real_csv_is_accepted():
+    frame = schema.read_csv(SAMPLE_CSV)
+
+    assert len(frame) == 12
+    assert frame['Price'].min() == -17507
+    assert frame['Avg_WOZ_m2'].dtype == 'float32'
+    assert frame['Avg_WOZ_m2'].iloc[2] == pytest.approx(1614.635681)
+    assert {'FryslÃ¢n', 'Fryslân'} <= set(frame['Province'].dropna())
+    assert frame['Garden'].isna().sum() == 6
+    assert frame['Garden_validation'].dtype == 'int8'
+
+
+def test_sample_of_the_real_csv_can_be_transformed(served_model):
+    features = predict.test_transformation(schema.read_csv(SAMPLE_CSV))
+
+    assert len(features) == 12
+    assert not features.isna().any().any()
+
+
+def test_problems_of_every_column_are_reported(tmp_path):
+    with open(SAMPLE_CSV, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    header = lines[0].split(';')
+    row = lines[1].split(';')
+    row[header.index('Province')] = 'Atlantis'
+    row[header.index('LivingArea_m2')] = '-3,5'
+    row[header.index('QuietRoad')] = ''
+    path = str(tmp_path / 'bad.csv')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join([lines[0], ';'.join(row)] + lines[2:]) + '\n')
+
+    with pytest.raises(schema.SchemaError) as error:
+        schema.read_csv(path)
+
+    problems = ' '.join(error.value.problems)
+    assert 'Province' in problems and 'LivingArea_m2' in problems and 'QuietRoad' in problems
+
+
+REAL_CSV = os.path.join(DATA_DIR, os.pardir, os.pardir, predict.csv_path)
+
+
+@pytest.mark.skipif(not os.path.exists(REAL_CSV), reason='the 190322 csv is not in the repository')
+def test_real_csv_is_accepted():
+    frame = schema.read_csv(REAL_CSV)
+
+    assert len(frame) == 3667
@@ -0,0 +1,61 @@
+import threading
+
+import numpy as np
+
+from househunters_ml.store import PredictionStore
+
+
+def test_prices_are_stored_and_read_back(tmp_path):
+    store = PredictionStore(str(tmp_path / 'predictions.sqlite3'))
+
+    assert store.upsert_many([1, 2, 3], np.array([100.5, 200.0, 300.0], dtype=np.float32), 'v1') == 3
+    store.upsert_many([2], [250.0], 'v1')
+
+    assert store.get(1, 'v1')['price'] == 100.5
+    assert store.get(2, 'v1')['price'] == 250.0
+    assert store.get(4, 'v1') is None
+    # Another store on the same file sees what this one wrote
+    assert PredictionStore(store.path).get(3, 'v1')['price'] == 300.0
+
+
+def test_predictions_are_kept_per_model_version(tmp_path):
+    store = PredictionStore(str(tmp_path / 'predictions.sqlite3'))
+    store.upsert_many([1, 2], [100.0, 200.0], 'v1')
+    store.upsert_many([1], [110.0], 'v2')
+
+    assert store.get(1, 'v1')['price'] == 100.0
+    assert store.get(1, 'v2')['price'] == 110.0
+    assert store.get(2, 'v2') is None
+    assert store.versions(1) == ['v2', 'v1']
+
+
+def test_concurrent_writers_share_the_pool(tmp_path):
+    store = PredictionStore(str(tmp_path / 'predictions.sqlite3'), pool_size=2)
+    errors = []
+
+    def write(writer):
+        try:
+            for batch in range(20):
+                ids = np.arange(batch * 10, batch * 10 + 10)
+                store.upsert_many(ids, ids * 1.5, 'writer-{}'.format(writer))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(writer,)) for writer in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    for writer in range(6):
+        assert store.get(199, 'writer-{}'.format(writer))['price'] == 298.5
+    # Connections beyond the pool size are closed instead of kept
+    assert store._pool.qsize() <= 2
+
+
+def test_empty_path_turns_the_store_off(tmp_path):
+    store = PredictionStore('')
+
+    assert store.upsert_many([1], [100.0], 'v1') == 0
+    assert store.get(1, 'v1') is None and store.versions(1) == []
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from househunters_ml.trees import TreeEnsemble, compile_model
+from tests.conftest import COL_NAMES, random_features
+
+# Leaves are summed in another order and the json dump rounds them, a wrong branch would be off by far more
+PRICE_TOLERANCE = 1.0
+
+
+def test_compiled_trees_match_the_booster(trained_model):
+    X = random_features(5000, seed=3)
+    expected = trained_model.get_booster().predict(xgb.DMatrix(X, feature_names=list(COL_NAMES)))
+
+    ensemble = compile_model(trained_model, list(COL_NAMES))
+
+    assert ensemble.n_trees == 40
+    np.testing.assert_allclose(ensemble.predict(X), expected, rtol=1e-5, atol=PRICE_TOLERANCE)
+
+
+def test_missing_values_follow_the_default_direction(trained_model):
+    X = random_features(200, seed=4, missing_share=0.0)
+    X[:, 0] = np.nan
+    X[::2, 5] = np.nan
+    expected = trained_model.predict(pd.DataFrame(X, columns=COL_NAMES))
+    predicted = compile_model(trained_model, list(COL_NAMES)).predict(X)
+
+    np.testing.assert_allclose(predicted, expected, rtol=1e-5, atol=PRICE_TOLERANCE)
+
+
+def test_saved_ensemble_loads_without_changes(tmp_path, trained_model):
+    X = random_features(100, seed=5)
+    ensemble = compile_model(trained_model, list(COL_NAMES))
+    path = str(tmp_path / 'trees.npz')
+    ensemble.save(path)
+
+    loaded = TreeEnsemble.load(path)
+
+    assert loaded.feature_names == list(COL_NAMES)
+    np.testing.assert_array_equal(loaded.predict(X), ensemble.predict(X))
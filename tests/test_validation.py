@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+
+def test_valid_house_is_predicted(client, house):
+    response = client.post('/json_prediction', json=house)
+
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).startswith('The suggested asking price for the house is ')
+
+
+def test_every_bad_field_is_listed_with_422(client, house):
+    del house['LivingArea_m2']
+    house['QuietRoad'] = 2
+    house['StatusRank'] = 'high'
+
+    response = client.post('/json_prediction', json=house)
+
+    assert response.status_code == 422
+    errors = {error['field']: error['error'] for error in response.get_json()['errors']}
+    assert errors == {'LivingArea_m2': 'missing', 'QuietRoad': 'must be between 0 and 1',
+                      'StatusRank': 'not a number'}
+
+
+def test_url_prediction_rejects_a_malformed_field(client, house):
+    house['Avg_WOZ_m2'] = '2.500,50'
+
+    response = client.get('/url_prediction', query_string=house)
+
+    assert response.status_code == 422
+    assert response.get_json()['errors'][0]['field'] == 'Avg_WOZ_m2'
+
+
+def test_form_shows_the_errors_with_422(client, house):
+    house['CitySide'] = ''
+
+    response = client.post('/form_prediction', data=house)
+
+    assert response.status_code == 422
+    assert 'Please check the information on your house: CitySide: missing' in response.get_data(as_text=True)
+
+
+def test_invalid_houses_of_a_batch_get_an_error_each(client, house):
+    response = client.post('/json_prediction', json=[house, dict(house, Num_Bedrooms=-1), 'house'])
+
+    assert response.status_code == 200
+    predictions = response.get_json()['predictions']
+    assert 'price' in predictions[0]
+    assert 'Num_Bedrooms' in predictions[1]['error']
+    assert 'json object' in predictions[2]['error']
+
+
+def test_ndjson_line_that_cannot_be_parsed_gets_an_error(client, house):
+    body = json.dumps(house) + '\n{bad\n' + json.dumps(house) + '\n'
+
+    response = client.post('/json_prediction', data=body)
+
+    assert response.status_code == 200
+    predictions = response.get_json()['predictions']
+    assert 'price' in predictions[0] and 'price' in predictions[2]
+    assert 'invalid json' in predictions[1]['error']
+
+
+@pytest.mark.parametrize('body', ['', '  \n', '{bad', '{bad\nworse\n'])
+@pytest.mark.parametrize('path', ['/json_prediction', '/explain'])
+def test_body_without_a_house_is_400(client, path, body):
+    response = client.post(path, data=body)
+
+    assert response.status_code == 400
+    assert 'request body' in response.get_json()['error']